@@ -0,0 +1,95 @@
+"""
+Re-sending broker events with REPLACE INTO versus INSERT ... ON CONFLICT DO UPDATE.
+
+Both runs load the same events into an empty broker_event table and then send all of
+them again with new ids, so every row of the second pass conflicts on
+(shipment_id, event_type). REPLACE deletes and re-inserts those rows, the upsert
+rewrites them in place.
+
+    uv run python -m benchmarks.bench_broker_upsert --rows 100000
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import uuid
+
+os.environ.setdefault(
+    "DATABASE_PATH", os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+)
+
+from integrationsandbox.broker.models import BrokerEventType  # noqa: E402
+from integrationsandbox.broker.repository import UPSERT_EVENT_QUERY  # noqa: E402
+from integrationsandbox.broker.service import build_events  # noqa: E402
+from integrationsandbox.infrastructure import database  # noqa: E402
+from integrationsandbox.tms.service import build_shipments  # noqa: E402
+
+REPLACE_QUERY = (
+    "REPLACE INTO broker_event(id, shipment_id, event_type, data) VALUES(?,?,?,?)"
+)
+
+
+def build_rows(count: int, payload: str, upsert: bool) -> list[tuple]:
+    rows = []
+    for i in range(count):
+        row = (
+            str(uuid.uuid4()),
+            f"shipment-{i}",
+            BrokerEventType.ORDER_CREATED,
+            payload,
+        )
+        # The upsert takes the reset processed_at policy as its last parameter.
+        rows.append(row + (True,) if upsert else row)
+    return rows
+
+
+def timed_executemany(query: str, rows: list[tuple]) -> float:
+    start = time.perf_counter()
+    with database.get_connection() as con:
+        con.executemany(query, rows)
+    return time.perf_counter() - start
+
+
+def measure(query: str, count: int, payload: str) -> dict[str, float]:
+    upsert = query is UPSERT_EVENT_QUERY
+    with database.get_connection() as con:
+        con.execute("DELETE FROM broker_event")
+
+    insert = timed_executemany(query, build_rows(count, payload, upsert))
+    with database.get_connection() as con:
+        last_row_id = con.execute("SELECT max(row_id) FROM broker_event").fetchone()[0]
+    resend = timed_executemany(query, build_rows(count, payload, upsert))
+    with database.get_connection() as con:
+        moved = con.execute(
+            "SELECT count(*) FROM broker_event WHERE row_id > ?", (last_row_id,)
+        ).fetchone()[0]
+    return {"insert": insert, "resend": resend, "moved": moved}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    database.setup()
+    shipment = build_shipments(1)
+    payload = build_events(shipment, BrokerEventType.ORDER_CREATED)[0].model_dump_json()
+
+    results = {
+        "REPLACE INTO": measure(REPLACE_QUERY, args.rows, payload),
+        "ON CONFLICT DO UPDATE": measure(UPSERT_EVENT_QUERY, args.rows, payload),
+    }
+    database.close()
+
+    print(f"{'statement':<24}{'insert s':>10}{'resend s':>10}{'resend rows/s':>15}")
+    for name, result in results.items():
+        rate = args.rows / result["resend"]
+        print(
+            f"{name:<24}{result['insert']:>10.2f}{result['resend']:>10.2f}"
+            f"{rate:>15.0f}  ({result['moved']} rows got a new row_id)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Shipments per second generated by tms.service.build_shipments.
+
+The baseline calls Faker for every name and address and builds a new Faker for every
+location, which is how seeding worked at first. "one by one" is
+TmsShipmentFactory.create_shipment with names and addresses sampled from the corpus,
+"batch" is create_shipments, which build_shipments uses.
+
+    uv run python -m benchmarks.bench_build_shipments --shipments 1000 --pool-size 500
+"""
+
+import argparse
+import random
+import time
+import uuid
+
+from faker import Faker
+
+from integrationsandbox.common.corpus import Corpus
+from integrationsandbox.tms.factories import TmsShipmentFactory
+from integrationsandbox.tms.models import TmsAddress, TmsCustomer, TmsLocation
+
+
+class FakerFactory(TmsShipmentFactory):
+    def create_customer(self) -> TmsCustomer:
+        return TmsCustomer(
+            id=str(uuid.uuid4()),
+            name=self.fake.company(),
+            carrier=f"{self.fake.company()} Transport",
+        )
+
+    def create_location(self) -> TmsLocation:
+        localed_faker = Faker(random.choice(self.address_locales))
+        return TmsLocation(
+            code=self.fake.bothify(text="LOC-####"),
+            name=localed_faker.company(),
+            address=TmsAddress(
+                address=localed_faker.street_address().replace("\n", " "),
+                city=localed_faker.city(),
+                postal_code=localed_faker.postcode(),
+                country=localed_faker.current_country_code(),
+            ),
+            latitude=localed_faker.latitude(),
+            longitude=localed_faker.longitude(),
+        )
+
+
+def measure(build, count: int, rounds: int) -> float:
+    build(1)  # Import the providers, the first Faker does that either way.
+    start = time.perf_counter()
+    for _ in range(rounds):
+        build(count)
+    return count * rounds / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--shipments", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--pool-size", type=int, default=500)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    corpus = Corpus(args.pool_size)
+    print(f"corpus of {args.pool_size} built in {time.perf_counter() - start:.2f}s")
+    baseline = FakerFactory(corpus)
+    factory = TmsShipmentFactory(corpus)
+
+    results = {
+        "baseline": measure(
+            lambda count: [baseline.create_shipment() for _ in range(count)],
+            args.shipments,
+            args.rounds,
+        ),
+        "one by one": measure(
+            lambda count: [factory.create_shipment() for _ in range(count)],
+            args.shipments,
+            args.rounds,
+        ),
+        "batch": measure(factory.create_shipments, args.shipments, args.rounds),
+    }
+
+    print(f"{'':<12}{'shipments/s':>14}{'speedup':>10}")
+    for name, rate in results.items():
+        speedup = rate / results["baseline"]
+        print(f"{name:<12}{rate:>14.0f}{speedup:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Requests per second on the list endpoints with and without the connection pool.
+
+The baseline opens a fresh connection per repository call in rollback-journal mode
+with synchronous=FULL, which is how the sandbox worked before pooling. The pooled
+run uses the settings from the environment / .env file.
+
+    uv run python -m benchmarks.bench_database_pool --requests 500
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+os.environ.setdefault(
+    "DATABASE_PATH", os.path.join(tempfile.mkdtemp(), "bench.sqlite3")
+)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from integrationsandbox.broker.models import BrokerEventType  # noqa: E402
+from integrationsandbox.broker.service import create_seed_events  # noqa: E402
+from integrationsandbox.config import get_settings  # noqa: E402
+from integrationsandbox.infrastructure import database  # noqa: E402
+from integrationsandbox.main import app  # noqa: E402
+from integrationsandbox.security.models import User  # noqa: E402
+from integrationsandbox.security.service import get_current_active_user  # noqa: E402
+from integrationsandbox.tms.service import create_seed_shipments  # noqa: E402
+
+ROUTES = ("/api/v1/tms/shipments", "/api/v1/broker/events")
+
+
+def run(client: TestClient, route: str, requests: int) -> float:
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(route, params={"limit": 10})
+        response.raise_for_status()
+    return requests / (time.perf_counter() - start)
+
+
+def measure(requests: int) -> dict[str, float]:
+    client = TestClient(app)
+    return {route: run(client, route, requests) for route in ROUTES}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--rows", type=int, default=1000)
+    args = parser.parse_args()
+
+    settings = get_settings()
+    app.dependency_overrides[get_current_active_user] = lambda: User(
+        username="bench", disabled=False
+    )
+    pooled = (
+        settings.database_pool_size,
+        settings.database_journal_mode,
+        settings.database_synchronous,
+    )
+
+    database.setup()
+    shipments = asyncio.run(
+        create_seed_shipments(min(args.rows, settings.max_bulk_size))
+    )
+    asyncio.run(create_seed_events(shipments, BrokerEventType.ORDER_CREATED))
+
+    settings.database_pool_size = 0
+    settings.database_journal_mode = "DELETE"
+    settings.database_synchronous = "FULL"
+    database.setup()
+    before = measure(args.requests)
+
+    (
+        settings.database_pool_size,
+        settings.database_journal_mode,
+        settings.database_synchronous,
+    ) = pooled
+    database.setup()
+    after = measure(args.requests)
+    database.close()
+
+    print(f"{'route':<28}{'before req/s':>14}{'after req/s':>14}{'speedup':>10}")
+    for route in ROUTES:
+        speedup = after[route] / before[route]
+        print(f"{route:<28}{before[route]:>14.1f}{after[route]:>14.1f}{speedup:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
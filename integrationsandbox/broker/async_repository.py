@@ -0,0 +1,87 @@
+"""Asyncio counterpart of the broker repository, see tms.async_repository."""
+
+from typing import AsyncIterator, Callable, List, Tuple
+
+from integrationsandbox.broker import repository
+from integrationsandbox.broker.models import BrokerEventFilters, BrokerEventMessage
+from integrationsandbox.infrastructure.database import (
+    iterate_in_db_executor,
+    run_in_db_executor,
+    run_write_async,
+)
+from integrationsandbox.infrastructure.exceptions import handle_db_errors
+
+
+@handle_db_errors
+async def create_many(events: List[BrokerEventMessage]) -> None:
+    await run_in_db_executor(repository.create_many, events)
+
+
+@handle_db_errors
+async def create(
+    event: BrokerEventMessage, on_commit: Callable[[], None] | None = None
+) -> None:
+    await run_write_async(
+        repository.insert_event, event, detach=True, on_commit=on_commit
+    )
+
+
+@handle_db_errors
+async def get_all(
+    filters: BrokerEventFilters | None,
+) -> Tuple[List[BrokerEventMessage] | None, str | None]:
+    return await run_in_db_executor(repository.get_all, filters)
+
+
+@handle_db_errors
+async def get_all_json(
+    filters: BrokerEventFilters | None,
+) -> Tuple[List[str] | None, str | None]:
+    return await run_in_db_executor(repository.get_all_json, filters)
+
+
+@handle_db_errors
+async def get_feed_page(filters: BrokerEventFilters) -> Tuple[List[str], str | None]:
+    return await run_in_db_executor(repository.get_feed_page, filters)
+
+
+@handle_db_errors
+async def iter_all(filters: BrokerEventFilters) -> AsyncIterator[List[str]]:
+    stream = await run_in_db_executor(repository.iter_all, filters)
+    return iterate_in_db_executor(stream)
+
+
+@handle_db_errors
+async def get_with_version(
+    filters: BrokerEventFilters,
+) -> Tuple[BrokerEventMessage, int] | None:
+    return await run_in_db_executor(repository.get_with_version, filters)
+
+
+@handle_db_errors
+async def get(filters: BrokerEventFilters | None) -> BrokerEventMessage | None:
+    return await run_in_db_executor(repository.get, filters)
+
+
+@handle_db_errors
+async def mark_as_processed(event_id: str, expected_version: int | None = None) -> bool:
+    return await run_write_async(repository.set_processed, event_id, expected_version)
+
+
+@handle_db_errors
+async def claim(owner: str, limit: int, lease_seconds: int) -> Tuple[List[str], str]:
+    return await run_write_async(repository.claim_rows, owner, limit, lease_seconds)
+
+
+@handle_db_errors
+async def release(owner: str, ids: List[str], processed: bool) -> int:
+    return await run_write_async(repository.release_rows, owner, ids, processed)
+
+
+@handle_db_errors
+async def update_processed(
+    processed: bool,
+    ids: List[str] | None = None,
+    filters: BrokerEventFilters | None = None,
+) -> int:
+    return await run_write_async(repository.set_processed_many, processed, ids, filters)
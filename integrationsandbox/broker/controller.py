@@ -1,17 +1,35 @@
 import logging
 from typing import List
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, status
 
 from integrationsandbox.broker import service as broker_service
 from integrationsandbox.broker.models import (
     BrokerEventFilters,
     BrokerEventMessage,
+    BrokerEventProcessedUpdate,
     BrokerEventSeedRequest,
     CreateBrokerEventMessage,
     CreateBrokerOrderMessage,
 )
-from integrationsandbox.broker.service import list_events, list_new_events
+from integrationsandbox.broker.service import (
+    list_events,
+    list_new_events,
+    stream_events,
+    stream_new_events,
+)
+from integrationsandbox.common.feed import get_feed_timeout, get_last_event_id
+from integrationsandbox.common.leases import ClaimRequest, LeaseRequest
+from integrationsandbox.common.models import UpdateResult
+from integrationsandbox.common.pagination import set_next_page_headers
+from integrationsandbox.common.responses import raw_json_response
+from integrationsandbox.common.streaming import (
+    StreamFormat,
+    accepts_event_stream,
+    event_stream_response,
+    get_stream_format,
+    streaming_response,
+)
 from integrationsandbox.security.service import get_current_active_user
 from integrationsandbox.tms.service import get_shipments_by_id_list
 from integrationsandbox.validation import service as validation_service
@@ -33,10 +51,10 @@ logger = logging.getLogger(__name__)
     response_description="HTTP 202 with no body if validated succesfully.",
     status_code=status.HTTP_202_ACCEPTED,
 )
-def incoming_order(order: CreateBrokerOrderMessage) -> None:
+async def incoming_order(order: CreateBrokerOrderMessage) -> None:
     logger.info("Received broker order for shipment: %s", order.shipment.reference)
     logger.debug("Order details: %s", order.model_dump())
-    validation_service.validate_broker_order(order)
+    await validation_service.validate_broker_order(order)
     logger.info("Broker order validation successful")
 
 
@@ -49,10 +67,12 @@ def incoming_order(order: CreateBrokerOrderMessage) -> None:
     response_description="HTTP 201 with created event and id in response.",
     status_code=status.HTTP_201_CREATED,
 )
-def create_event_endpoint(new_event: CreateBrokerEventMessage) -> BrokerEventMessage:
+async def create_event_endpoint(
+    new_event: CreateBrokerEventMessage,
+) -> BrokerEventMessage:
     logger.info("Creating new broker event")
     logger.debug("Event details: %s", new_event.model_dump())
-    event = broker_service.create_event(new_event)
+    event = await broker_service.create_event(new_event)
     logger.info("Broker event created with ID: %s", event.id)
     return event
 
@@ -66,15 +86,17 @@ def create_event_endpoint(new_event: CreateBrokerEventMessage) -> BrokerEventMes
     response_description="List of generated events saved to DB",
     status_code=status.HTTP_201_CREATED,
 )
-def seed_events(seed_request: BrokerEventSeedRequest) -> List[BrokerEventMessage]:
+async def seed_events(seed_request: BrokerEventSeedRequest) -> List[BrokerEventMessage]:
     logger.info(
         "Seeding events for %d shipments with event type: %s",
         len(seed_request.shipment_ids),
         seed_request.event,
     )
     logger.debug("Shipment IDs: %s", seed_request.shipment_ids)
-    shipments = get_shipments_by_id_list(seed_request.shipment_ids)
-    events = broker_service.create_seed_events(shipments, seed_request.event)
+    shipments = await get_shipments_by_id_list(seed_request.shipment_ids)
+    events = await broker_service.create_seed_events(
+        shipments, seed_request.event, seed_request.seed
+    )
     logger.info("Successfully created %d seed events", len(events))
     return events
 
@@ -88,15 +110,22 @@ def seed_events(seed_request: BrokerEventSeedRequest) -> List[BrokerEventMessage
     response_description="List of events",
     status_code=status.HTTP_200_OK,
 )
-def get_events(
+async def get_events(
+    request: Request,
     filters: BrokerEventFilters = Depends(),
+    stream_format: StreamFormat | None = Depends(get_stream_format),
 ) -> List[BrokerEventMessage] | None:
     logger.info("Retrieving broker events with filters")
     logger.debug("Filters: %s", filters.model_dump() if filters else None)
-    events = list_events(filters)
+    if stream_format:
+        batches = await stream_events(filters)
+        return streaming_response(batches, stream_format)
+    events, next_cursor = await list_events(filters)
     count = len(events) if events else 0
     logger.info("Retrieved %d broker events", count)
-    return events
+    response = raw_json_response(events)
+    set_next_page_headers(request, response, next_cursor)
+    return response
 
 
 @router.get(
@@ -108,11 +137,106 @@ def get_events(
     response_description="List of new events",
     status_code=status.HTTP_200_OK,
 )
-def get_new_events(
+async def get_new_events(
+    request: Request,
     filters: BrokerEventFilters = Depends(),
+    stream_format: StreamFormat | None = Depends(get_stream_format),
 ) -> List[BrokerEventMessage] | None:
     logger.info("Retrieving new broker events")
-    events = list_new_events(filters)
+    if stream_format:
+        batches = await stream_new_events(filters)
+        return streaming_response(batches, stream_format)
+    events, next_cursor = await list_new_events(filters)
     count = len(events) if events else 0
     logger.info("Retrieved %d broker events", count)
-    return events
+    response = raw_json_response(events)
+    set_next_page_headers(request, response, next_cursor)
+    return response
+
+
+@router.get(
+    "/events/feed",
+    summary="Wait for new events",
+    description="""
+      Long-poll for new events after the `after` cursor, optionally of one `event` type. Responds as soon as new events are written, or with null after `timeout` seconds. Continue from the X-Next-Cursor header.
+      With 'Accept: text/event-stream' the new events are sent as server-sent events until `timeout` has passed, with the cursor as event id.
+      Only inserted events are sent. Events that are sent again (and overwritten in place) or set back to new with `/processed` are not sent again, follow `/changes` for those.
+      """,
+    response_description="List of new events",
+    status_code=status.HTTP_200_OK,
+)
+async def get_event_feed(
+    request: Request,
+    filters: BrokerEventFilters = Depends(),
+    timeout: float = Depends(get_feed_timeout),
+    last_event_id: str | None = Depends(get_last_event_id),
+) -> List[BrokerEventMessage] | None:
+    filters.after = filters.after or last_event_id
+    if accepts_event_stream(request):
+        pages = broker_service.follow_new_events(filters, timeout)
+        return event_stream_response(pages)
+    events, next_cursor = await broker_service.wait_for_new_events(filters, timeout)
+    response = raw_json_response(events)
+    set_next_page_headers(request, response, next_cursor)
+    return response
+
+
+@router.post(
+    "/events/claim",
+    summary="Claim new events",
+    description="""
+      Leases up to `limit` new events to `owner`. Claimed events aren't handed out again until the lease expires, so several workers can poll in parallel without getting the same events.
+      """,
+    response_description="List of claimed events, the lease expiry is in the X-Lease-Expires-At header",
+    status_code=status.HTTP_200_OK,
+)
+async def claim_events(claim_request: ClaimRequest) -> List[BrokerEventMessage] | None:
+    logger.info("Claiming broker events for: %s", claim_request.owner)
+    events, expires_at = await broker_service.claim_events(claim_request)
+    response = raw_json_response(events)
+    response.headers["X-Lease-Expires-At"] = expires_at
+    return response
+
+
+@router.post(
+    "/events/ack",
+    summary="Acknowledge claimed events",
+    description="""
+      Marks events claimed by `owner` as processed.
+      """,
+    response_description="Number of events that were acknowledged",
+    status_code=status.HTTP_200_OK,
+)
+async def ack_events(lease_request: LeaseRequest) -> UpdateResult:
+    count = await broker_service.ack_events(lease_request)
+    return UpdateResult(count=count)
+
+
+@router.post(
+    "/events/nack",
+    summary="Release claimed events",
+    description="""
+      Ends the lease of `owner` on the events, so they can be claimed again right away.
+      """,
+    response_description="Number of events that were released",
+    status_code=status.HTTP_200_OK,
+)
+async def nack_events(lease_request: LeaseRequest) -> UpdateResult:
+    count = await broker_service.nack_events(lease_request)
+    return UpdateResult(count=count)
+
+
+@router.post(
+    "/events/processed",
+    summary="Mark events as processed or new",
+    description="""
+      Marks the events in `ids`, or every event matching `filters`, as processed in
+      one statement. Set `processed` to false to mark them as new again. Any lease on
+      an updated event ends.
+      """,
+    response_description="Number of events that were updated",
+    status_code=status.HTTP_200_OK,
+)
+async def update_processed_events(update: BrokerEventProcessedUpdate) -> UpdateResult:
+    count = await broker_service.update_processed_events(update)
+    return UpdateResult(count=count)
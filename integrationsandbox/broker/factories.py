@@ -1,5 +1,4 @@
 import random
-import uuid
 from datetime import datetime, timedelta
 
 from faker import Faker
@@ -11,56 +10,72 @@ from integrationsandbox.broker.models import (
     BrokerEventSituation,
     BrokerEventType,
 )
+from integrationsandbox.common.corpus import Corpus, get_corpus
+from integrationsandbox.tms.factories import random_uuid
 
 # Factory configuration constants
 MIN_ACTUAL_TIME_OFFSET_MINUTES = -60
 MAX_ACTUAL_TIME_OFFSET_MINUTES = 60
 ETA_MAX_DAYS_FUTURE = 10
 TRANSMISSION_MAX_DAYS_PAST = 1
+# Seeded events are dated relative to this time instead of now.
+SEED_TIME = datetime(2025, 1, 1, 12, 0, 0)
 
 
-def get_random_enum_choice(enum_cls):
-    return random.choice(list(enum_cls))
+def get_random_enum_choice(enum_cls, rng: random.Random):
+    return rng.choice(list(enum_cls))
 
 
 class BrokerEventMessageFactory:
     """Allow methods to take in parameters so that it can be linked to order data."""
 
-    def __init__(self):
+    def __init__(self, corpus: Corpus | None = None, seed: int | None = None):
+        # Like TmsShipmentFactory every draw goes through this factory's Random.
+        self.seed = seed
+        self.random = random.Random(seed)
         self.fake = Faker()
+        self.fake.random = self.random
+        self.corpus = corpus or get_corpus()
+
+    def get_now(self) -> datetime:
+        return SEED_TIME if self.seed is not None else datetime.now()
 
     def create_org(self, org_name: str = None) -> str:
-        return org_name if org_name is not None else self.fake.company()
+        return org_name if org_name is not None else self.corpus.company(self.random)
 
     def create_order(self, reference: str = None) -> BrokerEventOrder:
+        now = self.get_now()
         return BrokerEventOrder(
             reference=reference
             if reference is not None
             else self.fake.bothify(text="ORD-#####"),
-            eta=self.fake.date_time_between(start_date="now", end_date=f"+{ETA_MAX_DAYS_FUTURE}d"),
+            eta=self.fake.date_time_between(
+                start_date=now, end_date=now + timedelta(days=ETA_MAX_DAYS_FUTURE)
+            ),
         )
 
     def create_position(self, location_reference: str = None) -> BrokerEventPosition:
+        latitude, longitude = self.corpus.coordinate(self.random)
         return BrokerEventPosition(
             locationReference=location_reference
             if location_reference
             else self.fake.bothify(text="LOC-####"),
-            latitude=self.fake.latitude(),
-            longitude=self.fake.longitude(),
+            latitude=latitude,
+            longitude=longitude,
         )
 
     def create_situation(
         self, event_type: BrokerEventType = None, location_reference: str = None
     ) -> BrokerEventSituation:
-        now = datetime.now()
-        actual = now + timedelta(minutes=random.randint(MIN_ACTUAL_TIME_OFFSET_MINUTES, MAX_ACTUAL_TIME_OFFSET_MINUTES))
+        now = self.get_now()
+        actual = now + timedelta(minutes=self.random.randint(MIN_ACTUAL_TIME_OFFSET_MINUTES, MAX_ACTUAL_TIME_OFFSET_MINUTES))
         position = True
         if event_type in [BrokerEventType.CANCEL_ORDER, BrokerEventType.ORDER_CREATED]:
             position = False
         return BrokerEventSituation(
             event=event_type
             if event_type is not None
-            else get_random_enum_choice(BrokerEventType),
+            else get_random_enum_choice(BrokerEventType, self.random),
             registrationDate=now,
             actualDate=actual,
             position=self.create_position(location_reference) if position else None,
@@ -75,13 +90,15 @@ class BrokerEventMessageFactory:
         carrier_name: str = None,
         location_reference: str = None,
     ) -> BrokerEventMessage:
+        now = self.get_now()
         return BrokerEventMessage(
-            id=str(uuid.uuid4()),
+            id=random_uuid(self.random),
             shipmentId=shipment_id
             if shipment_id is not None
             else self.fake.bothify(text="SHIP-#####"),
             dateTransmission=self.fake.date_time_between(
-                start_date=f"-{TRANSMISSION_MAX_DAYS_PAST}d", end_date="now"
+                start_date=now - timedelta(days=TRANSMISSION_MAX_DAYS_PAST),
+                end_date=now,
             ),
             owner=self.create_org(owner_name),
             order=self.create_order(reference),
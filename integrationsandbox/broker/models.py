@@ -162,6 +162,11 @@ class BrokerEventSeedRequest(BaseModel):
         description="List of shipment IDs to generate events for. Supports multiple shipments for bulk testing.",
         max_length=get_settings().max_bulk_size,
     )
+    seed: int | None = Field(
+        default=None,
+        description="Generate the same events for the same seed and shipments. "
+        "Seeded events are dated relative to 2025-01-01 12:00 instead of now.",
+    )
 
     model_config = broker_event_seed
 
@@ -170,9 +175,31 @@ class BrokerEventFilters(BaseModel):
     id: str | None = None
     event: BrokerEventType | None = None
     shipment_id: str | None = None
+    carrier: str | None = None
     skip: int | None = 0
     limit: PositiveInt = Field(
         default=50,
         description="Limit of records to get.",
     )
+    after: str | None = Field(
+        default=None,
+        description="Cursor from the X-Next-Cursor header of the previous page.",
+    )
     new: bool | None = None
+
+
+class BrokerEventProcessedUpdate(BaseModel):
+    processed: bool = Field(
+        default=True,
+        description="Set to false to mark the events as new again.",
+    )
+    ids: List[str] | None = Field(
+        default=None,
+        description="IDs of the events to update.",
+        min_length=1,
+        max_length=get_settings().max_bulk_size,
+    )
+    filters: BrokerEventFilters | None = Field(
+        default=None,
+        description="Update every match instead; limit only applies if it is set.",
+    )
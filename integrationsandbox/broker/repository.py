@@ -1,50 +1,79 @@
+import functools
+import json
 import logging
 from datetime import datetime
-from typing import Any, List, Tuple
+from sqlite3 import Connection
+from typing import Any, Dict, List, Tuple
 
 from integrationsandbox.broker.models import BrokerEventFilters, BrokerEventMessage
-from integrationsandbox.infrastructure.database import create_connection
-from integrationsandbox.infrastructure.exceptions import handle_db_errors
+from integrationsandbox.common.pagination import (
+    decode_cursor,
+    encode_cursor,
+    get_last_cursor,
+    get_next_cursor,
+)
+from integrationsandbox.config import get_settings
+from integrationsandbox.infrastructure import leases
+from integrationsandbox.infrastructure.database import (
+    QueryStream,
+    get_connection,
+    run_write,
+)
+from integrationsandbox.infrastructure.exceptions import (
+    ConcurrencyError,
+    handle_db_errors,
+)
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+
+# An event for an existing combination of shipment_id and status overwrites it.
+# This makes is easier to validate incoming broker messages that were accidentally
+# triggered multiple times for a status/id combination. The row is updated in place,
+# so it keeps its row_id and position in the listing.
+UPSERT_EVENT_QUERY = """
+    INSERT INTO broker_event(id, shipment_id, event_type, data) VALUES(?,?,?,?)
+    ON CONFLICT(shipment_id, event_type) DO UPDATE SET
+        id = excluded.id,
+        data = excluded.data,
+        processed_at = CASE WHEN ? THEN NULL ELSE processed_at END,
+        version = version + 1
+"""
+
+
+def get_upsert_params(event: BrokerEventMessage) -> Tuple[Any, ...]:
+    return (
+        event.id,
+        event.shipmentId,
+        event.situation.event,
+        event.model_dump_json(),
+        settings.broker_event_reset_processed,
+    )
 
 
 @handle_db_errors
 def create_many(events: List[BrokerEventMessage]) -> None:
     logger.info("Inserting %d broker events into database", len(events))
-    with create_connection() as con:
-        # REPLACE will overwrite existing combinations of shipment_id and status.
-        # This makes is easier to validate incoming broker messages that were accidentally triggered multiple times for a status/id combination
+    with get_connection() as con:
         con.executemany(
-            "REPLACE INTO broker_event(id, shipment_id, event_type, data) VALUES(?,?,?,?)",
-            [
-                (
-                    event.id,
-                    event.shipmentId,
-                    event.situation.event,
-                    event.model_dump_json(),
-                )
-                for event in events
-            ],
+            UPSERT_EVENT_QUERY, [get_upsert_params(event) for event in events]
         )
     logger.info("Successfully inserted %d events", len(events))
 
 
+# Single-row writes come in pairs like in tms.repository, so they can go through
+# the group-commit writer.
+
+
+def insert_event(con: Connection, event: BrokerEventMessage) -> None:
+    logger.info("Inserting broker event into database: %s", event.id)
+    con.execute(UPSERT_EVENT_QUERY, get_upsert_params(event))
+
+
 @handle_db_errors
 def create(event: BrokerEventMessage) -> None:
-    logger.info("Inserting broker event into database: %s", event.id)
-    with create_connection() as con:
-        # REPLACE will overwrite existing combinations of shipment_id and status.
-        # This makes is easier to validate incoming broker messages that were accidentally triggered multiple times for a status/id combination
-        con.execute(
-            "REPLACE INTO broker_event(id, shipment_id, event_type, data) VALUES(?,?,?,?)",
-            (
-                event.id,
-                event.shipmentId,
-                event.situation.event,
-                event.model_dump_json(),
-            ),
-        )
+    run_write(insert_event, event, detach=True)
     logger.info("Successfully inserted event: %s", event.id)
 
 
@@ -53,7 +82,7 @@ def build_where_clause(filters: BrokerEventFilters) -> Tuple[str, List[Any]]:
     params = []
 
     for field, value in filters.model_dump(exclude_none=True).items():
-        if field in ["limit", "skip"]:
+        if field in ["limit", "skip", "after"]:
             continue
         if field == "new":
             if value:
@@ -63,15 +92,22 @@ def build_where_clause(filters: BrokerEventFilters) -> Tuple[str, List[Any]]:
         conditions.append(f"{col} = ?")
         params.append(value)
 
+    if filters.after:
+        # Keyset pagination: a range seek on the row_id primary key instead of OFFSET.
+        conditions.append("row_id > ?")
+        params.append(decode_cursor(filters.after))
+
     clause = ""
     if conditions:
         clause = " WHERE " + " AND ".join(conditions)
 
-    clause += " ORDER BY rowid"
+    clause += " ORDER BY row_id"
     if filters.limit:
         params.append(filters.limit)
         clause += " LIMIT ?"
     if filters.skip:
+        if not filters.limit:
+            clause += " LIMIT -1"
         params.append(filters.skip)
         clause += " OFFSET ?"
 
@@ -79,22 +115,95 @@ def build_where_clause(filters: BrokerEventFilters) -> Tuple[str, List[Any]]:
 
 
 @handle_db_errors
-def get_all(filters: BrokerEventFilters | None) -> List[BrokerEventMessage] | None:
-    base_query = "SELECT data from broker_event"
+def get_all_json(
+    filters: BrokerEventFilters | None,
+) -> Tuple[List[str] | None, str | None]:
+    """Stored JSON documents as written by model_dump_json(), without validating
+    them. Read endpoints send these as they are."""
+    base_query = "SELECT row_id, data from broker_event"
     where_clause, params = build_where_clause(filters)
     query = base_query + where_clause
     logger.info("Querying broker events from database")
     logger.debug("Query: %s with params: %s", query, params)
 
-    with create_connection() as con:
+    with get_connection() as con:
         res = con.execute(query, params)
         rows = res.fetchall()
         if rows:
-            events = [BrokerEventMessage.model_validate_json(row[0]) for row in rows]
-            logger.info("Retrieved %d events from database", len(events))
-            return events
+            logger.info("Retrieved %d events from database", len(rows))
+            return [row[1] for row in rows], get_next_cursor(rows, filters.limit)
 
         logger.info("No events found matching filters")
+        return None, None
+
+
+def get_all(
+    filters: BrokerEventFilters | None,
+) -> Tuple[List[BrokerEventMessage] | None, str | None]:
+    documents, next_cursor = get_all_json(filters)
+    if not documents:
+        return None, None
+    events = [
+        BrokerEventMessage.model_validate_json(document) for document in documents
+    ]
+    return events, next_cursor
+
+
+@handle_db_errors
+def get_feed_page(filters: BrokerEventFilters) -> Tuple[List[str], str | None]:
+    """Like get_all_json, but the cursor points after the last row even if the page
+    isn't full, so a feed can continue from it once more rows are written."""
+    where_clause, params = build_where_clause(filters)
+    query = "SELECT row_id, data from broker_event" + where_clause
+    logger.debug("Query: %s with params: %s", query, params)
+
+    with get_connection() as con:
+        rows = con.execute(query, params).fetchall()
+    return [row[1] for row in rows], get_last_cursor(rows)
+
+
+@handle_db_errors
+def get_stream_batch(
+    filters: BrokerEventFilters, row_id: int | None, size: int
+) -> List[Tuple[int, str]]:
+    update: Dict[str, Any] = {"limit": size}
+    if row_id is not None:
+        # Later batches seek past the previous one instead of skipping again.
+        update.update(after=encode_cursor(row_id), skip=0)
+    where_clause, params = build_where_clause(filters.model_copy(update=update))
+    query = "SELECT row_id, data from broker_event" + where_clause
+    logger.debug("Query: %s with params: %s", query, params)
+
+    with get_connection() as con:
+        return con.execute(query, params).fetchall()
+
+
+def iter_all(filters: BrokerEventFilters) -> QueryStream[str]:
+    logger.info("Streaming broker events from database")
+    return QueryStream(
+        functools.partial(get_stream_batch, filters),
+        lambda row: row[1],
+        settings.stream_batch_size,
+        filters.limit,
+    )
+
+
+@handle_db_errors
+def get_with_version(
+    filters: BrokerEventFilters,
+) -> Tuple[BrokerEventMessage, int] | None:
+    base_query = "SELECT data, version from broker_event"
+    filters.limit = 1
+    where_clause, params = build_where_clause(filters)
+    query = base_query + where_clause
+    logger.info("Querying single broker event and version from database")
+    logger.debug("Query: %s with params: %s", query, params)
+
+    with get_connection() as con:
+        row = con.execute(query, params).fetchone()
+        if row:
+            return BrokerEventMessage.model_validate_json(row[0]), row[1]
+        logger.info("No event found matching filters")
         return None
 
 
@@ -107,7 +216,7 @@ def get(filters: BrokerEventFilters | None) -> BrokerEventMessage | None:
     logger.info("Querying single broker event from database")
     logger.debug("Query: %s with params: %s", query, params)
 
-    with create_connection() as con:
+    with get_connection() as con:
         res = con.execute(query, params)
         row = res.fetchone()
         if row:
@@ -118,21 +227,103 @@ def get(filters: BrokerEventFilters | None) -> BrokerEventMessage | None:
         return None
 
 
-@handle_db_errors
-def mark_as_processed(event_id: str) -> bool:
+def set_processed(
+    con: Connection, event_id: str, expected_version: int | None = None
+) -> bool:
+    """Marks the event as processed. With an expected_version the event is only
+    marked if it wasn't changed or replaced since it was read at that version."""
     processed_at = datetime.now().isoformat()
 
     logger.info("Marking broker event as processed: %s", event_id)
+    query = """
+        UPDATE broker_event SET processed_at = ?, version = version + 1 WHERE id = ?
+    """
+    params = [processed_at, event_id]
+    if expected_version is not None:
+        query += " AND version = ?"
+        params.append(expected_version)
+
+    cursor = con.execute(query, params)
 
-    with create_connection() as con:
-        cursor = con.execute(
-            "UPDATE broker_event SET processed_at = ? WHERE id = ?",
-            (processed_at, event_id),
+    if cursor.rowcount == 0 and expected_version is not None:
+        raise ConcurrencyError(
+            f"Event {event_id} changed since version {expected_version}"
         )
+    if cursor.rowcount > 0:
+        logger.info("Successfully marked event as processed: %s", event_id)
+        return True
+    else:
+        logger.warning("No event found with id: %s", event_id)
+        return False
+
+
+@handle_db_errors
+def mark_as_processed(event_id: str, expected_version: int | None = None) -> bool:
+    return run_write(set_processed, event_id, expected_version)
+
+
+def claim_rows(
+    con: Connection, owner: str, limit: int, lease_seconds: int
+) -> Tuple[List[str], str]:
+    logger.info("Claiming up to %d broker events for: %s", limit, owner)
+    documents, expires_at = leases.claim(
+        con, "broker_event", owner, limit, lease_seconds
+    )
+    logger.info("Claimed %d events until %s", len(documents), expires_at)
+    return documents, expires_at
 
-        if cursor.rowcount > 0:
-            logger.info("Successfully marked event as processed: %s", event_id)
-            return True
-        else:
-            logger.warning("No event found with id: %s", event_id)
-            return False
+
+@handle_db_errors
+def claim(owner: str, limit: int, lease_seconds: int) -> Tuple[List[str], str]:
+    return run_write(claim_rows, owner, limit, lease_seconds)
+
+
+def release_rows(con: Connection, owner: str, ids: List[str], processed: bool) -> int:
+    logger.info("Releasing %d broker events claimed by: %s", len(ids), owner)
+    return leases.release(con, "broker_event", owner, ids, processed)
+
+
+@handle_db_errors
+def release(owner: str, ids: List[str], processed: bool) -> int:
+    return run_write(release_rows, owner, ids, processed)
+
+
+def set_processed_many(
+    con: Connection,
+    processed: bool,
+    ids: List[str] | None = None,
+    filters: BrokerEventFilters | None = None,
+) -> int:
+    """Marks or unmarks the events with the given ids, or every event that matches
+    the filters, in one statement. Returns the number of changed rows."""
+    if ids is not None:
+        condition = "id IN (SELECT value FROM json_each(?))"
+        params: List[Any] = [json.dumps(ids)]
+    else:
+        where_clause, params = build_where_clause(filters or BrokerEventFilters())
+        condition = f"row_id IN (SELECT row_id FROM broker_event{where_clause})"
+    condition += (
+        " AND processed_at IS NULL" if processed else " AND processed_at IS NOT NULL"
+    )
+
+    logger.info("Setting processed=%s on broker events", processed)
+    query = f"""
+        UPDATE broker_event
+        SET processed_at = ?, lease_owner = NULL, lease_expires_at = NULL,
+            version = version + 1
+        WHERE {condition}
+    """
+    processed_at = datetime.now().isoformat() if processed else None
+    logger.debug("Query: %s with params: %s", query, params)
+    cursor = con.execute(query, [processed_at, *params])
+    logger.info("Updated %d events", cursor.rowcount)
+    return cursor.rowcount
+
+
+@handle_db_errors
+def update_processed(
+    processed: bool,
+    ids: List[str] | None = None,
+    filters: BrokerEventFilters | None = None,
+) -> int:
+    return run_write(set_processed_many, processed, ids, filters)
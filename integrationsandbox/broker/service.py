@@ -1,15 +1,19 @@
 import logging
 import uuid
+from contextlib import aclosing
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List, Tuple
 
-from integrationsandbox.broker import repository
+from fastapi.concurrency import run_in_threadpool
+
+from integrationsandbox.broker import async_repository as repository
 from integrationsandbox.broker.factories import BrokerEventMessageFactory
 from integrationsandbox.broker.models import (
     BrokerDate,
     BrokerDateQualifier,
     BrokerEventFilters,
     BrokerEventMessage,
+    BrokerEventProcessedUpdate,
     BrokerEventType,
     BrokerHandlingUnit,
     BrokerLocation,
@@ -18,7 +22,11 @@ from integrationsandbox.broker.models import (
     CreateBrokerEventMessage,
     CreateBrokerOrderMessage,
 )
-from integrationsandbox.common.exceptions import NotFoundError
+from integrationsandbox.common import generation
+from integrationsandbox.common.exceptions import NotFoundError, ValidationError
+from integrationsandbox.common.feed import follow, notifier
+from integrationsandbox.common.generation import derive_seed, split
+from integrationsandbox.common.leases import ClaimRequest, LeaseRequest
 from integrationsandbox.tms.models import PackageType, TmsShipment, TmsStop
 
 logger = logging.getLogger(__name__)
@@ -157,12 +165,11 @@ def get_transformed_shipment_data(
     return result
 
 
-def build_events(
-    shipments: List[TmsShipment], event: BrokerEventType
+def build_event_shard(
+    shipments: List[TmsShipment], event: BrokerEventType, seed: int | None
 ) -> List[BrokerEventMessage]:
-    logger.info("Building %d broker events of type: %s", len(shipments), event)
-    factory = BrokerEventMessageFactory()
-    events = [
+    factory = BrokerEventMessageFactory(seed=seed)
+    return [
         factory.create_event_message(
             shipment_id=shipment.id,
             owner_name="Adam's logistics",
@@ -173,24 +180,47 @@ def build_events(
         )
         for shipment in shipments
     ]
+
+
+def build_events(
+    shipments: List[TmsShipment], event: BrokerEventType, seed: int | None = None
+) -> List[BrokerEventMessage]:
+    logger.info("Building %d broker events of type: %s", len(shipments), event)
+    # Events of another type or for other shipments get other ids for the same seed.
+    seed = derive_seed(seed, event.value, *(shipment.id for shipment in shipments))
+    shards = [
+        (shipments[start:stop], event, shard_seed)
+        for start, stop, shard_seed in split(len(shipments), seed)
+    ]
+    events = generation.pool.run(build_event_shard, len(shipments), shards)
     logger.info("Successfully built %d events", len(events))
     return events
 
 
-def list_events(filters: BrokerEventFilters) -> List[BrokerEventMessage]:
+async def list_events(
+    filters: BrokerEventFilters,
+) -> Tuple[List[str] | None, str | None]:
     logger.info("Listing broker events with filters")
     logger.debug("Filters: %s", filters.model_dump() if filters else None)
-    events = repository.get_all(filters)
+    events, next_cursor = await repository.get_all_json(filters)
     event_count = len(events) if events else 0
     logger.info("Retrieved %d events from database", event_count)
 
-    return events
+    return events, next_cursor
+
+
+async def stream_events(
+    filters: BrokerEventFilters,
+) -> AsyncIterator[List[str]]:
+    logger.info("Streaming broker events with filters")
+    logger.debug("Filters: %s", filters.model_dump())
+    return await repository.iter_all(filters)
 
 
-def get_event(filters: BrokerEventFilters) -> BrokerEventMessage:
+async def get_event(filters: BrokerEventFilters) -> BrokerEventMessage:
     logger.info("Retrieving broker event with filters")
     logger.debug("Filters: %s", filters.model_dump())
-    event = repository.get(filters)
+    event = await repository.get(filters)
     if not event:
         logger.warning("Event not found for filters: %s", filters)
         raise NotFoundError(f"Event not found for filters: {filters}")
@@ -198,53 +228,148 @@ def get_event(filters: BrokerEventFilters) -> BrokerEventMessage:
     return event
 
 
-def create_event(new_event: CreateBrokerEventMessage) -> BrokerEventMessage:
+async def get_event_with_version(
+    filters: BrokerEventFilters,
+) -> Tuple[BrokerEventMessage, int]:
+    logger.info("Retrieving broker event and version with filters")
+    logger.debug("Filters: %s", filters.model_dump())
+    result = await repository.get_with_version(filters)
+    if not result:
+        logger.warning("Event not found for filters: %s", filters)
+        raise NotFoundError(f"Event not found for filters: {filters}")
+    return result
+
+
+async def create_event(new_event: CreateBrokerEventMessage) -> BrokerEventMessage:
     logger.info("Creating new broker event")
     event = BrokerEventMessage(id=str(uuid.uuid4()), **new_event.model_dump())
-    repository.create(event)
+    await repository.create(event, on_commit=lambda: notifier.notify("broker_event"))
     logger.info("Successfully created event with ID: %s", event.id)
     return event
 
 
-def create_events(events: List[BrokerEventMessage]) -> List[BrokerEventMessage]:
+async def create_events(events: List[BrokerEventMessage]) -> List[BrokerEventMessage]:
     if not events:
         logger.info("Empty events list provided")
         return []
     logger.info("Creating %d broker events", len(events))
-    repository.create_many(events)
+    await repository.create_many(events)
+    notifier.notify("broker_event")
     logger.info("Successfully created %d events", len(events))
     return events
 
 
-def create_seed_events(
-    shipments: List[TmsShipment], event_type: BrokerEventType
+async def create_seed_events(
+    shipments: List[TmsShipment], event_type: BrokerEventType, seed: int | None = None
 ) -> List[BrokerEventMessage]:
     logger.info(
         "Creating seed events for %d shipments with type: %s",
         len(shipments),
         event_type,
     )
-    events = build_events(shipments, event_type)
-    create_events(events)
+    events = await run_in_threadpool(build_events, shipments, event_type, seed)
+    await create_events(events)
     logger.info("Successfully created %d seed events", len(events))
     return events
 
 
-def list_new_events(filters: BrokerEventFilters) -> List[BrokerEventMessage]:
+async def list_new_events(
+    filters: BrokerEventFilters,
+) -> Tuple[List[str] | None, str | None]:
     logger.info("Listing new broker events with filters")
     logger.debug("Filters: %s", filters.model_dump() if filters else None)
     filters.new = True
-    events = repository.get_all(filters)
+    events, next_cursor = await repository.get_all_json(filters)
     event_count = len(events) if events else 0
     logger.info("Retrieved %d events from database", event_count)
-    return events
+    return events, next_cursor
+
+
+async def stream_new_events(
+    filters: BrokerEventFilters,
+) -> AsyncIterator[List[str]]:
+    logger.info("Streaming new broker events with filters")
+    logger.debug("Filters: %s", filters.model_dump())
+    filters.new = True
+    return await repository.iter_all(filters)
+
+
+def follow_new_events(
+    filters: BrokerEventFilters, timeout: float
+) -> AsyncIterator[Tuple[List[str], str]]:
+    logger.info("Following new broker events for %.1f seconds", timeout)
+    logger.debug("Filters: %s", filters.model_dump())
+    filters.new = True
+
+    async def fetch(after: str | None) -> Tuple[List[str], str | None]:
+        update = {"after": after}
+        if after != filters.after:
+            # Later pages seek past the previous one instead of skipping again.
+            update["skip"] = 0
+        return await repository.get_feed_page(filters.model_copy(update=update))
+
+    return follow("broker_event", fetch, filters.after, timeout)
+
 
+async def wait_for_new_events(
+    filters: BrokerEventFilters, timeout: float
+) -> Tuple[List[str] | None, str | None]:
+    """Long-poll: the first page of new events, or None once timeout has passed."""
+    async with aclosing(follow_new_events(filters, timeout)) as pages:
+        async for documents, cursor in pages:
+            logger.info("Retrieved %d events from the feed", len(documents))
+            return documents, cursor
+    logger.info("No new events within %.1f seconds", timeout)
+    return None, filters.after
 
-def mark_event_processed(event_id: str) -> bool:
+
+async def mark_event_processed(
+    event_id: str, expected_version: int | None = None
+) -> bool:
     logger.info("Marking broker event as processed: %s", event_id)
-    success = repository.mark_as_processed(event_id)
+    success = await repository.mark_as_processed(event_id, expected_version)
     if success:
         logger.info("Successfully marked event as processed: %s", event_id)
     else:
         logger.warning("Failed to mark event as processed: %s", event_id)
     return success
+
+
+async def claim_events(
+    claim_request: ClaimRequest,
+) -> Tuple[List[str] | None, str]:
+    logger.info("Claiming new broker events for: %s", claim_request.owner)
+    events, expires_at = await repository.claim(
+        claim_request.owner, claim_request.limit, claim_request.lease_seconds
+    )
+    logger.info("Claimed %d events", len(events))
+    return events or None, expires_at
+
+
+async def ack_events(lease_request: LeaseRequest) -> int:
+    logger.info("Acknowledging broker events for: %s", lease_request.owner)
+    logger.debug("IDs: %s", lease_request.ids)
+    count = await repository.release(lease_request.owner, lease_request.ids, True)
+    logger.info("Marked %d events as processed", count)
+    return count
+
+
+async def nack_events(lease_request: LeaseRequest) -> int:
+    logger.info("Releasing broker events for: %s", lease_request.owner)
+    logger.debug("IDs: %s", lease_request.ids)
+    count = await repository.release(lease_request.owner, lease_request.ids, False)
+    logger.info("Released %d events", count)
+    return count
+
+
+async def update_processed_events(update: BrokerEventProcessedUpdate) -> int:
+    if (update.ids is None) == (update.filters is None):
+        raise ValidationError("Send either ids or filters.")
+    filters = update.filters
+    if filters is not None and "limit" not in filters.model_fields_set:
+        # The default page size would silently cap the update.
+        filters = filters.model_copy(update={"limit": None})
+    logger.info("Setting processed=%s on broker events", update.processed)
+    count = await repository.update_processed(update.processed, update.ids, filters)
+    logger.info("Updated %d events", count)
+    return count
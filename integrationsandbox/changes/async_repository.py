@@ -0,0 +1,28 @@
+"""Asyncio counterpart of the changes repository, see tms.async_repository."""
+
+from typing import AsyncIterator, List
+
+from integrationsandbox.changes import repository
+from integrationsandbox.changes.models import ChangeFilters
+from integrationsandbox.infrastructure.database import (
+    iterate_in_db_executor,
+    run_in_db_executor,
+    run_write_async,
+)
+from integrationsandbox.infrastructure.exceptions import handle_db_errors
+
+
+@handle_db_errors
+async def get_trimmed_seq() -> int:
+    return await run_in_db_executor(repository.get_trimmed_seq)
+
+
+@handle_db_errors
+async def iter_since(filters: ChangeFilters) -> AsyncIterator[List[str]]:
+    stream = await run_in_db_executor(repository.iter_since, filters)
+    return iterate_in_db_executor(stream)
+
+
+@handle_db_errors
+async def trim(retention: float) -> int:
+    return await run_write_async(repository.delete_expired, retention)
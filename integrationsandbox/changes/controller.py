@@ -0,0 +1,40 @@
+import logging
+from typing import List
+
+from fastapi import APIRouter, Depends, status
+
+from integrationsandbox.changes import service as changes_service
+from integrationsandbox.changes.models import Change, ChangeFilters
+from integrationsandbox.common.streaming import (
+    StreamFormat,
+    get_stream_format,
+    streaming_response,
+)
+from integrationsandbox.security.service import get_current_active_user
+
+router = APIRouter(
+    prefix="/changes",
+    dependencies=[Depends(get_current_active_user)],
+    tags=["Changes"],
+)
+logger = logging.getLogger(__name__)
+
+
+@router.get(
+    "",
+    summary="Get changes since a seq",
+    description="""
+      Streams every insert, update, processed mark and delete of TMS shipments and broker events after `since`, in order. Store the `seq` of the last change and pass it as `since` on the next sync.
+      Changes are kept for CHANGE_LOG_RETENTION seconds. If older changes are needed the response is 410 and the tables have to be read again.
+      """,
+    response_description="List of changes, oldest first",
+    status_code=status.HTTP_200_OK,
+    responses={status.HTTP_410_GONE: {"description": "Changes were trimmed"}},
+)
+async def get_changes(
+    filters: ChangeFilters = Depends(),
+    stream_format: StreamFormat | None = Depends(get_stream_format),
+) -> List[Change]:
+    logger.info("Retrieving changes after seq %d", filters.since)
+    batches = await changes_service.stream_changes(filters)
+    return streaming_response(batches, stream_format or StreamFormat.JSON)
@@ -0,0 +1,39 @@
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict
+
+from pydantic import BaseModel, Field, NonNegativeInt, PositiveInt
+
+
+class ChangeTable(str, Enum):
+    TMS_SHIPMENT = "tms_shipment"
+    BROKER_EVENT = "broker_event"
+
+
+class ChangeOperation(str, Enum):
+    INSERT = "insert"
+    UPDATE = "update"
+    PROCESSED = "processed"
+    UNPROCESSED = "unprocessed"
+    DELETE = "delete"
+
+
+class Change(BaseModel):
+    seq: int = Field(description="Position in the change log, pass it as `since`.")
+    table: ChangeTable
+    id: str
+    operation: ChangeOperation
+    changed_at: datetime
+    data: Dict[str, Any] | None = Field(
+        description="Current document of the record, null once it is deleted."
+    )
+
+
+class ChangeFilters(BaseModel):
+    since: NonNegativeInt = Field(
+        default=0, description="Only return changes after this seq."
+    )
+    table: ChangeTable | None = None
+    limit: PositiveInt | None = Field(
+        default=None, description="Limit of changes to get."
+    )
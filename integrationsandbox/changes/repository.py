@@ -0,0 +1,99 @@
+import functools
+import logging
+from sqlite3 import Connection
+from typing import Any, Dict, List, Tuple
+
+from integrationsandbox.changes.models import ChangeFilters
+from integrationsandbox.config import get_settings
+from integrationsandbox.infrastructure.database import (
+    QueryStream,
+    get_connection,
+    run_write,
+    trim_change_log,
+)
+from integrationsandbox.infrastructure.exceptions import handle_db_errors
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Changes carry the current document of the record, so a consumer that applies them
+# in order ends up with the latest state even if it skipped intermediate versions.
+CHANGE_QUERY = """
+    SELECT c.seq, json_object(
+        'seq', c.seq,
+        'table', c.table_name,
+        'id', c.id,
+        'operation', c.operation,
+        'changed_at', c.changed_at,
+        'data', json(CASE c.table_name
+            WHEN 'tms_shipment'
+                THEN (SELECT data FROM tms_shipment WHERE row_id = c.row_id)
+            WHEN 'broker_event'
+                THEN (SELECT data FROM broker_event WHERE row_id = c.row_id)
+            END))
+    FROM change_log c
+"""
+
+
+def build_where_clause(filters: ChangeFilters) -> Tuple[str, List[Any]]:
+    conditions = ["c.seq > ?"]
+    params: List[Any] = [filters.since]
+    if filters.table:
+        conditions.append("c.table_name = ?")
+        params.append(filters.table.value)
+
+    clause = " WHERE " + " AND ".join(conditions) + " ORDER BY c.seq"
+    if filters.limit:
+        clause += " LIMIT ?"
+        params.append(filters.limit)
+    return clause, params
+
+
+@handle_db_errors
+def get_trimmed_seq() -> int:
+    """The highest seq that was trimmed from the log, 0 if none was."""
+    with get_connection() as con:
+        oldest = con.execute("SELECT min(seq) FROM change_log").fetchone()[0]
+        if oldest is not None:
+            return oldest - 1
+        # An empty log may have been trimmed completely.
+        row = con.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'change_log'"
+        ).fetchone()
+        return row[0] if row else 0
+
+
+@handle_db_errors
+def get_stream_batch(
+    filters: ChangeFilters, seq: int | None, size: int
+) -> List[Tuple[int, str]]:
+    update: Dict[str, Any] = {"limit": size}
+    if seq is not None:
+        update["since"] = seq
+    where_clause, params = build_where_clause(filters.model_copy(update=update))
+    query = CHANGE_QUERY + where_clause
+    logger.debug("Query: %s with params: %s", query, params)
+
+    with get_connection() as con:
+        return con.execute(query, params).fetchall()
+
+
+def iter_since(filters: ChangeFilters) -> QueryStream[str]:
+    logger.info("Streaming changes after seq %d", filters.since)
+    return QueryStream(
+        functools.partial(get_stream_batch, filters),
+        lambda row: row[1],
+        settings.stream_batch_size,
+        filters.limit,
+    )
+
+
+def delete_expired(con: Connection, retention: float) -> int:
+    count = trim_change_log(con, retention)
+    logger.info("Trimmed %d changes older than %.0f seconds", count, retention)
+    return count
+
+
+@handle_db_errors
+def trim(retention: float) -> int:
+    return run_write(delete_expired, retention)
@@ -0,0 +1,38 @@
+import asyncio
+import logging
+from typing import AsyncIterator, List
+
+from integrationsandbox.changes import async_repository as repository
+from integrationsandbox.changes.models import ChangeFilters
+from integrationsandbox.common.exceptions import ExpiredError
+from integrationsandbox.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+async def stream_changes(filters: ChangeFilters) -> AsyncIterator[List[str]]:
+    logger.info("Streaming changes with filters")
+    logger.debug("Filters: %s", filters.model_dump())
+    trimmed_seq = await repository.get_trimmed_seq()
+    if filters.since < trimmed_seq:
+        logger.warning("Changes after seq %d were trimmed", filters.since)
+        raise ExpiredError(
+            f"Changes up to seq {trimmed_seq} are no longer retained, "
+            "read the full tables again and continue from the latest seq."
+        )
+    return await repository.iter_since(filters)
+
+
+async def trim_changes() -> int:
+    return await repository.trim(get_settings().change_log_retention)
+
+
+async def trim_changes_periodically() -> None:
+    """Trim the change log every CHANGE_LOG_TRIM_INTERVAL seconds until cancelled."""
+    settings = get_settings()
+    while True:
+        await asyncio.sleep(settings.change_log_trim_interval)
+        try:
+            await trim_changes()
+        except Exception:
+            logger.exception("Failed to trim the change log")
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import random
+import threading
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from integrationsandbox.config import get_settings
+from integrationsandbox.infrastructure.exceptions import ConcurrencyError
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+T = TypeVar("T")
+
+
+class ConflictCounter:
+    """Counts optimistic concurrency conflicts and the ones that ran out of retries."""
+
+    def __init__(self):
+        self.conflicts = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record_conflict(self) -> None:
+        with self._lock:
+            self.conflicts += 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conflicts = 0
+            self.failures = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"conflicts": self.conflicts, "failures": self.failures}
+
+
+conflict_counter = ConflictCounter()
+
+
+async def retry_on_conflict(
+    func: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any
+) -> T:
+    """Run a read-then-write and start over when the write finds the row changed
+    since the read. Waits a jittered, doubling backoff between attempts and gives up
+    after conflict_max_retries retries."""
+    for attempt in range(settings.conflict_max_retries + 1):
+        try:
+            return await func(*args, **kwargs)
+        except ConcurrencyError as e:
+            conflict_counter.record_conflict()
+            if attempt == settings.conflict_max_retries:
+                conflict_counter.record_failure()
+                logger.warning("Giving up after %d retries: %s", attempt, e)
+                raise
+            delay = settings.conflict_backoff * 2**attempt
+            logger.info("Concurrent update, retrying in up to %.3fs: %s", delay, e)
+            await asyncio.sleep(random.uniform(0, delay))
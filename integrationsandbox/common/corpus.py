@@ -0,0 +1,95 @@
+"""
+Pools of realistic names, addresses and coordinates for the data factories.
+
+Faker string generation is the slowest part of building shipments and events, so
+every entity is generated once per process and sampled afterwards. CORPUS_POOL_SIZE
+sets the size of each pool: larger pools give more variety but take longer to build
+on the first seed request. The pools are always generated from the same seed, so
+seeded data comes out the same in every process.
+"""
+
+import logging
+import random
+import threading
+from typing import List, NamedTuple, Sequence, Tuple
+
+from faker import Faker
+
+from integrationsandbox.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+ADDRESS_LOCALES = ("it_IT", "en_GB", "nl_NL", "fr_FR", "de_DE")
+CORPUS_SEED = 0
+
+
+class CorpusLocation(NamedTuple):
+    name: str
+    address: str
+    city: str
+    postal_code: str
+    country: str
+
+
+class Corpus:
+    def __init__(self, size: int, locales: Sequence[str] = ADDRESS_LOCALES):
+        size = max(size, 1)
+        rng = random.Random(CORPUS_SEED)
+        fake = Faker()
+        fake.random = rng
+        localed_fakers = [Faker(locale) for locale in locales]
+        for localed_faker in localed_fakers:
+            localed_faker.random = rng
+            # it_IT builds its list of cities from a set, so its order depends on
+            # PYTHONHASHSEED. Sorted, the corpus is the same in every process.
+            for provider in localed_faker.get_providers():
+                if isinstance(getattr(provider, "cities", None), list):
+                    provider.cities = sorted(provider.cities)
+        self.companies: List[str] = [fake.company() for _ in range(size)]
+        self.locations: List[CorpusLocation] = [
+            self.create_location(rng.choice(localed_fakers)) for _ in range(size)
+        ]
+        self.coordinates: List[Tuple[float, float]] = [
+            (float(fake.latitude()), float(fake.longitude())) for _ in range(size)
+        ]
+
+    @staticmethod
+    def create_location(localed_faker: Faker) -> CorpusLocation:
+        return CorpusLocation(
+            name=localed_faker.company(),
+            address=localed_faker.street_address().replace("\n", " "),
+            city=localed_faker.city(),
+            postal_code=localed_faker.postcode(),
+            country=localed_faker.current_country_code(),
+        )
+
+    def company(self, rng: random.Random) -> str:
+        return rng.choice(self.companies)
+
+    def location(self, rng: random.Random) -> CorpusLocation:
+        return rng.choice(self.locations)
+
+    def coordinate(self, rng: random.Random) -> Tuple[float, float]:
+        return rng.choice(self.coordinates)
+
+
+_corpus: Corpus | None = None
+_corpus_lock = threading.Lock()
+
+
+def get_corpus() -> Corpus:
+    global _corpus
+    with _corpus_lock:
+        if _corpus is None:
+            size = get_settings().corpus_pool_size
+            logger.info("Building a corpus of %d entities per pool", size)
+            _corpus = Corpus(size)
+        return _corpus
+
+
+def set_corpus(corpus: Corpus) -> None:
+    """Use a corpus built elsewhere, so generation pool workers sample from the same
+    entities as the process that started them."""
+    global _corpus
+    with _corpus_lock:
+        _corpus = corpus
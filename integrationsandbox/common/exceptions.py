@@ -8,3 +8,9 @@ class NotFoundError(Exception):
     """Requested entity not found"""
 
     pass
+
+
+class ExpiredError(Exception):
+    """Requested data is no longer retained"""
+
+    pass
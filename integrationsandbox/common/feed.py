@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Set, Tuple
+
+from fastapi import Header, Query
+
+from integrationsandbox.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Fetches the rows after a cursor and returns them with the cursor of the last row.
+FetchPage = Callable[[str | None], Awaitable[Tuple[List[str] | None, str | None]]]
+
+
+class Subscription:
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    async def wait(self, timeout: float) -> bool:
+        """Wait until rows were written since the last wait, or for timeout seconds."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except TimeoutError:
+            return False
+        self.event.clear()
+        return True
+
+
+class FeedNotifier:
+    """Wakes feed subscribers when rows are written to a table. Writes can finish on
+    any thread or event loop, so subscribers are woken with call_soon_threadsafe.
+
+    Only writes from this process are seen. Feeds also poll every FEED_POLL_INTERVAL
+    seconds to pick up rows written by other workers."""
+
+    def __init__(self):
+        self._subscriptions: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def subscribe(self, channel: str) -> Iterator[Subscription]:
+        subscription = Subscription(asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions[channel].add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscriptions[channel].discard(subscription)
+
+    def notify(self, channel: str) -> None:
+        with self._lock:
+            subscriptions = list(self._subscriptions[channel])
+        logger.debug("Waking %d subscribers of %s", len(subscriptions), channel)
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.event.set)
+            except RuntimeError:
+                # The subscriber's event loop is already closed.
+                pass
+
+
+notifier = FeedNotifier()
+
+
+async def follow(
+    channel: str, fetch: FetchPage, after: str | None, timeout: float
+) -> AsyncIterator[Tuple[List[str], str]]:
+    """Yield every page of rows after the cursor, waiting for new rows to be written
+    until timeout seconds have passed.
+
+    The cursor is a row_id, so only inserted rows are seen. Rows that are updated in
+    place, like re-sent broker events or rows set back to new, keep their row_id and
+    are not yielded again. The change log has those."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    # Subscribe before the first query, so a write right after it isn't missed.
+    with notifier.subscribe(channel) as subscription:
+        while True:
+            documents, cursor = await fetch(after)
+            if documents:
+                after = cursor
+                yield documents, cursor
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            if not documents:
+                await subscription.wait(min(remaining, settings.feed_poll_interval))
+
+
+def get_feed_timeout(
+    timeout: float = Query(
+        default=30,
+        gt=0,
+        le=settings.feed_max_timeout,
+        description="Seconds to wait for new records before the response ends.",
+    ),
+) -> float:
+    return timeout
+
+
+def get_last_event_id(
+    last_event_id: str | None = Header(
+        default=None,
+        description="Sent by EventSource clients when they reconnect, used as the "
+        "cursor if there is no 'after' parameter.",
+    ),
+) -> str | None:
+    return last_event_id
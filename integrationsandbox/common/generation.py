@@ -0,0 +1,111 @@
+"""
+Spreads the generation of large seed and trigger requests over a process pool.
+
+Building shipments and events is pure Python and holds the GIL, so threads don't
+help. Requests are split into shards of SHARD_SIZE items, and every shard gets its
+own sub-seed drawn from the request seed. The shards run in GENERATION_POOL_SIZE
+worker processes once a request holds GENERATION_PARALLEL_THRESHOLD items, and in the
+calling thread otherwise. The results are merged in shard order.
+
+The shards only depend on the count and the seed, never on the pool size or the
+threshold, so a seed gives the same data with or without the pool.
+"""
+
+import hashlib
+import itertools
+import logging
+import multiprocessing
+import os
+import random
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, List, Sequence, Tuple, TypeVar
+
+from integrationsandbox.common.corpus import get_corpus, set_corpus
+from integrationsandbox.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Changing this changes the data generated for a seed.
+SHARD_SIZE = 250
+
+T = TypeVar("T")
+# Builds the items of a shard, called with the shard's arguments and sub-seed.
+BuildShard = Callable[..., List[T]]
+
+
+def split(
+    count: int, seed: int | None, size: int = SHARD_SIZE
+) -> List[Tuple[int, int, int | None]]:
+    """Split count items into (start, stop, sub-seed) shards of size items. A single
+    shard keeps the seed itself, so small requests generate what one factory would."""
+    if count <= size:
+        return [(0, count, seed)]
+    rng = random.Random(seed) if seed is not None else None
+    return [
+        (start, min(start + size, count), rng.getrandbits(64) if rng else None)
+        for start in range(0, count, size)
+    ]
+
+
+def get_default_pool_size() -> int:
+    """Every uvicorn worker starts its own pool, so the CPUs are shared between the
+    WORKERS set by the launcher instead of every worker taking all of them."""
+    workers = get_settings().workers or 1
+    return max((os.cpu_count() or 1) // workers, 1)
+
+
+def derive_seed(seed: int | None, *parts: str) -> int | None:
+    """Seed for data that also depends on parts, so the same seed with other parts
+    doesn't generate the same ids. Unlike hash() it's the same in every process."""
+    if seed is None:
+        return None
+    digest = hashlib.sha256("\0".join([str(seed), *parts]).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+class GenerationPool:
+    """Runs shards in a spawned process pool, which is started on first use. Spawn
+    instead of fork, as forking a process with running threads and open database
+    connections isn't safe. Workers get this process's corpus instead of building
+    their own."""
+
+    def __init__(self, size: int | None, threshold: int):
+        self.size = size if size is not None else get_default_pool_size()
+        self.threshold = threshold
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+
+    def get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                logger.info("Starting a generation pool of %d processes", self.size)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.size,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=set_corpus,
+                    initargs=(get_corpus(),),
+                )
+            return self._executor
+
+    def run(self, build: BuildShard, count: int, shards: Sequence[Tuple]) -> List[T]:
+        """Call build with the arguments of every shard and merge the results in
+        order. The shards run in the pool if they hold threshold items or more."""
+        if self.size <= 1 or len(shards) <= 1 or count < self.threshold:
+            results = (build(*shard) for shard in shards)
+        else:
+            logger.info("Generating %d items in %d shards", count, len(shards))
+            results = self.get_executor().map(build, *zip(*shards))
+        return list(itertools.chain.from_iterable(results))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+
+settings = get_settings()
+pool = GenerationPool(
+    settings.generation_pool_size, settings.generation_parallel_threshold
+)
@@ -0,0 +1,29 @@
+from typing import List
+
+from pydantic import BaseModel, Field, PositiveInt
+
+from integrationsandbox.config import get_settings
+
+
+class ClaimRequest(BaseModel):
+    owner: str = Field(
+        min_length=1, description="Name of the worker that claims the records."
+    )
+    limit: PositiveInt = Field(
+        default=10,
+        description="Maximum number of records to claim.",
+        le=get_settings().max_bulk_size,
+    )
+    lease_seconds: PositiveInt = Field(
+        default=60,
+        description="Seconds until unacknowledged records can be claimed again.",
+    )
+
+
+class LeaseRequest(BaseModel):
+    owner: str = Field(min_length=1, description="Name of the worker that claimed.")
+    ids: List[str] = Field(
+        min_length=1,
+        description="Ids of the claimed records.",
+        max_length=get_settings().max_bulk_size,
+    )
@@ -0,0 +1,5 @@
+from pydantic import BaseModel, Field
+
+
+class UpdateResult(BaseModel):
+    count: int = Field(description="Number of records that were updated.")
@@ -0,0 +1,50 @@
+import base64
+import binascii
+from typing import Any, List, Sequence
+
+from fastapi import Request, Response
+
+from integrationsandbox.common.exceptions import ValidationError
+
+CURSOR_PREFIX = "row:"
+
+
+def encode_cursor(row_id: int) -> str:
+    raw = f"{CURSOR_PREFIX}{row_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        if not raw.startswith(CURSOR_PREFIX):
+            raise ValueError(raw)
+        return int(raw.removeprefix(CURSOR_PREFIX))
+    except (ValueError, UnicodeError, binascii.Error):
+        raise ValidationError(f"Invalid cursor: {cursor}")
+
+
+def get_next_cursor(rows: List[Sequence[Any]], limit: int | None) -> str | None:
+    """Rows start with their row_id. A full page means there may be more rows."""
+    if not rows or not limit or len(rows) < limit:
+        return None
+    return encode_cursor(rows[-1][0])
+
+
+def get_last_cursor(rows: List[Sequence[Any]]) -> str | None:
+    """Cursor after the last row, whether or not the page is full."""
+    return encode_cursor(rows[-1][0]) if rows else None
+
+
+def set_next_page_headers(
+    request: Request, response: Response, next_cursor: str | None
+) -> None:
+    if not next_cursor:
+        return
+    # The cursor replaces skip, sending both would skip rows twice.
+    next_url = request.url.remove_query_params("skip").include_query_params(
+        after=next_cursor
+    )
+    response.headers["Link"] = f'<{next_url}>; rel="next"'
+    response.headers["X-Next-Cursor"] = next_cursor
@@ -0,0 +1,11 @@
+from typing import List
+
+from fastapi import Response
+
+
+def raw_json_response(documents: List[str] | None) -> Response:
+    """JSON array of stored documents. They were serialized by the models when they
+    were written, so they're sent as they are instead of being validated and
+    serialized again."""
+    body = "[" + ",".join(documents) + "]" if documents else "null"
+    return Response(content=body, media_type="application/json")
@@ -0,0 +1,78 @@
+from enum import Enum
+from typing import AsyncIterator, List, Tuple
+
+from fastapi import Query, Request
+from fastapi.responses import StreamingResponse
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+EVENT_STREAM_MEDIA_TYPE = "text/event-stream"
+
+
+class StreamFormat(str, Enum):
+    NDJSON = "ndjson"
+    JSON = "json"
+
+
+def get_stream_format(
+    request: Request,
+    stream: StreamFormat | None = Query(
+        default=None,
+        description="Stream the results as NDJSON or as a chunked JSON array. "
+        "Sending 'Accept: application/x-ndjson' selects NDJSON as well.",
+    ),
+) -> StreamFormat | None:
+    if stream:
+        return stream
+    if NDJSON_MEDIA_TYPE in request.headers.get("accept", ""):
+        return StreamFormat.NDJSON
+    return None
+
+
+async def encode_ndjson(batches: AsyncIterator[List[str]]) -> AsyncIterator[str]:
+    async for batch in batches:
+        yield "".join(f"{document}\n" for document in batch)
+
+
+async def encode_json_array(batches: AsyncIterator[List[str]]) -> AsyncIterator[str]:
+    separator = "["
+    async for batch in batches:
+        yield separator + ",".join(batch)
+        separator = ","
+    yield "[]" if separator == "[" else "]"
+
+
+def streaming_response(
+    batches: AsyncIterator[List[str]], stream_format: StreamFormat
+) -> StreamingResponse:
+    """Send the stored JSON documents as they're fetched, one chunk per batch. Unlike the regular
+    list response an empty result is sent as an empty array (or no lines) instead of
+    null, and there are no next page headers because they'd have to be sent before
+    the rows are read."""
+    if stream_format == StreamFormat.NDJSON:
+        return StreamingResponse(encode_ndjson(batches), media_type=NDJSON_MEDIA_TYPE)
+    return StreamingResponse(encode_json_array(batches), media_type="application/json")
+
+
+def accepts_event_stream(request: Request) -> bool:
+    return EVENT_STREAM_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def encode_event_stream(
+    pages: AsyncIterator[Tuple[List[str], str]],
+) -> AsyncIterator[str]:
+    # Only the last record of a page carries the cursor as its id. A client that
+    # reconnects with Last-Event-ID gets the rest of an interrupted page again.
+    async for documents, cursor in pages:
+        events = [f"data: {document}\n\n" for document in documents]
+        events[-1] = f"id: {cursor}\n" + events[-1]
+        yield "".join(events)
+
+
+def event_stream_response(
+    pages: AsyncIterator[Tuple[List[str], str]],
+) -> StreamingResponse:
+    return StreamingResponse(
+        encode_event_stream(pages),
+        media_type=EVENT_STREAM_MEDIA_TYPE,
+        headers={"Cache-Control": "no-cache"},
+    )
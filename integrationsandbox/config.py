@@ -1,5 +1,5 @@
-import secrets
 from functools import lru_cache
+from typing import Literal
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -12,16 +12,48 @@ def get_settings():
 class Settings(BaseSettings):
     default_user: str = "sandy"
     default_password: str = "sandbox"
+    users: dict[str, str] = {}
     jwt_algorithm: str = "HS256"
     jwt_expire_minutes: int = 15
-    jwt_secret_key: str = secrets.token_hex(32)
-    webhook_api_key: str = secrets.token_hex(32)
+    token_cache_size: int = 1024
+    token_reuse: bool = False
+    bcrypt_rounds: int = 12
+    # Generated once and shared through the database when not set, see
+    # database.load_shared_secrets().
+    jwt_secret_key: str | None = None
+    webhook_api_key: str | None = None
     max_bulk_size: int = 1000
+    bulk_seed_max_count: int = 10_000_000
+    bulk_seed_chunk_size: int = 1000
     float_precision: int = 2
     database_path: str = "integrationsandbox/infrastructure/db.sqlite3"
+    database_pool_size: int = 8
+    database_pool_timeout: float = 30.0
+    database_journal_mode: Literal["DELETE", "TRUNCATE", "PERSIST", "WAL"] = "WAL"
+    database_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    database_cache_size: int = -16000
+    database_mmap_size: int = 134217728
+    database_busy_timeout: int = 5000
+    database_writer: bool = False
+    database_writer_batch_size: int = 256
+    database_writer_max_latency: float = 0.001
+    database_writer_fire_and_forget: bool = False
+    stream_batch_size: int = 500
+    conflict_max_retries: int = 5
+    conflict_backoff: float = 0.01
+    broker_event_reset_processed: bool = True
+    feed_poll_interval: float = 5.0
+    feed_max_timeout: float = 300.0
+    change_log_retention: float = 604800.0
+    change_log_trim_interval: float = 300.0
+    corpus_pool_size: int = 500
+    # Defaults to the number of CPUs divided by the number of workers.
+    generation_pool_size: int | None = None
+    generation_parallel_threshold: int = 1000
     log_file_path: str = "fastapi.log"
     log_file_maxbytes: int = 10485760
     log_level: str = "INFO"
+    workers: int | None = None
     cors_origins: list[str] = ["*"]
     cors_credentials: bool = True
     cors_methods: list[str] = ["*"]
@@ -29,6 +61,26 @@ class Settings(BaseSettings):
 
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
+    @property
+    def log_file_handler(self):
+        # Rotating from several worker processes at once loses or garbles records.
+        # Workers append to one file instead and rotation is left to e.g. logrotate.
+        if (self.workers or 1) > 1:
+            return {
+                "class": "logging.handlers.WatchedFileHandler",
+                "level": self.log_level,
+                "formatter": "default",
+                "filename": self.log_file_path,
+            }
+        return {
+            "class": "logging.handlers.RotatingFileHandler",
+            "level": self.log_level,
+            "formatter": "default",
+            "filename": self.log_file_path,
+            "maxBytes": self.log_file_maxbytes,
+            "backupCount": 5,
+        }
+
     @property
     def log_config(self):
         return {
@@ -47,14 +99,7 @@ class Settings(BaseSettings):
                     "formatter": "default",
                     "stream": "ext://sys.stdout",
                 },
-                "rotating_file": {
-                    "class": "logging.handlers.RotatingFileHandler",
-                    "level": self.log_level,
-                    "formatter": "default",
-                    "filename": self.log_file_path,
-                    "maxBytes": self.log_file_maxbytes,
-                    "backupCount": 5,
-                },
+                "rotating_file": self.log_file_handler,
             },
             "loggers": {
                 "integrationsandbox": {
@@ -94,6 +139,10 @@ tags_metadata = [
         "name": "Trigger",
         "description": "Send TMS shipments or Broker events to a webhook.",
     },
+    {
+        "name": "Changes",
+        "description": "Sync TMS shipments and Broker events incrementally.",
+    },
     {
         "name": "System",
         "description": "Operations with sys health and users. The **login** logic is also here.",
@@ -1,36 +1,532 @@
+import asyncio
+import functools
+import logging
+import queue
+import secrets
 import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import closing, contextmanager
 from sqlite3 import Connection
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Generic,
+    Iterator,
+    List,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
 
 from integrationsandbox.config import get_settings
+from integrationsandbox.infrastructure.writer import GroupCommitWriter
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Secrets every worker process must agree on. Values set in the environment win,
+# the others are generated by the first process and read from the database by the rest.
+SHARED_SECRETS = ("jwt_secret_key", "webhook_api_key")
+_configured_secrets = {name for name in SHARED_SECRETS if getattr(settings, name)}
+
+
+def configure_connection(con: Connection) -> None:
+    # PRAGMA values can't be bound as parameters. They're validated by Settings.
+    con.execute(f"PRAGMA busy_timeout = {int(settings.database_busy_timeout)}")
+    con.execute(f"PRAGMA synchronous = {settings.database_synchronous}")
+    con.execute(f"PRAGMA cache_size = {int(settings.database_cache_size)}")
+    con.execute(f"PRAGMA mmap_size = {int(settings.database_mmap_size)}")
+
 
 def create_connection() -> Connection:
-    return sqlite3.connect(settings.database_path)
+    # check_same_thread is off because pooled connections move between the
+    # threads of the FastAPI threadpool. The pool makes sure only one thread uses
+    # a connection at a time.
+    con = sqlite3.connect(
+        settings.database_path,
+        timeout=settings.database_busy_timeout / 1000,
+        check_same_thread=False,
+    )
+    configure_connection(con)
+    return con
 
 
-def setup() -> None:
-    with create_connection() as con:
+class ConnectionPool:
+    """Bounded pool of long-lived connections. Connections are created lazily up to
+    `size` and handed out to one caller at a time."""
+
+    def __init__(self, size: int, timeout: float):
+        self.size = size
+        self.timeout = timeout
+        self._idle: queue.LifoQueue[Connection] = queue.LifoQueue(maxsize=size)
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def acquire(self) -> Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+        if can_create:
+            try:
+                return create_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            # raised as a sqlite error so handle_db_errors reports it like the rest.
+            raise sqlite3.OperationalError(
+                f"Timed out after {self.timeout}s waiting for a database connection"
+            )
+
+    def release(self, con: Connection) -> None:
+        if con.in_transaction:
+            con.rollback()
+        if self._closed:
+            con.close()
+            return
+        self._idle.put_nowait(con)
+
+    def close(self) -> None:
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pool: ConnectionPool | None = None
+_writer: GroupCommitWriter | None = None
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+T = TypeVar("T")
+
+
+@contextmanager
+def get_connection() -> Iterator[Connection]:
+    """Borrow a connection for one transaction. Commits on success, rolls back on
+    error. Falls back to a fresh connection when pooling is disabled."""
+    pool = _pool
+    if pool is None:
+        with closing(create_connection()) as con:
+            with con:
+                yield con
+        return
+
+    con = pool.acquire()
+    try:
+        with con:
+            yield con
+    finally:
+        pool.release(con)
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # One thread per pooled connection so the threads never wait on the pool.
+            _executor = ThreadPoolExecutor(
+                max_workers=max(settings.database_pool_size, 1),
+                thread_name_prefix="database",
+            )
+        return _executor
+
+
+async def run_in_db_executor(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run blocking database work on the dedicated database threads, so it never
+    competes with request handling for the threads of the default threadpool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        get_executor(), functools.partial(func, *args, **kwargs)
+    )
+
+
+# Fetches up to `size` rows after the key of the previous batch, None for the first
+# batch. Rows start with their key, e.g. the row_id.
+FetchBatch = Callable[[Any | None, int], List[Sequence[Any]]]
+
+
+class QueryStream(Generic[T]):
+    """Rows of a read query fetched in keyset batches, so large results never sit in
+    memory at once. Every batch is its own query on a connection borrowed just for
+    that query, so slow readers don't hold on to pooled connections or WAL read
+    snapshots. Rows written while streaming may be included."""
+
+    def __init__(
+        self,
+        fetch_batch: FetchBatch,
+        transform: Callable[[Any], T],
+        batch_size: int,
+        limit: int | None = None,
+    ):
+        self.fetch_batch = fetch_batch
+        self.transform = transform
+        self.batch_size = max(batch_size, 1)
+        self._remaining = limit
+        self._key: Any | None = None
+        self._done = False
+        # The first batch runs here, so a bad query fails before anything is streamed.
+        self._first: List[Sequence[Any]] | None = self._fetch_rows()
+
+    def _fetch_rows(self) -> List[Sequence[Any]]:
+        size = self.batch_size
+        if self._remaining is not None:
+            size = min(size, self._remaining)
+        if self._done or size <= 0:
+            return []
+        rows = self.fetch_batch(self._key, size)
+        if len(rows) < size:
+            self._done = True
+        if rows:
+            self._key = rows[-1][0]
+        if self._remaining is not None:
+            self._remaining -= len(rows)
+        return rows
+
+    def fetch(self) -> List[T]:
+        if self._first is not None:
+            rows, self._first = self._first, None
+        else:
+            rows = self._fetch_rows()
+        return [self.transform(row) for row in rows]
+
+    def close(self) -> None:
+        self._done = True
+        self._first = None
+
+
+async def iterate_in_db_executor(stream: QueryStream[T]) -> AsyncIterator[List[T]]:
+    try:
+        while batch := await run_in_db_executor(stream.fetch):
+            yield batch
+    finally:
+        await run_in_db_executor(stream.close)
+
+
+def submit_write(
+    writer: GroupCommitWriter,
+    func: Callable[..., T],
+    args: Tuple[Any, ...],
+    detach: bool,
+    on_commit: Callable[[], None] | None = None,
+) -> Future | None:
+    future = writer.submit(lambda con: func(con, *args))
+    if on_commit is not None:
+        # The writer resolves futures only after their batch is committed.
+        future.add_done_callback(functools.partial(call_if_committed, on_commit))
+    if detach and settings.database_writer_fire_and_forget:
+        future.add_done_callback(log_detached_write_error)
+        return None
+    return future
+
+
+def call_if_committed(on_commit: Callable[[], None], future: Future) -> None:
+    if not future.cancelled() and future.exception() is None:
+        on_commit()
+
+
+def log_detached_write_error(future: Future) -> None:
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("Fire-and-forget write failed", exc_info=future.exception())
+
+
+def run_write(
+    func: Callable[..., T],
+    *args: Any,
+    detach: bool = False,
+    on_commit: Callable[[], None] | None = None,
+) -> T | None:
+    """Run func(con, *args) in a transaction. With the group-commit writer enabled it
+    shares the transaction with other writes. Detached writes return right away
+    without a result when DATABASE_WRITER_FIRE_AND_FORGET is on. on_commit is called
+    once the write is committed, which may be after a detached write returned."""
+    writer = _writer
+    if writer is None:
+        with get_connection() as con:
+            result = func(con, *args)
+        if on_commit is not None:
+            on_commit()
+        return result
+    future = submit_write(writer, func, args, detach, on_commit)
+    return future.result() if future is not None else None
+
+
+async def run_write_async(
+    func: Callable[..., T],
+    *args: Any,
+    detach: bool = False,
+    on_commit: Callable[[], None] | None = None,
+) -> T | None:
+    """run_write for async code. Waiting on the writer doesn't hold a database
+    thread, so all requests in flight can have a write in the same batch."""
+    writer = _writer
+    if writer is None:
+        return await run_in_db_executor(run_write, func, *args, on_commit=on_commit)
+    future = submit_write(writer, func, args, detach, on_commit)
+    return await asyncio.wrap_future(future) if future is not None else None
+
+
+def get_writer_stats() -> Dict[str, int] | None:
+    writer = _writer
+    return writer.stats() if writer is not None else None
+
+
+def close() -> None:
+    global _pool, _writer, _executor
+    if _writer is not None:
+        # Before the pool, the queued writes still need a connection.
+        _writer.close()
+        _writer = None
+    if _pool is not None:
+        _pool.close()
+        _pool = None
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+# Columns added after the first release. They're added with ALTER TABLE so existing
+# database files are migrated by setup() as well.
+TMS_SHIPMENT_COLUMNS = {
+    # Generated from the JSON document so filters on them can use an index instead
+    # of parsing the JSON of every row.
+    "external_reference": "TEXT GENERATED ALWAYS AS "
+    "(json_extract(data, '$.external_reference')) VIRTUAL",
+    "customer_id": "TEXT GENERATED ALWAYS AS "
+    "(json_extract(data, '$.customer.id')) VIRTUAL",
+    "carrier": "TEXT GENERATED ALWAYS AS "
+    "(json_extract(data, '$.customer.carrier')) VIRTUAL",
+    # Bumped by every update, so a conditional update can tell the row changed
+    # since it was read.
+    "version": "INTEGER NOT NULL DEFAULT 0",
+    # Set while a worker has claimed the row, see infrastructure.leases.
+    "lease_owner": "TEXT",
+    "lease_expires_at": "TEXT",
+}
+BROKER_EVENT_COLUMNS = {
+    "carrier": "TEXT GENERATED ALWAYS AS (json_extract(data, '$.carrier')) VIRTUAL",
+    "version": "INTEGER NOT NULL DEFAULT 0",
+    "lease_owner": "TEXT",
+    "lease_expires_at": "TEXT",
+}
+
+INDEXES = (
+    "CREATE INDEX IF NOT EXISTS tms_shipment_external_reference "
+    "ON tms_shipment(external_reference)",
+    "CREATE INDEX IF NOT EXISTS tms_shipment_customer_id ON tms_shipment(customer_id)",
+    "CREATE INDEX IF NOT EXISTS tms_shipment_carrier ON tms_shipment(carrier)",
+    # Partial indexes keep polling for new rows flat as the processed rows pile up.
+    "CREATE INDEX IF NOT EXISTS tms_shipment_unprocessed "
+    "ON tms_shipment(row_id) WHERE processed_at IS NULL",
+    "CREATE INDEX IF NOT EXISTS broker_event_event_type ON broker_event(event_type)",
+    "CREATE INDEX IF NOT EXISTS broker_event_carrier ON broker_event(carrier)",
+    "CREATE INDEX IF NOT EXISTS broker_event_unprocessed "
+    "ON broker_event(row_id) WHERE processed_at IS NULL",
+)
+
+# Every insert, update, processed mark and delete of a shipment or broker event is
+# appended to change_log. Lease changes aren't, they only matter to the workers.
+CHANGE_LOG_TABLES = ("tms_shipment", "broker_event")
+CHANGE_LOG_TRIGGERS = (
+    """
+    CREATE TRIGGER IF NOT EXISTS {table}_change_insert AFTER INSERT ON {table}
+    BEGIN
+        INSERT INTO change_log(table_name, row_id, id, operation)
+        VALUES('{table}', NEW.row_id, NEW.id, 'insert');
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {table}_change_update
+    AFTER UPDATE OF data, processed_at ON {table}
+    WHEN NEW.data IS NOT OLD.data OR NEW.processed_at IS NOT OLD.processed_at
+    BEGIN
+        INSERT INTO change_log(table_name, row_id, id, operation)
+        VALUES('{table}', NEW.row_id, NEW.id, CASE
+            WHEN NEW.data IS NOT OLD.data THEN 'update'
+            WHEN NEW.processed_at IS NULL THEN 'unprocessed'
+            ELSE 'processed' END);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS {table}_change_delete AFTER DELETE ON {table}
+    BEGIN
+        INSERT INTO change_log(table_name, row_id, id, operation)
+        VALUES('{table}', OLD.row_id, OLD.id, 'delete');
+    END
+    """,
+)
+
+
+def add_missing_columns(con: Connection, table: str, columns: dict[str, str]) -> None:
+    # table_xinfo also lists generated columns, table_info doesn't.
+    existing = {row[1] for row in con.execute(f"PRAGMA table_xinfo({table})")}
+    for name, definition in columns.items():
+        if name not in existing:
+            con.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+
+
+def load_shared_secrets(con: Connection) -> None:
+    for name in SHARED_SECRETS:
+        if name in _configured_secrets:
+            continue
         con.execute(
-            """
-            CREATE TABLE IF NOT EXISTS tms_shipment(
-                row_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                id TEXT UNIQUE NOT NULL,
-                data JSON,
-                processed_at TEXT)
-            """
+            "INSERT OR IGNORE INTO sandbox_secret(name, value) VALUES(?, ?)",
+            (name, secrets.token_hex(32)),
         )
+        row = con.execute(
+            "SELECT value FROM sandbox_secret WHERE name = ?", (name,)
+        ).fetchone()
+        setattr(settings, name, row[0])
 
-        con.execute(
-            """
-            CREATE TABLE IF NOT EXISTS broker_event(
-                row_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                id TEXT UNIQUE NOT NULL,
-                shipment_id TEXT,
-                event_type TEXT,
-                data JSON,
-                processed_at TEXT,
-                UNIQUE(shipment_id,event_type))
-            """
+
+def backfill_shipment_events(con: Connection) -> None:
+    """Copy timeline events of shipments stored before tms_shipment_event existed."""
+    con.execute(
+        """
+        INSERT OR IGNORE INTO tms_shipment_event(id, shipment_id, event_type, data)
+        SELECT json_extract(e.value, '$.id'), s.id,
+            json_extract(e.value, '$.event_type'), e.value
+        FROM tms_shipment s, json_each(s.data, '$.timeline_events') e
+        ORDER BY s.row_id, e.key
+        """
+    )
+
+
+def trim_change_log(con: Connection, retention: float) -> int:
+    """Delete changes older than retention seconds, 0 keeps them all. seq and
+    changed_at grow together, so only the expired rows at the start are read."""
+    if retention <= 0:
+        return 0
+    cursor = con.execute(
+        """
+        DELETE FROM change_log WHERE seq < coalesce(
+            (SELECT seq FROM change_log
+             WHERE changed_at >= strftime('%Y-%m-%dT%H:%M:%fZ', 'now', ?)
+             ORDER BY seq LIMIT 1),
+            (SELECT max(seq) + 1 FROM change_log))
+        """,
+        (f"-{retention} seconds",),
+    )
+    return cursor.rowcount
+
+
+def setup() -> None:
+    """Create the schema and shared secrets, then (re)create the connection pool.
+    Safe to call from several worker processes at once: the schema is created in
+    one IMMEDIATE transaction, so other processes wait on busy_timeout."""
+    global _pool, _writer
+    close()
+    with closing(create_connection()) as con:
+        # journal_mode is persistent and must be set outside of a transaction.
+        con.execute(f"PRAGMA journal_mode = {settings.database_journal_mode}")
+        with con:
+            con.execute("BEGIN IMMEDIATE")
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tms_shipment(
+                    row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT UNIQUE NOT NULL,
+                    data JSON,
+                    processed_at TEXT)
+                """
+            )
+
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS broker_event(
+                    row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT UNIQUE NOT NULL,
+                    shipment_id TEXT,
+                    event_type TEXT,
+                    data JSON,
+                    processed_at TEXT,
+                    UNIQUE(shipment_id,event_type))
+                """
+            )
+
+            # Timeline events of a shipment, one row per event type. The
+            # timeline_events of the shipment document are rebuilt from these rows.
+            has_shipment_events = con.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'tms_shipment_event'"
+            ).fetchone()
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS tms_shipment_event(
+                    row_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT NOT NULL,
+                    shipment_id TEXT NOT NULL,
+                    event_type TEXT NOT NULL,
+                    data JSON,
+                    UNIQUE(shipment_id,event_type))
+                """
+            )
+            if not has_shipment_events:
+                backfill_shipment_events(con)
+
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sandbox_user(
+                    username TEXT PRIMARY KEY,
+                    hashed_password TEXT NOT NULL,
+                    disabled INTEGER NOT NULL DEFAULT 0)
+                """
+            )
+
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sandbox_secret(
+                    name TEXT PRIMARY KEY,
+                    value TEXT NOT NULL)
+                """
+            )
+            add_missing_columns(con, "tms_shipment", TMS_SHIPMENT_COLUMNS)
+            add_missing_columns(con, "broker_event", BROKER_EVENT_COLUMNS)
+            for index in INDEXES:
+                con.execute(index)
+
+            # AUTOINCREMENT, so seq is never reused after the log was trimmed.
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS change_log(
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    table_name TEXT NOT NULL,
+                    row_id INTEGER NOT NULL,
+                    id TEXT NOT NULL,
+                    operation TEXT NOT NULL,
+                    changed_at TEXT NOT NULL
+                        DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')))
+                """
+            )
+            for table in CHANGE_LOG_TABLES:
+                for trigger in CHANGE_LOG_TRIGGERS:
+                    con.execute(trigger.format(table=table))
+            trim_change_log(con, settings.change_log_retention)
+            load_shared_secrets(con)
+
+    if settings.database_pool_size > 0:
+        _pool = ConnectionPool(
+            settings.database_pool_size, settings.database_pool_timeout
+        )
+    if settings.database_writer:
+        _writer = GroupCommitWriter(
+            get_connection,
+            settings.database_writer_batch_size,
+            settings.database_writer_max_latency,
         )
@@ -1,3 +1,5 @@
+import functools
+import inspect
 import logging
 import sqlite3
 
@@ -10,16 +12,41 @@ class RepositoryError(Exception):
     pass
 
 
+class ConcurrencyError(RepositoryError):
+    """Row was changed by another request since it was read"""
+
+    pass
+
+
+def to_repository_error(e: sqlite3.Error) -> RepositoryError:
+    if isinstance(e, sqlite3.OperationalError):
+        logger.error("Database operational error in %s", e)
+        msg = f"Database error: {e}. This usually means the table was not found or the database file is not accessible. Restart the app to re-create the database / tables."
+        return RepositoryError(msg)
+    logger.error("Database error in %s", e)
+    return RepositoryError(f"Database error: {e}")
+
+
 def handle_db_errors(func):
+    if inspect.iscoroutinefunction(func):
+        return handle_async_db_errors(func)
+
+    @functools.wraps(func)
     def wrapper(*args, **kwargs):
         try:
             return func(*args, **kwargs)
-        except sqlite3.OperationalError as e:
-            logger.error("Database operational error in %s", e)
-            msg = f"Database error: {e}. This usually means the table was not found or the database file is not accessible. Restart the app to re-create the database / tables."
-            raise RepositoryError(msg) from e
         except sqlite3.Error as e:
-            logger.error("Database error in %s", e)
-            raise RepositoryError(f"Database error: {e}") from e
+            raise to_repository_error(e) from e
+
+    return wrapper
+
+
+def handle_async_db_errors(func):
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            return await func(*args, **kwargs)
+        except sqlite3.Error as e:
+            raise to_repository_error(e) from e
 
     return wrapper
@@ -0,0 +1,60 @@
+"""
+Leases on the unprocessed rows of tms_shipment and broker_event, so workers can claim
+new rows without handing the same row to several of them. A claimed row is
+acknowledged (marked as processed) or released by the same owner, or claimed again by
+anyone once its lease expired.
+"""
+
+import json
+from datetime import datetime, timedelta
+from sqlite3 import Connection
+from typing import List, Literal, Tuple
+
+Table = Literal["tms_shipment", "broker_event"]
+
+
+def claim(
+    con: Connection, table: Table, owner: str, limit: int, lease_seconds: int
+) -> Tuple[List[str], str]:
+    """Leases up to `limit` unprocessed rows in one statement and returns their
+    stored JSON in row order, with the expiry of the lease."""
+    now = datetime.now()
+    expires_at = (now + timedelta(seconds=lease_seconds)).isoformat(
+        timespec="microseconds"
+    )
+    rows = con.execute(
+        f"""
+        UPDATE {table}
+        SET lease_owner = ?, lease_expires_at = ?, version = version + 1
+        WHERE row_id IN (
+            SELECT row_id FROM {table}
+            WHERE processed_at IS NULL
+                AND (lease_expires_at IS NULL OR lease_expires_at <= ?)
+            ORDER BY row_id LIMIT ?
+        )
+        RETURNING row_id, data
+        """,
+        (owner, expires_at, now.isoformat(timespec="microseconds"), limit),
+    ).fetchall()
+    # RETURNING doesn't follow the ORDER BY of the subquery.
+    rows.sort()
+    return [row[1] for row in rows], expires_at
+
+
+def release(
+    con: Connection, table: Table, owner: str, ids: List[str], processed: bool
+) -> int:
+    """Ends the leases of `owner` on the given rows. Processed rows are acknowledged,
+    the others go back to the queue. Returns the number of rows that were released."""
+    processed_at = datetime.now().isoformat() if processed else None
+    cursor = con.execute(
+        f"""
+        UPDATE {table}
+        SET lease_owner = NULL, lease_expires_at = NULL,
+            processed_at = coalesce(?, processed_at), version = version + 1
+        WHERE id IN (SELECT value FROM json_each(?))
+            AND lease_owner = ? AND processed_at IS NULL
+        """,
+        (processed_at, json.dumps(ids), owner),
+    )
+    return cursor.rowcount
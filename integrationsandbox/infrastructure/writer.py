@@ -0,0 +1,109 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import AbstractContextManager
+from sqlite3 import Connection
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+Write = Callable[[Connection], Any]
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """A single thread that drains a queue of writes and commits them in batches, so
+    many small writes share one transaction and one fsync. A batch is committed once
+    it holds `batch_size` writes or `max_latency` seconds after its first write.
+
+    Every write runs in its own savepoint. A failing write is rolled back on its own
+    and its future gets the error; the rest of the batch is still committed. Futures
+    are resolved only after the commit, so waiting on them keeps the durability of a
+    transaction per write."""
+
+    def __init__(
+        self,
+        connect: Callable[[], AbstractContextManager[Connection]],
+        batch_size: int,
+        max_latency: float,
+    ):
+        self.batch_size = max(batch_size, 1)
+        self.max_latency = max_latency
+        self.batches = 0
+        self.writes = 0
+        self._connect = connect
+        self._queue: queue.SimpleQueue[Tuple[Future, Write] | object] = (
+            queue.SimpleQueue()
+        )
+        self._thread = threading.Thread(
+            target=self._run, name="database-writer", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, write: Write) -> Future:
+        future: Future = Future()
+        self._queue.put((future, write))
+        return future
+
+    def close(self) -> None:
+        """Commit the writes that are still queued and stop the thread."""
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def stats(self) -> Dict[str, int]:
+        return {"batches": self.batches, "writes": self.writes}
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch: List[Tuple[Future, Write]]) -> None:
+        results = []
+        try:
+            with self._connect() as con:
+                # Explicit, so releasing the savepoints doesn't commit.
+                con.execute("BEGIN IMMEDIATE")
+                for future, write in batch:
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    con.execute("SAVEPOINT write")
+                    try:
+                        result = write(con)
+                    except Exception as e:
+                        con.execute("ROLLBACK TO write")
+                        results.append((future, None, e))
+                    else:
+                        results.append((future, result, None))
+                    con.execute("RELEASE write")
+        except Exception as e:
+            logger.exception("Failed to commit a batch of %d writes", len(batch))
+            for future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.writes += len(results)
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
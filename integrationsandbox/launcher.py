@@ -0,0 +1,42 @@
+"""
+Run the sandbox with several uvicorn worker processes.
+
+The worker count defaults to the WORKERS setting and otherwise to the number of CPU
+cores. Every worker shares the database, the JWT signing key and the webhook API key,
+so a token issued by one worker is accepted by all of them.
+
+    uv run python -m integrationsandbox.launcher --host 0.0.0.0 --port 8000
+"""
+
+import argparse
+import os
+
+import uvicorn
+
+from integrationsandbox.config import get_settings
+
+
+def get_worker_count() -> int:
+    return get_settings().workers or os.cpu_count() or 1
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the integration sandbox.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=get_worker_count())
+    args = parser.parse_args()
+
+    # Worker processes read their settings from the environment. This lets them
+    # pick the multi-process log handler.
+    os.environ["WORKERS"] = str(args.workers)
+    uvicorn.run(
+        "integrationsandbox.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,30 @@
+import asyncio
 import logging
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from logging.config import dictConfig
 
-from fastapi import FastAPI, responses
+from fastapi import Depends, FastAPI, responses
 from fastapi.middleware.cors import CORSMiddleware
 
 from integrationsandbox.broker import controller as broker_controller
-from integrationsandbox.common.exceptions import NotFoundError, ValidationError
+from integrationsandbox.changes import controller as changes_controller
+from integrationsandbox.changes.service import trim_changes_periodically
+from integrationsandbox.common import generation
+from integrationsandbox.common.concurrency import conflict_counter
+from integrationsandbox.common.exceptions import (
+    ExpiredError,
+    NotFoundError,
+    ValidationError,
+)
 from integrationsandbox.config import get_settings, tags_metadata
 from integrationsandbox.infrastructure import database
-from integrationsandbox.infrastructure.exceptions import RepositoryError
+from integrationsandbox.infrastructure.exceptions import (
+    ConcurrencyError,
+    RepositoryError,
+)
 from integrationsandbox.security import controller as security_controller
+from integrationsandbox.security import repository as security_repository
+from integrationsandbox.security.service import get_current_active_user, token_cache
 from integrationsandbox.tms import controller as tms_controller
 from integrationsandbox.trigger import controller as trigger_controller
 from integrationsandbox.utils.metadata import load_project_metadata
@@ -28,10 +42,17 @@ logger = logging.getLogger(__name__)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     database.setup()
+    security_repository.load_users()
     dictConfig(settings.log_config)
     logger.info('Your incoming Webhook API Key:"%s"', get_settings().webhook_api_key)
+    trim_task = asyncio.create_task(trim_changes_periodically())
     yield
-    pass
+    trim_task.cancel()
+    # Wait for the task to stop before the database it uses is closed.
+    with suppress(asyncio.CancelledError):
+        await trim_task
+    generation.pool.shutdown()
+    database.close()
 
 
 app = FastAPI(
@@ -55,6 +76,7 @@ app.add_middleware(
 app.include_router(trigger_controller.router, prefix=API_PREFIX)
 app.include_router(tms_controller.router, prefix=API_PREFIX)
 app.include_router(broker_controller.router, prefix=API_PREFIX)
+app.include_router(changes_controller.router, prefix=API_PREFIX)
 app.include_router(security_controller.router)
 
 
@@ -70,13 +92,34 @@ async def not_found_error_handler(request, exc):
     return responses.JSONResponse(status_code=422, content={"detail": str(exc)})
 
 
+@app.exception_handler(ExpiredError)
+async def expired_error_handler(request, exc):
+    logger.warning("Expired data requested for: %s", request.url)
+    return responses.JSONResponse(status_code=410, content={"detail": str(exc)})
+
+
 @app.exception_handler(RepositoryError)
 async def repository_error_handler(request, exc):
     logger.exception("Repository error for: %s", request.url)
     return responses.JSONResponse(status_code=500, content={"detail": str(exc)})
 
 
+@app.exception_handler(ConcurrencyError)
+async def concurrency_error_handler(request, exc):
+    logger.exception("Concurrency error for: %s", request.url)
+    return responses.JSONResponse(status_code=409, content={"detail": str(exc)})
+
+
 # Health check endpoint
 @app.get("/health", tags=["System"])
 async def health_check():
     return {"status": "healthy"}
+
+
+@app.get("/stats", tags=["System"], dependencies=[Depends(get_current_active_user)])
+async def stats():
+    return {
+        "token_cache": token_cache.stats(),
+        "concurrency": conflict_counter.stats(),
+        "writer": database.get_writer_stats(),
+    }
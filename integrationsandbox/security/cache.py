@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Generic, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class TokenCache(Generic[T]):
+    """Bounded LRU cache keyed on token material, e.g. a verified bearer token and
+    the user it resolves to. Entries expire at the given timestamp, normally the exp
+    claim of the token."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, Tuple[float, T]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> T | None:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return value
+
+    def put(self, token: str, value: T, expires_at: float) -> None:
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[token] = (expires_at, value)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
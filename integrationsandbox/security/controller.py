@@ -3,10 +3,16 @@ import logging
 from typing import Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security.utils import get_authorization_scheme_param
 
 from integrationsandbox.security.models import Token, User
-from integrationsandbox.security.service import get_current_active_user, login_user
+from integrationsandbox.security.service import (
+    get_current_active_user,
+    get_reusable_token,
+    login_client,
+    login_user,
+)
 
 from .security import OAuth2TokenRequestForm
 
@@ -54,7 +60,10 @@ async def login_for_access_token(
             )
 
         logger.info("Login attempt for client_credentials: %s", username)
-        token = login_user(username, password)
+        token = get_reusable_token(username, password)
+        if not token:
+            # bcrypt is slow on purpose, keep it off the event loop.
+            token = await run_in_threadpool(login_client, username, password)
 
     elif form_data.grant_type == "password":
         username = form_data.username
@@ -67,7 +76,7 @@ async def login_for_access_token(
             )
 
         logger.info("Login attempt for password grant: %s", username)
-        token = login_user(username, password)
+        token = await run_in_threadpool(login_user, username, password)
 
     else:
         raise HTTPException(
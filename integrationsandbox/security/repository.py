@@ -1,26 +1,84 @@
+import logging
+from typing import Dict, List
+
 import bcrypt
 
 from integrationsandbox.config import get_settings
+from integrationsandbox.infrastructure.database import get_connection
+from integrationsandbox.infrastructure.exceptions import handle_db_errors
 from integrationsandbox.security.models import UserInDB
 
+logger = logging.getLogger(__name__)
+
+# Built once by load_users(). Lookups on the request path are a dict lookup.
+_users: Dict[str, UserInDB] | None = None
+
 
 def get_password_hash(password):
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    rounds = get_settings().bcrypt_rounds
+    return bcrypt.hashpw(
+        password.encode("utf-8"), bcrypt.gensalt(rounds=rounds)
+    ).decode("utf-8")
+
+
+@handle_db_errors
+def save_users(users: List[UserInDB]) -> None:
+    logger.info("Saving %d users to database", len(users))
+    with get_connection() as con:
+        con.executemany(
+            """
+            INSERT INTO sandbox_user(username, hashed_password, disabled) VALUES(?,?,?)
+            ON CONFLICT(username) DO UPDATE SET
+                hashed_password = excluded.hashed_password,
+                disabled = excluded.disabled
+            """,
+            [
+                (user.username, user.hashed_password, bool(user.disabled))
+                for user in users
+            ],
+        )
 
 
-def get_users_db():
+@handle_db_errors
+def get_all() -> List[UserInDB]:
+    with get_connection() as con:
+        rows = con.execute(
+            "SELECT username, hashed_password, disabled FROM sandbox_user"
+        ).fetchall()
+    return [
+        UserInDB(username=row[0], hashed_password=row[1], disabled=bool(row[2]))
+        for row in rows
+    ]
+
+
+def load_users() -> Dict[str, UserInDB]:
+    """Hash the users from settings and merge them with the users table. Users
+    added directly to the table must already have a bcrypt hash."""
+    global _users
     settings = get_settings()
-    return {
-        settings.default_user: {
-            "username": settings.default_user,
-            "hashed_password": get_password_hash(settings.default_password),
-            "disabled": False,
-        }
-    }
+    configured = {settings.default_user: settings.default_password, **settings.users}
+    save_users(
+        [
+            UserInDB(
+                username=username,
+                hashed_password=get_password_hash(password),
+                disabled=False,
+            )
+            for username, password in configured.items()
+        ]
+    )
+    users = {user.username: user for user in get_all()}
+    _users = users
+    logger.info("Loaded %d users", len(users))
+    return users
+
+
+def get_users_db() -> Dict[str, UserInDB]:
+    users = _users
+    if users is None:
+        users = load_users()
+    return users
 
 
 def get_user(username: str):
-    db = get_users_db()
-    if username in db:
-        user_dict = db[username]
-        return UserInDB(**user_dict)
+    return get_users_db().get(username)
@@ -1,4 +1,7 @@
+import hashlib
+import hmac
 import logging
+import time
 from datetime import datetime, timedelta, timezone
 from typing import Annotated
 
@@ -9,11 +12,17 @@ from jwt.exceptions import InvalidTokenError
 
 from integrationsandbox.config import get_settings
 from integrationsandbox.security import repository
+from integrationsandbox.security.cache import TokenCache
 from integrationsandbox.security.models import Token, TokenData, User
 from integrationsandbox.security.security import oauth2_client_credentials_scheme
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
+token_cache: TokenCache[User] = TokenCache(settings.token_cache_size)
+issued_token_cache: TokenCache[Token] = TokenCache(settings.token_cache_size)
+
+# A reused token should stay valid long enough for the client to use it.
+TOKEN_REUSE_MIN_REMAINING_SECONDS = 60
 
 
 def verify_password(plain_password, hashed_password):
@@ -22,10 +31,6 @@ def verify_password(plain_password, hashed_password):
     )
 
 
-def get_password_hash(password):
-    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
-
-
 def authenticate_user(username: str, password: str):
     logger.debug("Authenticating user: %s", username)
     user = repository.get_user(username)
@@ -69,6 +74,39 @@ def login_user(username: str, password: str) -> Token | None:
     return Token(access_token=access_token, token_type="bearer")
 
 
+def get_credentials_key(username: str, password: str) -> str:
+    # HMAC so the plain secret is never kept in memory as a cache key.
+    digest = hmac.new(
+        settings.jwt_secret_key.encode("utf-8"),
+        password.encode("utf-8"),
+        hashlib.sha256,
+    ).hexdigest()
+    return f"{username}:{digest}"
+
+
+def get_reusable_token(username: str, password: str) -> Token | None:
+    if not settings.token_reuse:
+        return None
+    token = issued_token_cache.get(get_credentials_key(username, password))
+    if token:
+        logger.info("Reusing still valid token for client: %s", username)
+    return token
+
+
+def login_client(username: str, password: str) -> Token | None:
+    token = login_user(username, password)
+    if token and settings.token_reuse:
+        reusable_until = (
+            time.time()
+            + settings.jwt_expire_minutes * 60
+            - TOKEN_REUSE_MIN_REMAINING_SECONDS
+        )
+        issued_token_cache.put(
+            get_credentials_key(username, password), token, reusable_until
+        )
+    return token
+
+
 async def get_current_user(
     token: Annotated[str, Depends(oauth2_client_credentials_scheme)],
 ):
@@ -78,9 +116,13 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    if not token:
+        raise credentials_exception
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        logger.debug("Token found in cache for user: %s", cached_user.username)
+        return cached_user
     try:
-        if not token:
-            raise credentials_exception
         payload = jwt.decode(
             token, settings.jwt_secret_key, algorithms=[settings.jwt_algorithm]
         )
@@ -97,6 +139,8 @@ async def get_current_user(
     if user is None:
         logger.debug("Token user not found: %s", token_data.username)
         raise credentials_exception
+    if "exp" in payload:
+        token_cache.put(token, user, payload["exp"])
     return user
 
 
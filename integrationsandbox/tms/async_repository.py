@@ -0,0 +1,114 @@
+"""
+Asyncio counterpart of the tms repository. The blocking sqlite work runs on the
+dedicated database threads, so async routes never block the event loop and don't
+use up the default threadpool.
+"""
+
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+
+from integrationsandbox.infrastructure.database import (
+    iterate_in_db_executor,
+    run_in_db_executor,
+    run_write_async,
+)
+from integrationsandbox.infrastructure.exceptions import handle_db_errors
+from integrationsandbox.tms import repository
+from integrationsandbox.tms.models import (
+    TmsShipment,
+    TmsShipmentEvent,
+    TmsShipmentFilters,
+)
+
+
+@handle_db_errors
+async def create_many(shipments: List[TmsShipment]) -> None:
+    await run_in_db_executor(repository.create_many, shipments)
+
+
+@handle_db_errors
+async def create_chunk(shipments: List[TmsShipment]) -> Tuple[int, int | None]:
+    return await run_write_async(repository.insert_shipments, shipments)
+
+
+@handle_db_errors
+async def create(
+    shipment: TmsShipment, on_commit: Callable[[], None] | None = None
+) -> None:
+    await run_write_async(
+        repository.insert_shipment, shipment, detach=True, on_commit=on_commit
+    )
+
+
+@handle_db_errors
+async def upsert_event(shipment_id: str, event: TmsShipmentEvent) -> bool:
+    return await run_write_async(repository.write_event, shipment_id, event)
+
+
+@handle_db_errors
+async def get_by_id(id: str) -> Optional[TmsShipment]:
+    return await run_in_db_executor(repository.get_by_id, id)
+
+
+@handle_db_errors
+async def get_by_id_with_version(id: str) -> Optional[Tuple[TmsShipment, int]]:
+    return await run_in_db_executor(repository.get_by_id_with_version, id)
+
+
+@handle_db_errors
+async def get_by_id_list(
+    shipment_ids: List[str],
+) -> Tuple[List[TmsShipment], List[str]]:
+    return await run_in_db_executor(repository.get_by_id_list, shipment_ids)
+
+
+@handle_db_errors
+async def get_all(
+    filters: TmsShipmentFilters,
+) -> Tuple[List[TmsShipment] | None, str | None]:
+    return await run_in_db_executor(repository.get_all, filters)
+
+
+@handle_db_errors
+async def get_all_json(
+    filters: TmsShipmentFilters,
+) -> Tuple[List[str] | None, str | None]:
+    return await run_in_db_executor(repository.get_all_json, filters)
+
+
+@handle_db_errors
+async def get_feed_page(filters: TmsShipmentFilters) -> Tuple[List[str], str | None]:
+    return await run_in_db_executor(repository.get_feed_page, filters)
+
+
+@handle_db_errors
+async def iter_all(filters: TmsShipmentFilters) -> AsyncIterator[List[str]]:
+    stream = await run_in_db_executor(repository.iter_all, filters)
+    return iterate_in_db_executor(stream)
+
+
+@handle_db_errors
+async def mark_as_processed(
+    shipment_id: str, expected_version: int | None = None
+) -> bool:
+    return await run_write_async(
+        repository.set_processed, shipment_id, expected_version
+    )
+
+
+@handle_db_errors
+async def claim(owner: str, limit: int, lease_seconds: int) -> Tuple[List[str], str]:
+    return await run_write_async(repository.claim_rows, owner, limit, lease_seconds)
+
+
+@handle_db_errors
+async def release(owner: str, ids: List[str], processed: bool) -> int:
+    return await run_write_async(repository.release_rows, owner, ids, processed)
+
+
+@handle_db_errors
+async def update_processed(
+    processed: bool,
+    ids: List[str] | None = None,
+    filters: TmsShipmentFilters | None = None,
+) -> int:
+    return await run_write_async(repository.set_processed_many, processed, ids, filters)
@@ -1,15 +1,30 @@
 import logging
 from typing import List
 
-from fastapi import APIRouter, Depends, status
+from fastapi import APIRouter, Depends, Request, status
 
+from integrationsandbox.common.feed import get_feed_timeout, get_last_event_id
+from integrationsandbox.common.leases import ClaimRequest, LeaseRequest
+from integrationsandbox.common.models import UpdateResult
+from integrationsandbox.common.pagination import set_next_page_headers
+from integrationsandbox.common.responses import raw_json_response
+from integrationsandbox.common.streaming import (
+    StreamFormat,
+    accepts_event_stream,
+    event_stream_response,
+    get_stream_format,
+    streaming_response,
+)
 from integrationsandbox.security.service import get_current_active_user
 from integrationsandbox.tms import service as tms_service
 from integrationsandbox.tms.models import (
     CreateTmsShipment,
     CreateTmsShipmentEvent,
     TmsShipment,
+    TmsShipmentBulkSeedRequest,
+    TmsShipmentBulkSeedResult,
     TmsShipmentFilters,
+    TmsShipmentProcessedUpdate,
     TmsShipmentSeedRequest,
 )
 from integrationsandbox.validation import service as validation_service
@@ -29,12 +44,12 @@ logger = logging.getLogger(__name__)
     response_description="HTTP 202 with no body if validated succesfully.",
     status_code=status.HTTP_202_ACCEPTED,
 )
-def incoming_event(event: CreateTmsShipmentEvent, shipment_id: str) -> None:
+async def incoming_event(event: CreateTmsShipmentEvent, shipment_id: str) -> None:
     logger.info("Received TMS event for shipment: %s", shipment_id)
     logger.debug("Event details: %s", event.model_dump())
-    validation_service.validate_tms_event(event, shipment_id)
+    await validation_service.validate_tms_event(event, shipment_id)
     logger.info("TMS event validation successful")
-    tms_service.update_shipment_event(event, shipment_id)
+    await tms_service.update_shipment_event(event, shipment_id)
     logger.info("TMS shipment event update successful")
 
 
@@ -47,10 +62,10 @@ def incoming_event(event: CreateTmsShipmentEvent, shipment_id: str) -> None:
     response_description="HTTP 201 with created shipment and id in response.",
     status_code=status.HTTP_201_CREATED,
 )
-def create_shipment(new_shipment: CreateTmsShipment) -> TmsShipment:
+async def create_shipment(new_shipment: CreateTmsShipment) -> TmsShipment:
     logger.info("Creating new TMS shipment")
     logger.debug("Shipment details: %s", new_shipment.model_dump())
-    shipments = tms_service.create_shipment(new_shipment)
+    shipments = await tms_service.create_shipment(new_shipment)
     logger.info("TMS shipment created with ID: %s", shipments.id)
     return shipments
 
@@ -64,13 +79,36 @@ def create_shipment(new_shipment: CreateTmsShipment) -> TmsShipment:
     response_description="List of generated shipments sent to target URL",
     status_code=status.HTTP_201_CREATED,
 )
-def seed_shipments(seed_request: TmsShipmentSeedRequest) -> List[TmsShipment]:
+async def seed_shipments(seed_request: TmsShipmentSeedRequest) -> List[TmsShipment]:
     logger.info("Seeding %d TMS shipments", seed_request.count)
-    shipments = tms_service.create_seed_shipments(seed_request.count)
+    shipments = await tms_service.create_seed_shipments(
+        seed_request.count, seed_request.seed
+    )
     logger.info("Successfully created %d seed shipments", len(shipments))
     return shipments
 
 
+@router.post(
+    "/shipments/seed/bulk",
+    summary="Seed shipments in bulk",
+    description="""
+      Generates and saves up to BULK_SEED_MAX_COUNT shipments in chunks, each
+      committed on its own. Only a summary is returned, page through the shipments
+      with the returned `after` cursor. Shipments written by other requests while
+      seeding are interleaved with the seeded ones.
+      """,
+    response_description="Summary of the saved shipments",
+    status_code=status.HTTP_201_CREATED,
+)
+async def bulk_seed_shipments(
+    seed_request: TmsShipmentBulkSeedRequest,
+) -> TmsShipmentBulkSeedResult:
+    logger.info("Bulk seeding %d TMS shipments", seed_request.count)
+    return await tms_service.create_bulk_seed_shipments(
+        seed_request.count, seed_request.seed
+    )
+
+
 @router.get(
     "/shipments",
     summary="Get shipments",
@@ -80,13 +118,22 @@ def seed_shipments(seed_request: TmsShipmentSeedRequest) -> List[TmsShipment]:
     response_description="List of shipments",
     status_code=status.HTTP_200_OK,
 )
-def get_shipments(filters: TmsShipmentFilters = Depends()) -> List[TmsShipment] | None:
+async def get_shipments(
+    request: Request,
+    filters: TmsShipmentFilters = Depends(),
+    stream_format: StreamFormat | None = Depends(get_stream_format),
+) -> List[TmsShipment] | None:
     logger.info("Retrieving TMS shipments with filters")
     logger.debug("Filters: %s", filters.model_dump() if filters else None)
-    shipments = tms_service.list_shipments(filters)
+    if stream_format:
+        batches = await tms_service.stream_shipments(filters)
+        return streaming_response(batches, stream_format)
+    shipments, next_cursor = await tms_service.list_shipments(filters)
     count = len(shipments) if shipments else 0
     logger.info("Retrieved %d TMS shipments", count)
-    return shipments
+    response = raw_json_response(shipments)
+    set_next_page_headers(request, response, next_cursor)
+    return response
 
 
 @router.get(
@@ -98,12 +145,109 @@ def get_shipments(filters: TmsShipmentFilters = Depends()) -> List[TmsShipment]
     response_description="List of new shipments",
     status_code=status.HTTP_200_OK,
 )
-def get_new_shipments(
+async def get_new_shipments(
+    request: Request,
     filters: TmsShipmentFilters = Depends(),
+    stream_format: StreamFormat | None = Depends(get_stream_format),
 ) -> List[TmsShipment] | None:
     logger.info("Retrieving TMS new shipments with filters")
     logger.debug("Filters: %s", filters.model_dump() if filters else None)
-    shipments = tms_service.list_new_shipments(filters)
+    if stream_format:
+        batches = await tms_service.stream_new_shipments(filters)
+        return streaming_response(batches, stream_format)
+    shipments, next_cursor = await tms_service.list_new_shipments(filters)
     count = len(shipments) if shipments else 0
     logger.info("Retrieved %d TMS shipments", count)
-    return shipments
+    response = raw_json_response(shipments)
+    set_next_page_headers(request, response, next_cursor)
+    return response
+
+
+@router.get(
+    "/shipments/feed",
+    summary="Wait for new shipments",
+    description="""
+      Long-poll for new shipments after the `after` cursor. Responds as soon as new shipments are written, or with null after `timeout` seconds. Continue from the X-Next-Cursor header.
+      With 'Accept: text/event-stream' the new shipments are sent as server-sent events until `timeout` has passed, with the cursor as event id.
+      Only inserted shipments are sent. Shipments set back to new with `/processed` are not sent again, follow `/changes` for those.
+      """,
+    response_description="List of new shipments",
+    status_code=status.HTTP_200_OK,
+)
+async def get_shipment_feed(
+    request: Request,
+    filters: TmsShipmentFilters = Depends(),
+    timeout: float = Depends(get_feed_timeout),
+    last_event_id: str | None = Depends(get_last_event_id),
+) -> List[TmsShipment] | None:
+    filters.after = filters.after or last_event_id
+    if accepts_event_stream(request):
+        pages = tms_service.follow_new_shipments(filters, timeout)
+        return event_stream_response(pages)
+    shipments, next_cursor = await tms_service.wait_for_new_shipments(filters, timeout)
+    response = raw_json_response(shipments)
+    set_next_page_headers(request, response, next_cursor)
+    return response
+
+
+@router.post(
+    "/shipments/claim",
+    summary="Claim new shipments",
+    description="""
+      Leases up to `limit` new shipments to `owner`. Claimed shipments aren't handed out again until the lease expires, so several workers can poll in parallel without getting the same shipments.
+      """,
+    response_description="List of claimed shipments, the lease expiry is in the X-Lease-Expires-At header",
+    status_code=status.HTTP_200_OK,
+)
+async def claim_shipments(claim_request: ClaimRequest) -> List[TmsShipment] | None:
+    logger.info("Claiming TMS shipments for: %s", claim_request.owner)
+    shipments, expires_at = await tms_service.claim_shipments(claim_request)
+    response = raw_json_response(shipments)
+    response.headers["X-Lease-Expires-At"] = expires_at
+    return response
+
+
+@router.post(
+    "/shipments/ack",
+    summary="Acknowledge claimed shipments",
+    description="""
+      Marks shipments claimed by `owner` as processed.
+      """,
+    response_description="Number of shipments that were acknowledged",
+    status_code=status.HTTP_200_OK,
+)
+async def ack_shipments(lease_request: LeaseRequest) -> UpdateResult:
+    count = await tms_service.ack_shipments(lease_request)
+    return UpdateResult(count=count)
+
+
+@router.post(
+    "/shipments/nack",
+    summary="Release claimed shipments",
+    description="""
+      Ends the lease of `owner` on the shipments, so they can be claimed again right away.
+      """,
+    response_description="Number of shipments that were released",
+    status_code=status.HTTP_200_OK,
+)
+async def nack_shipments(lease_request: LeaseRequest) -> UpdateResult:
+    count = await tms_service.nack_shipments(lease_request)
+    return UpdateResult(count=count)
+
+
+@router.post(
+    "/shipments/processed",
+    summary="Mark shipments as processed or new",
+    description="""
+      Marks the shipments in `ids`, or every shipment matching `filters`, as processed
+      in one statement. Set `processed` to false to mark them as new again. Any lease
+      on an updated shipment ends.
+      """,
+    response_description="Number of shipments that were updated",
+    status_code=status.HTTP_200_OK,
+)
+async def update_processed_shipments(
+    update: TmsShipmentProcessedUpdate,
+) -> UpdateResult:
+    count = await tms_service.update_processed_shipments(update)
+    return UpdateResult(count=count)
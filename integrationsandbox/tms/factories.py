@@ -2,10 +2,17 @@ import datetime
 import random
 import uuid
 from enum import Enum
-from typing import List
+from typing import Any, Dict, List
 
 from faker import Faker
+from pydantic import TypeAdapter
 
+from integrationsandbox.common.corpus import (
+    ADDRESS_LOCALES,
+    Corpus,
+    CorpusLocation,
+    get_corpus,
+)
 from integrationsandbox.tms.models import (
     CreateTmsShipment,
     EquipmentType,
@@ -21,8 +28,8 @@ from integrationsandbox.tms.models import (
 )
 
 
-def get_random_enum_choice(enum_attribute: Enum) -> Enum:
-    return random.choice(list(enum_attribute))
+def get_random_enum_choice(enum_attribute: Enum, rng: random.Random) -> Enum:
+    return rng.choice(list(enum_attribute))
 
 
 MIN_MEASUREMENT_CM = 15
@@ -40,10 +47,24 @@ PICKUP_START_TIME = datetime.time(6, 0, 0)
 PICKUP_END_TIME = datetime.time(17, 0, 0)
 DELIVERY_START_TIME = datetime.time(6, 0, 0)
 DELIVERY_END_TIME = datetime.time(17, 0, 0)
+# Seeded shipments are planned relative to this date instead of today, so a seed
+# gives the same shipments on any day.
+SEED_DATE = datetime.date(2025, 1, 1)
+
+shipment_list_adapter = TypeAdapter(List[TmsShipment])
+
+
+def random_float(rng: random.Random, low: float, high: float) -> float:
+    """Uniform in [low, high) with 2 decimals, like Faker's bounded pyfloat."""
+    return round(low + (high - low) * rng.random(), 2)
+
+
+def random_uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
 
 
 class TmsShipmentFactory:
-    address_locales = ("it_IT", "en_GB", "nl_NL", "fr_FR", "de_DE")
+    address_locales = ADDRESS_LOCALES
     goods_descriptions = (
         "Industrial steel I-beams, 20-foot lengths, galvanized coating",
         "Bulk organic quinoa grain, 50-pound burlap sacks",
@@ -172,24 +193,35 @@ class TmsShipmentFactory:
         )
 
     def get_random_goods_description(self):
-        return random.choice(self.goods_descriptions)
+        return self.random.choice(self.goods_descriptions)
 
     def get_random_days_to_stop(self):
-        return datetime.timedelta(days=random.randint(1, MAX_DAYS_BETWEEN_STOPS))
+        return datetime.timedelta(days=self.random.randint(1, MAX_DAYS_BETWEEN_STOPS))
 
-    def __init__(self):
+    def get_today(self) -> datetime.date:
+        return SEED_DATE if self.seed is not None else datetime.date.today()
+
+    def __init__(self, corpus: Corpus | None = None, seed: int | None = None):
+        # Every draw goes through this factory's own Random, also Faker's. With a
+        # seed the same calls always give the same shipments.
+        self.seed = seed
+        self.random = random.Random(seed)
         self.fake = Faker()
+        self.fake.random = self.random
+        # Names and addresses are sampled from the corpus, Faker is too slow to
+        # generate them for every shipment.
+        self.corpus = corpus or get_corpus()
 
     def create_customer(self) -> TmsCustomer:
         return TmsCustomer(
-            id=str(uuid.uuid4()),
-            name=self.fake.company(),
-            carrier=f"{self.fake.company()} Transport",
+            id=random_uuid(self.random),
+            name=self.corpus.company(self.random),
+            carrier=f"{self.corpus.company(self.random)} Transport",
         )
 
     def create_line_item(self) -> TmsLineItem:
         return TmsLineItem(
-            package_type=get_random_enum_choice(PackageType),
+            package_type=get_random_enum_choice(PackageType, self.random),
             stackable=self.fake.boolean(),
             height=self.get_random_measurement(),
             length=self.get_random_measurement(),
@@ -203,26 +235,27 @@ class TmsShipmentFactory:
             ),
         )
 
-    def create_address(self, localed_faker: Faker) -> TmsAddress:
+    def create_address(self, location: CorpusLocation) -> TmsAddress:
         return TmsAddress(
-            address=localed_faker.street_address().replace("\n", " "),
-            city=localed_faker.city(),
-            postal_code=localed_faker.postcode(),
-            country=localed_faker.current_country_code(),
+            address=location.address,
+            city=location.city,
+            postal_code=location.postal_code,
+            country=location.country,
         )
 
     def create_location(self) -> TmsLocation:
-        localed_faker = Faker(random.choice(self.address_locales))
+        location = self.corpus.location(self.random)
+        latitude, longitude = self.corpus.coordinate(self.random)
         return TmsLocation(
             code=self.fake.bothify(text="LOC-####"),
-            name=localed_faker.company(),
-            address=self.create_address(localed_faker),
-            latitude=localed_faker.latitude(),
-            longitude=localed_faker.longitude(),
+            name=location.name,
+            address=self.create_address(location),
+            latitude=latitude,
+            longitude=longitude,
         )
 
     def create_stops(self) -> List[TmsStop]:
-        today = datetime.date.today()
+        today = self.get_today()
         pickup_date = today + self.get_random_days_to_stop()
         delivery_date = pickup_date + self.get_random_days_to_stop()
 
@@ -246,15 +279,15 @@ class TmsShipmentFactory:
 
     def create_shipment(self) -> TmsShipment:
         return TmsShipment(
-            id=str(uuid.uuid4()),
+            id=random_uuid(self.random),
             external_reference=None,
-            mode=get_random_enum_choice(ModeType),
-            equipment_type=get_random_enum_choice(EquipmentType),
+            mode=get_random_enum_choice(ModeType, self.random),
+            equipment_type=get_random_enum_choice(EquipmentType, self.random),
             loading_meters=self.get_random_loadingmeters(),
             customer=self.create_customer(),
             line_items=[
                 self.create_line_item()
-                for i in range(random.randint(MIN_LINE_ITEMS, MAX_LINE_ITEMS))
+                for i in range(self.random.randint(MIN_LINE_ITEMS, MAX_LINE_ITEMS))
             ],
             stops=self.create_stops(),
             timeline_events=None,
@@ -263,14 +296,113 @@ class TmsShipmentFactory:
     def create_new_shipment(self) -> TmsShipment:
         return CreateTmsShipment(
             external_reference=None,
-            mode=get_random_enum_choice(ModeType),
-            equipment_type=get_random_enum_choice(EquipmentType),
+            mode=get_random_enum_choice(ModeType, self.random),
+            equipment_type=get_random_enum_choice(EquipmentType, self.random),
             loading_meters=self.get_random_loadingmeters(),
             customer=self.create_customer(),
             line_items=[
                 self.create_line_item()
-                for i in range(random.randint(MIN_LINE_ITEMS, MAX_LINE_ITEMS))
+                for i in range(self.random.randint(MIN_LINE_ITEMS, MAX_LINE_ITEMS))
             ],
             stops=self.create_stops(),
             timeline_events=None,
         )
+
+    def create_shipments(self, count: int) -> List[TmsShipment]:
+        """Batch mode of create_shipment for seeding. The numbers are drawn from the
+        same ranges without going through Faker, and all shipments are validated in
+        one call instead of building every nested model on its own."""
+        if count <= 0:
+            return []
+        rng = self.random
+        corpus = self.corpus
+        package_types = list(PackageType)
+        modes = list(ModeType)
+        equipment_types = list(EquipmentType)
+        today = self.get_today()
+        days = [datetime.timedelta(days=d) for d in range(MAX_DAYS_BETWEEN_STOPS + 1)]
+        choice = rng.choice
+        randint = rng.randint
+        rand = rng.random
+
+        def line_item() -> Dict[str, Any]:
+            return {
+                "package_type": choice(package_types),
+                "stackable": rand() < 0.5,
+                "height": random_float(rng, MIN_MEASUREMENT_CM, MAX_MEASUREMENT_CM),
+                "length": random_float(rng, MIN_MEASUREMENT_CM, MAX_MEASUREMENT_CM),
+                "width": random_float(rng, MIN_MEASUREMENT_CM, MAX_MEASUREMENT_CM),
+                "length_unit": "CM",
+                "package_weight": random_float(rng, MIN_WEIGHT_KG, MAX_WEIGHT_KG),
+                "weight_unit": "KG",
+                "description": choice(self.goods_descriptions),
+                "total_packages": randint(MIN_PACKAGES_PER_ITEM, MAX_PACKAGES_PER_ITEM),
+            }
+
+        def stop(
+            type: StopType,
+            planned_date: datetime.date,
+            start: datetime.time,
+            end: datetime.time,
+        ) -> Dict[str, Any]:
+            place = corpus.location(rng)
+            latitude, longitude = corpus.coordinate(rng)
+            return {
+                "type": type,
+                "location": {
+                    "code": f"LOC-{randint(0, 9999):04d}",
+                    "name": place.name,
+                    "address": {
+                        "address": place.address,
+                        "city": place.city,
+                        "postal_code": place.postal_code,
+                        "country": place.country,
+                    },
+                    "latitude": latitude,
+                    "longitude": longitude,
+                },
+                "planned_date": planned_date,
+                "planned_time_window_start": start,
+                "planned_time_window_end": end,
+            }
+
+        shipments = []
+        for _ in range(count):
+            pickup_date = today + days[randint(1, MAX_DAYS_BETWEEN_STOPS)]
+            delivery_date = pickup_date + days[randint(1, MAX_DAYS_BETWEEN_STOPS)]
+            shipments.append(
+                {
+                    "id": random_uuid(rng),
+                    "external_reference": None,
+                    "mode": choice(modes),
+                    "equipment_type": choice(equipment_types),
+                    "loading_meters": random_float(
+                        rng, MIN_LOADING_METERS, MAX_LOADING_METERS
+                    ),
+                    "customer": {
+                        "id": random_uuid(rng),
+                        "name": corpus.company(rng),
+                        "carrier": f"{corpus.company(rng)} Transport",
+                    },
+                    "line_items": [
+                        line_item()
+                        for _ in range(randint(MIN_LINE_ITEMS, MAX_LINE_ITEMS))
+                    ],
+                    "stops": [
+                        stop(
+                            StopType.PICKUP,
+                            pickup_date,
+                            PICKUP_START_TIME,
+                            PICKUP_END_TIME,
+                        ),
+                        stop(
+                            StopType.DELIVERY,
+                            delivery_date,
+                            DELIVERY_START_TIME,
+                            DELIVERY_END_TIME,
+                        ),
+                    ],
+                    "timeline_events": None,
+                }
+            )
+        return shipment_list_adapter.validate_python(shipments)
@@ -143,15 +143,6 @@ class TmsShipment(BaseModel):
     stops: List[TmsStop] = Field(min_length=2)
     timeline_events: List[TmsShipmentEvent] | None = None
 
-    def update_timeline_events(self, new_event: TmsShipmentEvent) -> None:
-        if self.timeline_events is None:
-            self.timeline_events = []
-        for i, event in enumerate(self.timeline_events):
-            if event.event_type == new_event.event_type:
-                self.timeline_events[i] = new_event
-                return
-        self.timeline_events.append(new_event)
-
     model_config = tms_shipment_example
 
 
@@ -160,15 +151,71 @@ class TmsShipmentSeedRequest(BaseModel):
         description="Number of broker events to generate and save.",
         le=get_settings().max_bulk_size,
     )
+    seed: int | None = Field(
+        default=None,
+        description="Generate the same shipments for the same seed and count. "
+        "Seeded shipments are planned relative to 2025-01-01 instead of today.",
+    )
     model_config = tms_shipment_seed_example
 
 
+class TmsShipmentBulkSeedRequest(BaseModel):
+    count: PositiveInt = Field(
+        description="Number of shipments to generate and save.",
+        le=get_settings().bulk_seed_max_count,
+    )
+    seed: int | None = Field(
+        default=None,
+        description="Generate the same shipments for the same seed and count. "
+        "Seeded shipments are planned relative to 2025-01-01 instead of today.",
+    )
+
+
+class TmsShipmentBulkSeedResult(BaseModel):
+    count: int = Field(
+        description="Number of shipments that were saved. Shipments that already "
+        "existed, e.g. from an earlier seed with the same seed, aren't counted."
+    )
+    first_id: str = Field(description="Id of the first generated shipment.")
+    last_id: str = Field(description="Id of the last generated shipment.")
+    after: str | None = Field(
+        description="Cursor right before the first saved shipment, pass it as "
+        "`after` to page through the shipments saved since. Chunks are committed "
+        "one by one, so shipments written by other requests in the meantime are "
+        "included too. Null if none were saved."
+    )
+    elapsed_seconds: float = Field(description="Seconds it took to save them all.")
+
+
 class TmsShipmentFilters(BaseModel):
     id: str | None = None
     skip: int | None = 0
     external_reference: str | None = Field(None)
+    customer_id: str | None = None
+    carrier: str | None = None
     limit: PositiveInt = Field(
         default=50,
         description="Limit of records to get.",
     )
+    after: str | None = Field(
+        default=None,
+        description="Cursor from the X-Next-Cursor header of the previous page.",
+    )
     new: bool | None = None
+
+
+class TmsShipmentProcessedUpdate(BaseModel):
+    processed: bool = Field(
+        default=True,
+        description="Set to false to mark the shipments as new again.",
+    )
+    ids: List[str] | None = Field(
+        default=None,
+        description="IDs of the shipments to update.",
+        min_length=1,
+        max_length=get_settings().max_bulk_size,
+    )
+    filters: TmsShipmentFilters | None = Field(
+        default=None,
+        description="Update every match instead; limit only applies if it is set.",
+    )
@@ -1,25 +1,46 @@
+import functools
+import json
 import logging
 from datetime import datetime
-from typing import Any, List, Optional, Tuple
+from sqlite3 import Connection
+from typing import Any, Dict, List, Optional, Tuple
 
-from integrationsandbox.infrastructure.database import create_connection
-from integrationsandbox.infrastructure.exceptions import handle_db_errors
-from integrationsandbox.tms.models import TmsShipment, TmsShipmentFilters
+from integrationsandbox.common.pagination import (
+    decode_cursor,
+    encode_cursor,
+    get_last_cursor,
+    get_next_cursor,
+)
+from integrationsandbox.config import get_settings
+from integrationsandbox.infrastructure import leases
+from integrationsandbox.infrastructure.database import (
+    QueryStream,
+    get_connection,
+    run_write,
+)
+from integrationsandbox.infrastructure.exceptions import (
+    ConcurrencyError,
+    handle_db_errors,
+)
+from integrationsandbox.tms.models import (
+    TmsShipment,
+    TmsShipmentEvent,
+    TmsShipmentFilters,
+)
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
 
 
-# overkill for only 1 filter but keeping the same as other repo.
 def build_where_clause(filters: TmsShipmentFilters) -> Tuple[str, List[Any]]:
     conditions = []
     params = []
     for field, value in filters.model_dump(exclude_none=True).items():
-        if field in ["limit", "skip"]:
+        if field in ["limit", "skip", "after"]:
             continue
         operator = "="
+        # external_reference, customer_id and carrier are indexed generated columns.
         col = field
-        if field == "external_reference":
-            col = "json_extract(data, '$.external_reference')"
         if field == "new":
             if value:
                 conditions.append("processed_at is null")
@@ -27,6 +48,11 @@ def build_where_clause(filters: TmsShipmentFilters) -> Tuple[str, List[Any]]:
         conditions.append(f"{col} {operator} ?")
         params.append(value)
 
+    if filters.after:
+        # Keyset pagination: a range seek on the row_id primary key instead of OFFSET.
+        conditions.append("row_id > ?")
+        params.append(decode_cursor(filters.after))
+
     clause = ""
     if conditions:
         clause = " WHERE " + " AND ".join(conditions)
@@ -35,49 +61,139 @@ def build_where_clause(filters: TmsShipmentFilters) -> Tuple[str, List[Any]]:
         params.append(filters.limit)
         clause += " LIMIT ?"
     if filters.skip:
+        if not filters.limit:
+            clause += " LIMIT -1"
         params.append(filters.skip)
         clause += " OFFSET ?"
     return clause, params
 
 
+UPSERT_EVENT_QUERY = """
+    INSERT INTO tms_shipment_event(id, shipment_id, event_type, data)
+    SELECT ?, ?, ?, ? WHERE EXISTS (SELECT 1 FROM tms_shipment WHERE id = ?)
+    ON CONFLICT(shipment_id, event_type)
+    DO UPDATE SET id = excluded.id, data = excluded.data
+"""
+
+
+def get_event_params(shipment_id: str, event: TmsShipmentEvent) -> Tuple[Any, ...]:
+    return (
+        event.id,
+        shipment_id,
+        event.event_type,
+        event.model_dump_json(),
+        shipment_id,
+    )
+
+
+def insert_timeline_events(con: Connection, shipments: List[TmsShipment]) -> None:
+    con.executemany(
+        UPSERT_EVENT_QUERY,
+        [
+            get_event_params(shipment.id, event)
+            for shipment in shipments
+            for event in shipment.timeline_events or []
+        ],
+    )
+
+
+def insert_shipments(
+    con: Connection, shipments: List[TmsShipment]
+) -> Tuple[int, int | None]:
+    """Insert the shipments and return how many were inserted and the first row_id
+    they got. Shipments whose id already exists are left as they are, so replaying
+    a seed doesn't fail on the ids it generated before."""
+    if not con.in_transaction:
+        # Without the writer sqlite3 only begins before the INSERT, take the lock now.
+        con.execute("BEGIN IMMEDIATE")
+    last_row_id = con.execute(
+        "SELECT coalesce(max(row_id), 0) FROM tms_shipment"
+    ).fetchone()[0]
+    cursor = con.executemany(
+        "INSERT INTO tms_shipment(id, data) VALUES(?, ?) ON CONFLICT(id) DO NOTHING",
+        [(shipment.id, shipment.model_dump_json()) for shipment in shipments],
+    )
+    # The write lock was held since max(row_id) was read, every row after it is ours.
+    first_row_id = con.execute(
+        "SELECT min(row_id) FROM tms_shipment WHERE row_id > ?", (last_row_id,)
+    ).fetchone()[0]
+    insert_timeline_events(con, shipments)
+    return cursor.rowcount, first_row_id
+
+
 @handle_db_errors
 def create_many(shipments: List[TmsShipment]) -> None:
     logger.info("Inserting %d TMS shipments into database", len(shipments))
-    with create_connection() as con:
-        con.executemany(
-            "INSERT INTO tms_shipment(id, data) VALUES(?, ?)",
-            [(shipment.id, shipment.model_dump_json()) for shipment in shipments],
-        )
-    logger.info("Successfully inserted %d shipments", len(shipments))
+    with get_connection() as con:
+        inserted, _ = insert_shipments(con, shipments)
+    logger.info(
+        "Successfully inserted %d shipments, %d already existed",
+        inserted,
+        len(shipments) - inserted,
+    )
+
+
+# The single-row writes below come in pairs: a function that does the work on a
+# given connection, and the repository function that runs it with run_write, so it
+# can go through the group-commit writer. The async repository uses the first one.
+
+
+def insert_shipment(con: Connection, shipment: TmsShipment) -> None:
+    logger.info("Inserting TMS shipment into database: %s", shipment.id)
+    con.execute(
+        "INSERT INTO tms_shipment(id, data) VALUES(?, ?)",
+        (shipment.id, shipment.model_dump_json()),
+    )
+    insert_timeline_events(con, [shipment])
 
 
 @handle_db_errors
 def create(shipment: TmsShipment) -> None:
-    logger.info("Inserting TMS shipment into database: %s", shipment.id)
-    with create_connection() as con:
-        con.execute(
-            "INSERT INTO tms_shipment(id, data) VALUES(?, ?)",
-            (shipment.id, shipment.model_dump_json()),
-        )
+    run_write(insert_shipment, shipment, detach=True)
     logger.info("Successfully inserted shipment: %s", shipment.id)
 
 
+def write_event(con: Connection, shipment_id: str, event: TmsShipmentEvent) -> bool:
+    """Store the event and patch the shipment document in one transaction, so
+    concurrent events for a shipment can't overwrite each other. An event of a type
+    the shipment already has replaces it."""
+    logger.info("Upserting %s event of TMS shipment: %s", event.event_type, shipment_id)
+    cursor = con.execute(UPSERT_EVENT_QUERY, get_event_params(shipment_id, event))
+    if cursor.rowcount == 0:
+        logger.warning("No shipment found with id: %s", shipment_id)
+        return False
+
+    con.execute(
+        """
+        UPDATE tms_shipment SET data = json_set(
+            data,
+            '$.external_reference',
+            coalesce(json_extract(data, '$.external_reference'), ?),
+            '$.timeline_events',
+            json((
+                SELECT json_group_array(json(data)) FROM (
+                    SELECT data FROM tms_shipment_event
+                    WHERE shipment_id = ? ORDER BY row_id
+                )
+            ))
+        ), version = version + 1
+        WHERE id = ?
+        """,
+        (event.external_order_reference, shipment_id, shipment_id),
+    )
+    return True
+
+
 @handle_db_errors
-def update(shipment: TmsShipment) -> None:
-    logger.info("Updating TMS shipment in database: %s", shipment.id)
-    with create_connection() as con:
-        con.execute(
-            "UPDATE tms_shipment set data = ? where id = ?",
-            (shipment.model_dump_json(), shipment.id),
-        )
-    logger.info("Successfully updated shipment: %s", shipment.id)
+def upsert_event(shipment_id: str, event: TmsShipmentEvent) -> bool:
+    return run_write(write_event, shipment_id, event)
 
 
 @handle_db_errors
 def get_by_id(id: str) -> Optional[TmsShipment]:
     logger.info("Querying TMS shipment by ID: %s", id)
     params = (id,)
-    with create_connection() as con:
+    with get_connection() as con:
         res = con.execute("SELECT data from tms_shipment where id = ?", params)
         row = res.fetchone()
         if row:
@@ -87,18 +203,36 @@ def get_by_id(id: str) -> Optional[TmsShipment]:
         return None
 
 
+@handle_db_errors
+def get_by_id_with_version(id: str) -> Optional[Tuple[TmsShipment, int]]:
+    logger.info("Querying TMS shipment and version by ID: %s", id)
+    with get_connection() as con:
+        row = con.execute(
+            "SELECT data, version from tms_shipment where id = ?", (id,)
+        ).fetchone()
+        if row:
+            return TmsShipment.model_validate_json(row[0]), row[1]
+        logger.info("No shipment found with ID: %s", id)
+        return None
+
+
+# One query for all ids to prevent n+1 queries. The ids are bound as a single JSON
+# array, so any number of ids fits in one cached statement. CROSS JOIN makes json_each
+# the outer loop, so every id is looked up in the unique id index.
+GET_BY_ID_LIST_QUERY = """
+    SELECT s.id, s.data FROM json_each(?) AS j CROSS JOIN tms_shipment AS s
+    WHERE s.id = j.value
+"""
+
+
 @handle_db_errors
 def get_by_id_list(
     shipment_ids: List[str],
 ) -> Tuple[List[TmsShipment], List[str]]:
     logger.info("Querying %d TMS shipments by ID list", len(shipment_ids))
     logger.debug("Shipment IDs: %s", shipment_ids)
-    placeholders = ",".join("?" * len(shipment_ids))
-    # use IN clause to prevent n+1 query
-    query = f"SELECT id, data FROM tms_shipment WHERE id IN ({placeholders})"
-
-    with create_connection() as con:
-        res = con.execute(query, shipment_ids)
+    with get_connection() as con:
+        res = con.execute(GET_BY_ID_LIST_QUERY, (json.dumps(shipment_ids),))
         rows = res.fetchall()
 
         shipment_data = {row[0]: row[1] for row in rows}
@@ -121,40 +255,174 @@ def get_by_id_list(
 
 
 @handle_db_errors
-def get_all(filters: TmsShipmentFilters) -> List[TmsShipment] | None:
-    base_query = "SELECT data from tms_shipment"
+def get_all_json(
+    filters: TmsShipmentFilters,
+) -> Tuple[List[str] | None, str | None]:
+    """Stored JSON documents as written by model_dump_json(), without validating
+    them. Read endpoints send these as they are."""
+    base_query = "SELECT row_id, data from tms_shipment"
     where_clause, params = build_where_clause(filters)
     query = base_query + where_clause
     logger.info("Querying TMS shipments from database")
     logger.debug("Query: %s with params: %s", query, params)
 
-    with create_connection() as con:
+    with get_connection() as con:
         res = con.execute(query, params)
         rows = res.fetchall()
         if rows:
-            shipments = [TmsShipment.model_validate_json(row[0]) for row in rows]
-            logger.info("Retrieved %d shipments from database", len(shipments))
-            return shipments
+            logger.info("Retrieved %d shipments from database", len(rows))
+            return [row[1] for row in rows], get_next_cursor(rows, filters.limit)
 
         logger.info("No shipments found matching filters")
-        return None
+        return None, None
+
+
+def get_all(
+    filters: TmsShipmentFilters,
+) -> Tuple[List[TmsShipment] | None, str | None]:
+    documents, next_cursor = get_all_json(filters)
+    if not documents:
+        return None, None
+    shipments = [TmsShipment.model_validate_json(document) for document in documents]
+    return shipments, next_cursor
 
 
 @handle_db_errors
-def mark_as_processed(shipment_id: str) -> bool:
+def get_feed_page(filters: TmsShipmentFilters) -> Tuple[List[str], str | None]:
+    """Like get_all_json, but the cursor points after the last row even if the page
+    isn't full, so a feed can continue from it once more rows are written."""
+    where_clause, params = build_where_clause(filters)
+    query = "SELECT row_id, data from tms_shipment" + where_clause
+    logger.debug("Query: %s with params: %s", query, params)
+
+    with get_connection() as con:
+        rows = con.execute(query, params).fetchall()
+    return [row[1] for row in rows], get_last_cursor(rows)
+
+
+@handle_db_errors
+def get_stream_batch(
+    filters: TmsShipmentFilters, row_id: int | None, size: int
+) -> List[Tuple[int, str]]:
+    update: Dict[str, Any] = {"limit": size}
+    if row_id is not None:
+        # Later batches seek past the previous one instead of skipping again.
+        update.update(after=encode_cursor(row_id), skip=0)
+    where_clause, params = build_where_clause(filters.model_copy(update=update))
+    query = "SELECT row_id, data from tms_shipment" + where_clause
+    logger.debug("Query: %s with params: %s", query, params)
+
+    with get_connection() as con:
+        return con.execute(query, params).fetchall()
+
+
+def iter_all(filters: TmsShipmentFilters) -> QueryStream[str]:
+    logger.info("Streaming TMS shipments from database")
+    return QueryStream(
+        functools.partial(get_stream_batch, filters),
+        lambda row: row[1],
+        settings.stream_batch_size,
+        filters.limit,
+    )
+
+
+def set_processed(
+    con: Connection, shipment_id: str, expected_version: int | None = None
+) -> bool:
+    """Marks the shipment as processed. With an expected_version the shipment is
+    only marked if it wasn't changed since it was read at that version."""
     processed_at = datetime.now().isoformat()
 
     logger.info("Marking shipment as processed: %s", shipment_id)
+    query = """
+        UPDATE tms_shipment SET processed_at = ?, version = version + 1 WHERE id = ?
+    """
+    params = [processed_at, shipment_id]
+    if expected_version is not None:
+        query += " AND version = ?"
+        params.append(expected_version)
 
-    with create_connection() as con:
-        cursor = con.execute(
-            "UPDATE tms_shipment SET processed_at = ? WHERE id = ?",
-            (processed_at, shipment_id),
+    cursor = con.execute(query, params)
+
+    if cursor.rowcount == 0 and expected_version is not None:
+        raise ConcurrencyError(
+            f"Shipment {shipment_id} changed since version {expected_version}"
         )
+    if cursor.rowcount > 0:
+        logger.info("Successfully marked shipment as processed: %s", shipment_id)
+        return True
+    else:
+        logger.warning("No shipment found with id: %s", shipment_id)
+        return False
+
+
+@handle_db_errors
+def mark_as_processed(shipment_id: str, expected_version: int | None = None) -> bool:
+    return run_write(set_processed, shipment_id, expected_version)
 
-        if cursor.rowcount > 0:
-            logger.info("Successfully marked shipment as processed: %s", shipment_id)
-            return True
-        else:
-            logger.warning("No shipment found with id: %s", shipment_id)
-            return False
+
+def claim_rows(
+    con: Connection, owner: str, limit: int, lease_seconds: int
+) -> Tuple[List[str], str]:
+    logger.info("Claiming up to %d TMS shipments for: %s", limit, owner)
+    documents, expires_at = leases.claim(
+        con, "tms_shipment", owner, limit, lease_seconds
+    )
+    logger.info("Claimed %d shipments until %s", len(documents), expires_at)
+    return documents, expires_at
+
+
+@handle_db_errors
+def claim(owner: str, limit: int, lease_seconds: int) -> Tuple[List[str], str]:
+    return run_write(claim_rows, owner, limit, lease_seconds)
+
+
+def release_rows(con: Connection, owner: str, ids: List[str], processed: bool) -> int:
+    logger.info("Releasing %d TMS shipments claimed by: %s", len(ids), owner)
+    return leases.release(con, "tms_shipment", owner, ids, processed)
+
+
+@handle_db_errors
+def release(owner: str, ids: List[str], processed: bool) -> int:
+    return run_write(release_rows, owner, ids, processed)
+
+
+def set_processed_many(
+    con: Connection,
+    processed: bool,
+    ids: List[str] | None = None,
+    filters: TmsShipmentFilters | None = None,
+) -> int:
+    """Marks or unmarks the shipments with the given ids, or every shipment that
+    matches the filters, in one statement. Returns the number of changed rows."""
+    if ids is not None:
+        condition = "id IN (SELECT value FROM json_each(?))"
+        params: List[Any] = [json.dumps(ids)]
+    else:
+        where_clause, params = build_where_clause(filters or TmsShipmentFilters())
+        condition = f"row_id IN (SELECT row_id FROM tms_shipment{where_clause})"
+    condition += (
+        " AND processed_at IS NULL" if processed else " AND processed_at IS NOT NULL"
+    )
+
+    logger.info("Setting processed=%s on TMS shipments", processed)
+    query = f"""
+        UPDATE tms_shipment
+        SET processed_at = ?, lease_owner = NULL, lease_expires_at = NULL,
+            version = version + 1
+        WHERE {condition}
+    """
+    processed_at = datetime.now().isoformat() if processed else None
+    logger.debug("Query: %s with params: %s", query, params)
+    cursor = con.execute(query, [processed_at, *params])
+    logger.info("Updated %d shipments", cursor.rowcount)
+    return cursor.rowcount
+
+
+@handle_db_errors
+def update_processed(
+    processed: bool,
+    ids: List[str] | None = None,
+    filters: TmsShipmentFilters | None = None,
+) -> int:
+    return run_write(set_processed_many, processed, ids, filters)
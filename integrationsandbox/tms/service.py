@@ -1,19 +1,32 @@
+import asyncio
 import logging
+import time
 import uuid
-from typing import Any, Dict, List
+from contextlib import aclosing
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Tuple
+
+from fastapi.concurrency import run_in_threadpool
 
 from integrationsandbox.broker.models import BrokerEventMessage, BrokerEventType
+from integrationsandbox.common import generation
 from integrationsandbox.common.exceptions import NotFoundError, ValidationError
+from integrationsandbox.common.feed import follow, notifier
+from integrationsandbox.common.generation import split
+from integrationsandbox.common.leases import ClaimRequest, LeaseRequest
+from integrationsandbox.common.pagination import encode_cursor
 from integrationsandbox.config import get_settings
-from integrationsandbox.tms import repository
+from integrationsandbox.tms import async_repository as repository
 from integrationsandbox.tms.factories import TmsShipmentFactory
 from integrationsandbox.tms.models import (
     CreateTmsShipment,
     CreateTmsShipmentEvent,
     TmsEventType,
     TmsShipment,
+    TmsShipmentBulkSeedResult,
     TmsShipmentEvent,
     TmsShipmentFilters,
+    TmsShipmentProcessedUpdate,
 )
 
 logger = logging.getLogger(__name__)
@@ -60,61 +73,177 @@ def get_transformed_event_data(event: CreateTmsShipmentEvent) -> Dict[str, Any]:
     return result
 
 
-def build_shipments(count: int) -> List[TmsShipment]:
+@lru_cache
+def get_shipment_factory() -> TmsShipmentFactory:
+    # Shared by all requests, setting up its Faker instances takes a while.
+    return TmsShipmentFactory()
+
+
+def build_shipment_shard(count: int, seed: int | None) -> List[TmsShipment]:
+    # A seeded factory has its own Random, so requests running at the same time
+    # don't draw from each other's sequence.
+    factory = get_shipment_factory() if seed is None else TmsShipmentFactory(seed=seed)
+    return factory.create_shipments(count)
+
+
+def build_shipments(count: int, seed: int | None = None) -> List[TmsShipment]:
     logger.info("Building %d TMS shipments", count)
-    factory = TmsShipmentFactory()
-    shipments = [factory.create_shipment() for _ in range(count)]
+    shards = [
+        (stop - start, shard_seed) for start, stop, shard_seed in split(count, seed)
+    ]
+    shipments = generation.pool.run(build_shipment_shard, count, shards)
     logger.info("Successfully built %d shipments", len(shipments))
     return shipments
 
 
-def has_existing_event(
-    events: List[TmsShipmentEvent], new_event: TmsShipmentEvent
-) -> bool:
-    if not events:
-        return False
-    for event in events:
-        if event.event_type == new_event.event_type:
-            return True
-    return False
-
-
-def create_seed_shipments(count: int) -> List[TmsShipment]:
+async def create_seed_shipments(
+    count: int, seed: int | None = None
+) -> List[TmsShipment]:
     logger.info("Creating %d seed shipments", count)
     settings = get_settings()
     if count <= 0:
         raise ValidationError("Count must be greater than 0")
     elif count > settings.max_bulk_size:
         raise ValidationError(f"Count must be less than {settings.max_bulk_size}")
-    shipments = build_shipments(count)
-    repository.create_many(shipments)
+    # generation is CPU bound, keep it off the event loop.
+    shipments = await run_in_threadpool(build_shipments, count, seed)
+    await repository.create_many(shipments)
+    notifier.notify("tms_shipment")
     logger.info("Successfully created %d seed shipments", len(shipments))
     return shipments
 
 
-def list_shipments(filters: TmsShipmentFilters) -> List[TmsShipment]:
+async def generate_chunks(
+    count: int, seed: int | None
+) -> AsyncIterator[List[TmsShipment]]:
+    """Yield the shipments of a bulk seed in chunks of BULK_SEED_CHUNK_SIZE. The next
+    chunk is generated while the current one is inserted, so at most two chunks are
+    in memory at once."""
+    chunks = split(count, seed, get_settings().bulk_seed_chunk_size)
+
+    def build(chunk: Tuple[int, int, int | None]) -> asyncio.Future:
+        start, stop, chunk_seed = chunk
+        return asyncio.ensure_future(
+            run_in_threadpool(build_shipments, stop - start, chunk_seed)
+        )
+
+    pending = build(chunks[0])
+    try:
+        for chunk in chunks[1:]:
+            shipments = await pending
+            pending = build(chunk)
+            yield shipments
+        yield await pending
+    finally:
+        pending.cancel()
+
+
+async def create_bulk_seed_shipments(
+    count: int, seed: int | None = None
+) -> TmsShipmentBulkSeedResult:
+    logger.info("Creating %d bulk seed shipments", count)
+    if count <= 0:
+        raise ValidationError("Count must be greater than 0")
+    start = time.perf_counter()
+    first_id = last_id = None
+    first_row_id = None
+    saved = 0
+    # Every chunk is committed on its own, a failing chunk leaves the ones before it.
+    async with aclosing(generate_chunks(count, seed)) as chunks:
+        async for shipments in chunks:
+            inserted, chunk_first_row_id = await repository.create_chunk(shipments)
+            if first_id is None:
+                first_id = shipments[0].id
+            if first_row_id is None:
+                first_row_id = chunk_first_row_id
+            last_id = shipments[-1].id
+            saved += inserted
+            notifier.notify("tms_shipment")
+            logger.debug("Saved %d of %d bulk seed shipments", saved, count)
+    elapsed = time.perf_counter() - start
+    logger.info("Successfully created %d bulk seed shipments in %.2fs", saved, elapsed)
+    return TmsShipmentBulkSeedResult(
+        count=saved,
+        first_id=first_id,
+        last_id=last_id,
+        after=encode_cursor(first_row_id - 1) if first_row_id is not None else None,
+        elapsed_seconds=round(elapsed, 3),
+    )
+
+
+async def list_shipments(
+    filters: TmsShipmentFilters,
+) -> Tuple[List[str] | None, str | None]:
     logger.info("Listing TMS shipments with filters")
     logger.debug("Filters: %s", filters.model_dump() if filters else None)
-    shipments = repository.get_all(filters)
+    shipments, next_cursor = await repository.get_all_json(filters)
     shipment_count = len(shipments) if shipments else 0
     logger.info("Retrieved %d shipments from database", shipment_count)
 
-    return shipments
+    return shipments, next_cursor
 
 
-def list_new_shipments(filters: TmsShipmentFilters) -> List[TmsShipment]:
+async def list_new_shipments(
+    filters: TmsShipmentFilters,
+) -> Tuple[List[str] | None, str | None]:
     logger.info("Listing TMS new shipments with filters")
     logger.debug("Filters: %s", filters.model_dump() if filters else None)
     filters.new = True
-    shipments = repository.get_all(filters)
+    shipments, next_cursor = await repository.get_all_json(filters)
     shipment_count = len(shipments) if shipments else 0
     logger.info("Retrieved %d shipments from database", shipment_count)
-    return shipments
+    return shipments, next_cursor
+
+
+async def stream_shipments(
+    filters: TmsShipmentFilters,
+) -> AsyncIterator[List[str]]:
+    logger.info("Streaming TMS shipments with filters")
+    logger.debug("Filters: %s", filters.model_dump())
+    return await repository.iter_all(filters)
+
 
+async def stream_new_shipments(
+    filters: TmsShipmentFilters,
+) -> AsyncIterator[List[str]]:
+    logger.info("Streaming TMS new shipments with filters")
+    logger.debug("Filters: %s", filters.model_dump())
+    filters.new = True
+    return await repository.iter_all(filters)
+
+
+def follow_new_shipments(
+    filters: TmsShipmentFilters, timeout: float
+) -> AsyncIterator[Tuple[List[str], str]]:
+    logger.info("Following TMS new shipments for %.1f seconds", timeout)
+    logger.debug("Filters: %s", filters.model_dump())
+    filters.new = True
 
-def get_shipment_by_id(id: str) -> TmsShipment:
+    async def fetch(after: str | None) -> Tuple[List[str], str | None]:
+        update = {"after": after}
+        if after != filters.after:
+            # Later pages seek past the previous one instead of skipping again.
+            update["skip"] = 0
+        return await repository.get_feed_page(filters.model_copy(update=update))
+
+    return follow("tms_shipment", fetch, filters.after, timeout)
+
+
+async def wait_for_new_shipments(
+    filters: TmsShipmentFilters, timeout: float
+) -> Tuple[List[str] | None, str | None]:
+    """Long-poll: the first page of new shipments, or None once timeout has passed."""
+    async with aclosing(follow_new_shipments(filters, timeout)) as pages:
+        async for documents, cursor in pages:
+            logger.info("Retrieved %d shipments from the feed", len(documents))
+            return documents, cursor
+    logger.info("No new shipments within %.1f seconds", timeout)
+    return None, filters.after
+
+
+async def get_shipment_by_id(id: str) -> TmsShipment:
     logger.info("Retrieving TMS shipment by ID: %s", id)
-    shipment = repository.get_by_id(id)
+    shipment = await repository.get_by_id(id)
     if not shipment:
         logger.warning("Shipment not found: %s", id)
         raise NotFoundError(f"Shipment with id {id} not found")
@@ -122,13 +251,22 @@ def get_shipment_by_id(id: str) -> TmsShipment:
     return shipment
 
 
-def get_shipments_by_id_list(shipment_ids: List[str]) -> List[TmsShipment]:
+async def get_shipment_with_version(id: str) -> Tuple[TmsShipment, int]:
+    logger.info("Retrieving TMS shipment and version by ID: %s", id)
+    result = await repository.get_by_id_with_version(id)
+    if not result:
+        logger.warning("Shipment not found: %s", id)
+        raise NotFoundError(f"Shipment with id {id} not found")
+    return result
+
+
+async def get_shipments_by_id_list(shipment_ids: List[str]) -> List[TmsShipment]:
     if not shipment_ids:
         logger.info("Empty shipment ID list provided")
         return []
     logger.info("Retrieving %d TMS shipments by ID list", len(shipment_ids))
     logger.debug("Shipment IDs: %s", shipment_ids)
-    shipments, not_found = repository.get_by_id_list(shipment_ids)
+    shipments, not_found = await repository.get_by_id_list(shipment_ids)
     if not_found:
         logger.warning("Shipments not found: %s", not_found)
         raise NotFoundError(f"Shipments not found in database: {shipment_ids}")
@@ -136,44 +274,81 @@ def get_shipments_by_id_list(shipment_ids: List[str]) -> List[TmsShipment]:
     return shipments
 
 
-def create_shipment(new_shipment: CreateTmsShipment) -> TmsShipment:
+async def create_shipment(new_shipment: CreateTmsShipment) -> TmsShipment:
     logger.info("Creating new TMS shipment")
     shipment = TmsShipment(id=str(uuid.uuid4()), **new_shipment.model_dump())
-    repository.create(shipment)
+    await repository.create(shipment, on_commit=lambda: notifier.notify("tms_shipment"))
     logger.info("Successfully created shipment with ID: %s", shipment.id)
     return shipment
 
 
-def update_shipment_event(event: CreateTmsShipmentEvent, shipment_id: str) -> None:
+async def update_shipment_event(
+    event: CreateTmsShipmentEvent, shipment_id: str
+) -> None:
     logger.info("Adding event to Shipment ID: %s", shipment_id)
-    shipment = repository.get_by_id(shipment_id)
-    if not shipment:
+    event = TmsShipmentEvent(id=str(uuid.uuid4()), **event.model_dump())
+    # The shipment's external_reference is set from the event if it has none yet.
+    if not await repository.upsert_event(shipment_id, event):
         logger.warning("Shipment not found: %s", shipment_id)
         raise NotFoundError(f"Shipment not found in database: {shipment_id}")
+    logger.info("Successfully updated shipment events for Shipment ID: %s", shipment_id)
 
-    if shipment.external_reference is None:
-        shipment.external_reference = event.external_order_reference
-
-    event = TmsShipmentEvent(id=str(uuid.uuid4()), **event.model_dump())
-    if has_existing_event(shipment.timeline_events, event):
-        logger.info("Event type already exists. Overwriting %s", event.event_type)
-    shipment.update_timeline_events(event)
-    repository.update(shipment)
-    logger.info("Successfully updated shipment events for Shipment ID: %s", shipment.id)
 
-
-def create_shipments(shipments: List[TmsShipment]) -> List[TmsShipment]:
+async def create_shipments(shipments: List[TmsShipment]) -> List[TmsShipment]:
     logger.info("Creating %d TMS shipments", len(shipments))
-    repository.create_many(shipments)
+    await repository.create_many(shipments)
+    notifier.notify("tms_shipment")
     logger.info("Successfully created %d shipments", len(shipments))
     return shipments
 
 
-def mark_shipment_processed(shipment_id: str) -> bool:
+async def mark_shipment_processed(
+    shipment_id: str, expected_version: int | None = None
+) -> bool:
     logger.info("Marking shipment as processed: %s", shipment_id)
-    success = repository.mark_as_processed(shipment_id)
+    success = await repository.mark_as_processed(shipment_id, expected_version)
     if success:
         logger.info("Successfully marked shipment as processed: %s", shipment_id)
     else:
         logger.warning("Failed to mark shipment as processed: %s", shipment_id)
     return success
+
+
+async def claim_shipments(
+    claim_request: ClaimRequest,
+) -> Tuple[List[str] | None, str]:
+    logger.info("Claiming new TMS shipments for: %s", claim_request.owner)
+    shipments, expires_at = await repository.claim(
+        claim_request.owner, claim_request.limit, claim_request.lease_seconds
+    )
+    logger.info("Claimed %d shipments", len(shipments))
+    return shipments or None, expires_at
+
+
+async def ack_shipments(lease_request: LeaseRequest) -> int:
+    logger.info("Acknowledging TMS shipments for: %s", lease_request.owner)
+    logger.debug("IDs: %s", lease_request.ids)
+    count = await repository.release(lease_request.owner, lease_request.ids, True)
+    logger.info("Marked %d shipments as processed", count)
+    return count
+
+
+async def nack_shipments(lease_request: LeaseRequest) -> int:
+    logger.info("Releasing TMS shipments for: %s", lease_request.owner)
+    logger.debug("IDs: %s", lease_request.ids)
+    count = await repository.release(lease_request.owner, lease_request.ids, False)
+    logger.info("Released %d shipments", count)
+    return count
+
+
+async def update_processed_shipments(update: TmsShipmentProcessedUpdate) -> int:
+    if (update.ids is None) == (update.filters is None):
+        raise ValidationError("Send either ids or filters.")
+    filters = update.filters
+    if filters is not None and "limit" not in filters.model_fields_set:
+        # The default page size would silently cap the update.
+        filters = filters.model_copy(update={"limit": None})
+    logger.info("Setting processed=%s on TMS shipments", update.processed)
+    count = await repository.update_processed(update.processed, update.ids, filters)
+    logger.info("Updated %d shipments", count)
+    return count
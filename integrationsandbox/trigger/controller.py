@@ -31,11 +31,11 @@ logger = logging.getLogger(__name__)
     response_description="List of generated shipments sent to target URL",
     status_code=status.HTTP_201_CREATED,
 )
-def trigger_shipments(trigger: ShipmentTrigger) -> ShipmentTriggerResponse:
+async def trigger_shipments(trigger: ShipmentTrigger) -> ShipmentTriggerResponse:
     target_url = trigger.target_url
     logger.info("Received shipments trigger.")
     logger.debug("Trigger: %s", trigger.model_dump())
-    shipments, response_status = create_and_dispatch_shipments(trigger)
+    shipments, response_status = await create_and_dispatch_shipments(trigger)
     logger.info(
         "Generated %d shipments and dispatched to %s",
         len(shipments),
@@ -60,11 +60,11 @@ def trigger_shipments(trigger: ShipmentTrigger) -> ShipmentTriggerResponse:
     response_description="List of generated events sent to target URL",
     status_code=status.HTTP_201_CREATED,
 )
-def trigger_events(trigger: EventTrigger) -> EventTriggerResponse:
+async def trigger_events(trigger: EventTrigger) -> EventTriggerResponse:
     target_url = trigger.target_url
     logger.info("Received Events trigger.")
     logger.debug("Trigger: %s", trigger.model_dump())
-    events, response_status = create_and_dispatch_events(trigger)
+    events, response_status = await create_and_dispatch_events(trigger)
     logger.info("Generated %d events and dispatched to %s", len(events), target_url)
     logger.debug("Returned events: %s", events)
     return EventTriggerResponse(
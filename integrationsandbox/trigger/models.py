@@ -13,6 +13,11 @@ class ShipmentTrigger(BaseModel):
         description="Number of shipments to generate and send to target",
         le=get_settings().max_bulk_size,
     )
+    seed: int | None = Field(
+        default=None,
+        description="Generate the same shipments for the same seed and count. "
+        "Seeded shipments are planned relative to 2025-01-01 instead of today.",
+    )
 
     model_config = {
         "json_schema_extra": {
@@ -2,6 +2,7 @@ import logging
 from typing import Any, List
 
 import httpx
+from fastapi.concurrency import run_in_threadpool
 
 from integrationsandbox.broker.models import BrokerEventMessage
 from integrationsandbox.broker.service import build_events, create_events
@@ -43,13 +44,13 @@ def dispatch_shipments_to_url(shipments: List[TmsShipment], url: str) -> int:
     return post_to_target_url(url, data, headers)
 
 
-def create_and_dispatch_shipments(trigger: ShipmentTrigger):
+async def create_and_dispatch_shipments(trigger: ShipmentTrigger):
     logger.info("Creating %d shipments", trigger.count)
-    shipments = build_shipments(trigger.count)
-    create_shipments(shipments)
+    shipments = await run_in_threadpool(build_shipments, trigger.count, trigger.seed)
+    await create_shipments(shipments)
     logger.info("Shipments created successfully")
-    target_response = dispatch_shipments_to_url(
-        shipments, trigger.target_url.encoded_string()
+    target_response = await run_in_threadpool(
+        dispatch_shipments_to_url, shipments, trigger.target_url.encoded_string()
     )
     return shipments, target_response
 
@@ -62,7 +63,7 @@ def dispatch_events_to_url(events: List[BrokerEventMessage], url: str) -> None:
     return post_to_target_url(url, data, headers)
 
 
-def create_and_dispatch_events(trigger: EventTrigger) -> List[BrokerEventMessage]:
+async def create_and_dispatch_events(trigger: EventTrigger) -> List[BrokerEventMessage]:
     if not trigger.shipment_ids:
         raise ValidationError("No shipment_ids received.")
     logger.info(
@@ -70,11 +71,11 @@ def create_and_dispatch_events(trigger: EventTrigger) -> List[BrokerEventMessage
         len(trigger.shipment_ids),
         trigger.event,
     )
-    shipments = get_shipments_by_id_list(trigger.shipment_ids)
-    events = build_events(shipments, trigger.event)
-    create_events(events)
+    shipments = await get_shipments_by_id_list(trigger.shipment_ids)
+    events = await run_in_threadpool(build_events, shipments, trigger.event)
+    await create_events(events)
     logger.info("Events created successfully")
-    target_response = dispatch_events_to_url(
-        events, trigger.target_url.encoded_string()
+    target_response = await run_in_threadpool(
+        dispatch_events_to_url, events, trigger.target_url.encoded_string()
     )
     return events, target_response
@@ -17,17 +17,18 @@ from integrationsandbox.broker.models import (
 )
 from integrationsandbox.broker.service import (
     apply_shipment_mapping_rules,
-    get_event,
+    get_event_with_version,
     get_transformed_shipment_data,
     mark_event_processed,
 )
+from integrationsandbox.common.concurrency import retry_on_conflict
 from integrationsandbox.common.exceptions import ValidationError
 from integrationsandbox.config import get_settings
 from integrationsandbox.tms.models import CreateTmsShipmentEvent
 from integrationsandbox.tms.service import (
     REVERSE_EVENT_TYPE_MAP,
     apply_event_mapping_rules,
-    get_shipment_by_id,
+    get_shipment_with_version,
     get_transformed_event_data,
     mark_shipment_processed,
 )
@@ -94,12 +95,20 @@ def compare_mappings(
     return True
 
 
-def validate_broker_order(
+async def validate_broker_order(
+    order: CreateBrokerOrderMessage,
+) -> Tuple[bool, List[str | None]]:
+    # Validated against the shipment as it was read. If it changed before it's
+    # marked as processed, the validation starts over with the new version.
+    return await retry_on_conflict(validate_broker_order_once, order)
+
+
+async def validate_broker_order_once(
     order: CreateBrokerOrderMessage,
 ) -> Tuple[bool, List[str | None]]:
     shipment_reference = order.shipment.reference
     logger.info("Validating broker order for shipment: %s", shipment_reference)
-    tms_shipment = get_shipment_by_id(shipment_reference)
+    tms_shipment, version = await get_shipment_with_version(shipment_reference)
     expected_data = apply_shipment_mapping_rules(tms_shipment)
     transformed_data = get_transformed_shipment_data(order)
     validation_result = compare_mappings(expected_data, transformed_data)
@@ -107,26 +116,32 @@ def validate_broker_order(
     # Mark the shipment as processed after successful validation
 
     if validation_result:
-        mark_shipment_processed(shipment_reference)
+        await mark_shipment_processed(shipment_reference, version)
         logger.info(
             "Marked shipment order %s as processed after validation", shipment_reference
         )
 
 
-def validate_tms_event(
+async def validate_tms_event(
+    event: CreateTmsShipmentEvent, shipment_id: str
+) -> Tuple[bool, List[str | None]]:
+    return await retry_on_conflict(validate_tms_event_once, event, shipment_id)
+
+
+async def validate_tms_event_once(
     event: CreateTmsShipmentEvent, shipment_id: str
 ) -> Tuple[bool, List[str | None]]:
     event_type = REVERSE_EVENT_TYPE_MAP[event.event_type]
     logger.info("Validating TMS event %s for shipment: %s", event_type, shipment_id)
     event_filter = BrokerEventFilters(shipment_id=shipment_id, event=event_type)
-    broker_event = get_event(event_filter)
+    broker_event, version = await get_event_with_version(event_filter)
     expected_data = apply_event_mapping_rules(broker_event)
     transformed_data = get_transformed_event_data(event)
     validation_result = compare_mappings(expected_data, transformed_data)
 
     # Mark the broker event as processed after successful validation
     if validation_result:
-        mark_event_processed(broker_event.id)
+        await mark_event_processed(broker_event.id, version)
         logger.info(
             "Marked broker event %s as processed after validation", broker_event.id
         )
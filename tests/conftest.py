@@ -1,3 +1,4 @@
+import asyncio
 import os
 from datetime import date, time
 from typing import List
@@ -33,9 +34,11 @@ def setup_database():
     """Ensure database is set up before any tests run."""
     database.setup()
     yield
-    # Cleanup: remove test database file
-    if os.path.exists("tests/test.db"):
-        os.remove("tests/test.db")
+    # Cleanup: close pooled connections and remove test database files
+    database.close()
+    for path in ("tests/test.db", "tests/test.db-wal", "tests/test.db-shm"):
+        if os.path.exists(path):
+            os.remove(path)
 
 
 @pytest.fixture
@@ -185,14 +188,14 @@ def mock_auth():
 
 @pytest.fixture(params=[1, 5])
 def persisted_shipments(request):
-    return create_seed_shipments(request.param)
+    return asyncio.run(create_seed_shipments(request.param))
 
 
 @pytest.fixture(params=[1, 5])
 def persisted_processed_shipments(request):
-    shipments = create_seed_shipments(request.param)
+    shipments = asyncio.run(create_seed_shipments(request.param))
     for shipment in shipments:
-        mark_shipment_processed(shipment.id)
+        asyncio.run(mark_shipment_processed(shipment.id))
     return shipments
 
 
@@ -203,7 +206,9 @@ def mock_shipments(request):
 
 @pytest.fixture(params=[1, 5])
 def persisted_broker_events(persisted_shipments):
-    return create_seed_events(persisted_shipments, BrokerEventType.ORDER_CREATED)
+    return asyncio.run(
+        create_seed_events(persisted_shipments, BrokerEventType.ORDER_CREATED)
+    )
 
 
 @pytest.fixture(params=[1, 5])
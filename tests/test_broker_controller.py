@@ -1,6 +1,9 @@
+from unittest.mock import patch
+
 from fastapi.testclient import TestClient
 
 from integrationsandbox.broker.service import apply_shipment_mapping_rules
+from integrationsandbox.config import get_settings
 from integrationsandbox.main import app
 
 client = TestClient(app)
@@ -31,6 +34,23 @@ def test_seed_events_endpoint(persisted_shipments):
     assert data[0]["shipmentId"] == shipment.id
 
 
+def test_seed_events_replaying_seed(persisted_shipments):
+    shipment_ids = [shipment.id for shipment in persisted_shipments]
+
+    responses = [
+        client.post(
+            "/api/v1/broker/events/seed",
+            json={"event": event, "shipment_ids": shipment_ids, "seed": 42},
+        )
+        for event in ("ORDER_CREATED", "ORDER_LOADED", "ORDER_CREATED")
+    ]
+
+    assert [response.status_code for response in responses] == [201, 201, 201]
+    created, loaded, replayed = [response.json() for response in responses]
+    assert replayed == created
+    assert not {e["id"] for e in created} & {e["id"] for e in loaded}
+
+
 def test_get_events_endpoint(persisted_broker_events):
     response = client.get("/api/v1/broker/events/")
 
@@ -120,3 +140,63 @@ def test_build_events_integration(mock_events):
         assert hasattr(event, "carrier")
         assert event.owner == "Adam's logistics"
         assert event.situation.event.value == "ORDER_CREATED"
+
+
+def test_get_events_next_page_link(persisted_broker_events):
+    response = client.get("/api/v1/broker/events", params={"limit": 1, "skip": 0})
+    assert response.status_code == 200
+    next_url = response.headers["Link"].split(";")[0].strip("<>")
+    assert "skip" not in next_url
+
+    response = client.get(next_url)
+    assert response.status_code == 200
+    remaining = [event.id for event in persisted_broker_events[1:2]]
+    assert [event["id"] for event in response.json() or []] == remaining
+
+
+def test_get_events_json_stream(persisted_broker_events):
+    with patch.object(get_settings(), "stream_batch_size", 2):
+        response = client.get("/api/v1/broker/events", params={"stream": "json"})
+    assert response.status_code == 200
+    data = response.json()
+    assert [event["id"] for event in data] == [e.id for e in persisted_broker_events]
+
+
+def test_claim_events_skips_unexpired_leases(persisted_broker_events):
+    claim = {"owner": "worker-1", "limit": 1000, "lease_seconds": 60}
+    first = client.post("/api/v1/broker/events/claim", json=claim)
+    second = client.post("/api/v1/broker/events/claim", json=claim)
+
+    assert first.status_code == 200
+    assert [event["id"] for event in first.json()] == [
+        event.id for event in persisted_broker_events
+    ]
+    assert second.json() is None
+
+
+def test_update_processed_events_by_filters(persisted_broker_events):
+    first = persisted_broker_events[0]
+
+    response = client.post(
+        "/api/v1/broker/events/processed",
+        json={"filters": {"shipment_id": first.shipmentId}},
+    )
+    new = client.get("/api/v1/broker/events/new", params={"limit": 1000}).json() or []
+
+    expected = [e for e in persisted_broker_events if e.shipmentId == first.shipmentId]
+    assert response.json() == {"count": len(expected)}
+    assert first.id not in [event["id"] for event in new]
+
+
+def test_event_feed_filters_by_event_type(persisted_broker_events):
+    order_created = client.get(
+        "/api/v1/broker/events/feed",
+        params={"event": "ORDER_CREATED", "timeout": 0.1},
+    )
+    cancelled = client.get(
+        "/api/v1/broker/events/feed",
+        params={"event": "CANCEL_ORDER", "timeout": 0.1},
+    )
+
+    assert len(order_created.json()) == len(persisted_broker_events)
+    assert cancelled.json() is None
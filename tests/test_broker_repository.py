@@ -0,0 +1,68 @@
+from unittest.mock import patch
+
+import pytest
+
+from integrationsandbox.broker.models import BrokerEventFilters, BrokerEventType
+from integrationsandbox.broker.repository import (
+    build_where_clause,
+    create,
+    get_with_version,
+    mark_as_processed,
+)
+from integrationsandbox.broker.service import build_events
+from integrationsandbox.config import get_settings
+from integrationsandbox.infrastructure.database import get_connection
+
+
+def query_plan(filters: BrokerEventFilters) -> str:
+    where_clause, params = build_where_clause(filters)
+    with get_connection() as con:
+        rows = con.execute(
+            "EXPLAIN QUERY PLAN SELECT data FROM broker_event" + where_clause, params
+        ).fetchall()
+    return " ".join(row[3] for row in rows)
+
+
+def test_new_filter_uses_partial_index():
+    plan = query_plan(BrokerEventFilters(new=True))
+
+    assert "USING INDEX broker_event_unprocessed" in plan
+
+
+def test_event_filter_uses_index():
+    plan = query_plan(BrokerEventFilters(event=BrokerEventType.ORDER_CREATED))
+
+    assert "broker_event_event_type" in plan
+
+
+def test_carrier_filter_uses_index():
+    plan = query_plan(BrokerEventFilters(carrier="Test Carrier"))
+
+    assert "USING INDEX broker_event_carrier" in plan
+
+
+def get_row(event_id: str):
+    with get_connection() as con:
+        return con.execute(
+            "SELECT row_id, processed_at FROM broker_event WHERE id = ?", (event_id,)
+        ).fetchone()
+
+
+@pytest.mark.parametrize("reset_processed", [True, False])
+def test_create_updates_existing_event_in_place(persisted_shipments, reset_processed):
+    first, second = [
+        build_events(persisted_shipments[:1], BrokerEventType.ORDER_CREATED)[0]
+        for _ in range(2)
+    ]
+    create(first)
+    mark_as_processed(first.id)
+    row_id, processed_at = get_row(first.id)
+
+    with patch.object(get_settings(), "broker_event_reset_processed", reset_processed):
+        create(second)
+
+    assert get_row(first.id) is None
+    assert get_row(second.id) == (row_id, None if reset_processed else processed_at)
+    event, version = get_with_version(BrokerEventFilters(shipment_id=second.shipmentId))
+    assert event == second
+    assert version == 2
@@ -2,18 +2,22 @@ from datetime import date, datetime, time
 
 import pytest
 
+from integrationsandbox.broker.factories import BrokerEventMessageFactory
 from integrationsandbox.broker.models import (
     BrokerDateQualifier,
+    BrokerEventType,
     BrokerLocation,
     BrokerPackagingQualifier,
 )
 from integrationsandbox.broker.service import (
     apply_shipment_mapping_rules,
+    build_events,
     get_stop_dates,
     get_tms_stop_by_type,
     map_address_details,
     map_line_items,
 )
+from integrationsandbox.common.corpus import Corpus
 from integrationsandbox.tms.models import (
     EquipmentType,
     ModeType,
@@ -26,6 +30,7 @@ from integrationsandbox.tms.models import (
     TmsShipment,
     TmsStop,
 )
+from integrationsandbox.tms.service import build_shipments
 
 
 def test_get_tms_stop_by_type_found():
@@ -265,3 +270,27 @@ def test_apply_shipment_mapping_rules():
     assert result["order_quantities"].grossWeight == 10.0
     assert result["order_quantities"].loadingMeters == 5.0
     assert len(result["order_handling_units"]) == 1
+
+
+def test_event_factory_samples_from_corpus():
+    corpus = Corpus(size=1)
+    factory = BrokerEventMessageFactory(corpus)
+
+    event = factory.create_event_message(event_type=BrokerEventType.ORDER_LOADED)
+
+    assert event.owner == corpus.companies[0]
+    assert event.carrier == corpus.companies[0]
+    assert (
+        event.situation.position.latitude,
+        event.situation.position.longitude,
+    ) == corpus.coordinates[0]
+
+
+def test_build_events_same_seed_same_events():
+    shipments = build_shipments(5, seed=1)
+
+    first = build_events(shipments, BrokerEventType.ORDER_LOADED, seed=42)
+    second = build_events(shipments, BrokerEventType.ORDER_LOADED, seed=42)
+
+    assert [e.model_dump_json() for e in first] == [e.model_dump_json() for e in second]
+    assert first != build_events(shipments, BrokerEventType.ORDER_LOADED, seed=43)
@@ -0,0 +1,89 @@
+import asyncio
+import json
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+from integrationsandbox.changes.service import trim_changes
+from integrationsandbox.infrastructure import database
+from integrationsandbox.main import app
+from integrationsandbox.tms.models import CreateTmsShipmentEvent, TmsEventType
+from integrationsandbox.tms.service import update_shipment_event
+
+client = TestClient(app)
+
+
+def test_changes_are_listed_in_order(persisted_processed_shipments):
+    response = client.get("/api/v1/changes", follow_redirects=False)
+
+    changes = response.json()
+    count = len(persisted_processed_shipments)
+    assert response.status_code == 200
+    assert [change["seq"] for change in changes] == sorted(
+        change["seq"] for change in changes
+    )
+    assert [change["operation"] for change in changes] == (
+        ["insert"] * count + ["processed"] * count
+    )
+    assert changes[0]["id"] == persisted_processed_shipments[0].id
+    assert changes[0]["data"]["id"] == persisted_processed_shipments[0].id
+
+
+def test_timeline_update_is_a_change(persisted_shipments):
+    shipment = persisted_shipments[0]
+    event = CreateTmsShipmentEvent(
+        event_type=TmsEventType.PICKED_UP,
+        created_at=datetime(2024, 1, 15, 10, 0),
+        occured_at=datetime(2024, 1, 15, 9, 30),
+        external_order_reference=None,
+        source="broker",
+        location=None,
+    )
+    asyncio.run(update_shipment_event(event, shipment.id))
+
+    change = client.get("/api/v1/changes").json()[-1]
+
+    assert change["id"] == shipment.id
+    assert change["operation"] == "update"
+    assert change["data"]["timeline_events"][-1]["event_type"] == "PICKED_UP"
+
+
+def test_changes_since_seq_and_table(persisted_broker_events):
+    changes = client.get("/api/v1/changes").json()
+    since = changes[0]["seq"]
+
+    response = client.get(
+        "/api/v1/changes", params={"since": since, "table": "broker_event"}
+    )
+
+    expected = [
+        change["id"]
+        for change in changes
+        if change["seq"] > since and change["table"] == "broker_event"
+    ]
+    assert [change["id"] for change in response.json()] == expected
+    assert len(expected) == len(persisted_broker_events)
+
+
+def test_changes_as_ndjson(persisted_shipments):
+    response = client.get("/api/v1/changes", params={"stream": "ndjson"})
+
+    lines = response.text.splitlines()
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert len(lines) == len(persisted_shipments)
+    assert json.loads(lines[0])["table"] == "tms_shipment"
+
+
+def test_trimmed_changes_are_gone(persisted_shipments):
+    with database.get_connection() as con:
+        con.execute("UPDATE change_log SET changed_at = '2000-01-01T00:00:00.000Z'")
+        last_seq = con.execute("SELECT max(seq) FROM change_log").fetchone()[0]
+
+    trimmed = asyncio.run(trim_changes())
+    expired = client.get("/api/v1/changes", params={"since": 0})
+    current = client.get("/api/v1/changes", params={"since": last_seq})
+
+    assert trimmed == len(persisted_shipments)
+    assert expired.status_code == 410
+    assert current.status_code == 200
+    assert current.json() == []
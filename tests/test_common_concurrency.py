@@ -0,0 +1,43 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from integrationsandbox.common.concurrency import conflict_counter, retry_on_conflict
+from integrationsandbox.config import get_settings
+from integrationsandbox.infrastructure.exceptions import ConcurrencyError
+
+
+@pytest.fixture(autouse=True)
+def no_backoff():
+    conflict_counter.clear()
+    with patch.object(get_settings(), "conflict_backoff", 0):
+        yield
+    conflict_counter.clear()
+
+
+def test_retry_on_conflict_retries_until_success():
+    attempts = []
+
+    async def update():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise ConcurrencyError("changed")
+        return "updated"
+
+    result = asyncio.run(retry_on_conflict(update))
+
+    assert result == "updated"
+    assert len(attempts) == 3
+    assert conflict_counter.stats() == {"conflicts": 2, "failures": 0}
+
+
+def test_retry_on_conflict_gives_up():
+    async def update():
+        raise ConcurrencyError("changed")
+
+    with patch.object(get_settings(), "conflict_max_retries", 2):
+        with pytest.raises(ConcurrencyError):
+            asyncio.run(retry_on_conflict(update))
+
+    assert conflict_counter.stats() == {"conflicts": 3, "failures": 1}
@@ -0,0 +1,90 @@
+from unittest.mock import patch
+
+import pytest
+
+from integrationsandbox.broker.models import BrokerEventType
+from integrationsandbox.broker.service import build_events
+from integrationsandbox.common import generation
+from integrationsandbox.common.generation import (
+    SHARD_SIZE,
+    GenerationPool,
+    get_default_pool_size,
+    split,
+)
+from integrationsandbox.config import get_settings
+from integrationsandbox.tms.service import build_shipments
+
+
+@pytest.fixture(scope="module")
+def process_pool():
+    pool = GenerationPool(size=2, threshold=1)
+    yield pool
+    pool.shutdown()
+
+
+def test_split_single_shard_keeps_seed():
+    assert split(SHARD_SIZE, 42) == [(0, SHARD_SIZE, 42)]
+
+
+def test_split_shards_in_order():
+    shards = split(SHARD_SIZE * 2 + 1, 42)
+
+    assert [(start, stop) for start, stop, _ in shards] == [
+        (0, SHARD_SIZE),
+        (SHARD_SIZE, SHARD_SIZE * 2),
+        (SHARD_SIZE * 2, SHARD_SIZE * 2 + 1),
+    ]
+    assert len({seed for _, _, seed in shards}) == 3
+    assert shards == split(SHARD_SIZE * 2 + 1, 42)
+
+
+def test_split_without_seed():
+    assert {seed for _, _, seed in split(SHARD_SIZE * 3, None)} == {None}
+
+
+def test_build_shipments_in_pool_matches_in_process(process_pool):
+    count = SHARD_SIZE + 10
+    in_process = build_shipments(count, seed=42)
+
+    with patch.object(generation, "pool", process_pool):
+        in_pool = build_shipments(count, seed=42)
+
+    assert process_pool._executor is not None
+    assert [s.model_dump_json() for s in in_pool] == [
+        s.model_dump_json() for s in in_process
+    ]
+
+
+def test_build_events_in_pool_keeps_order(process_pool):
+    shipments = build_shipments(SHARD_SIZE + 10)
+
+    with patch.object(generation, "pool", process_pool):
+        events = build_events(shipments, BrokerEventType.ORDER_LOADED, seed=42)
+
+    assert [event.shipmentId for event in events] == [s.id for s in shipments]
+    assert events == build_events(shipments, BrokerEventType.ORDER_LOADED, seed=42)
+
+
+def test_pool_below_threshold_runs_in_process():
+    pool = GenerationPool(size=2, threshold=SHARD_SIZE * 2)
+
+    with patch.object(generation, "pool", pool):
+        shipments = build_shipments(SHARD_SIZE + 10)
+
+    assert len(shipments) == SHARD_SIZE + 10
+    assert pool._executor is None
+
+
+def test_default_pool_size_shares_cpus_between_workers():
+    with (
+        patch.object(get_settings(), "workers", 4),
+        patch("integrationsandbox.common.generation.os.cpu_count", return_value=8),
+    ):
+        assert get_default_pool_size() == 2
+        assert GenerationPool(None, 1).size == 2
+
+    with (
+        patch.object(get_settings(), "workers", 16),
+        patch("integrationsandbox.common.generation.os.cpu_count", return_value=8),
+    ):
+        assert get_default_pool_size() == 1
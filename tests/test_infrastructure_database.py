@@ -0,0 +1,208 @@
+import asyncio
+import json
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+
+from integrationsandbox.config import Settings
+from integrationsandbox.infrastructure import database
+from integrationsandbox.infrastructure.exceptions import (
+    RepositoryError,
+    handle_db_errors,
+)
+
+
+def test_get_connection_reuses_pooled_connection():
+    with database.get_connection() as con:
+        first = con
+    with database.get_connection() as con:
+        second = con
+
+    assert first is second
+
+
+def test_get_connection_applies_pragmas():
+    with database.get_connection() as con:
+        journal_mode = con.execute("PRAGMA journal_mode").fetchone()[0]
+        synchronous = con.execute("PRAGMA synchronous").fetchone()[0]
+        busy_timeout = con.execute("PRAGMA busy_timeout").fetchone()[0]
+
+    assert journal_mode == "wal"
+    assert synchronous == 1  # NORMAL
+    assert busy_timeout == database.settings.database_busy_timeout
+
+
+def test_get_connection_rolls_back_on_error():
+    try:
+        with database.get_connection() as con:
+            con.execute("INSERT INTO tms_shipment(id, data) VALUES('rollback', '{}')")
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    with database.get_connection() as con:
+        row = con.execute(
+            "SELECT id FROM tms_shipment WHERE id = 'rollback'"
+        ).fetchone()
+
+    assert row is None
+
+
+def test_pool_hands_out_distinct_connections_concurrently():
+    pool = database.ConnectionPool(size=2, timeout=0.1)
+    first = pool.acquire()
+    second = pool.acquire()
+
+    assert first is not second
+
+    pool.release(first)
+    assert pool.acquire() is first
+    pool.release(first)
+    pool.release(second)
+    pool.close()
+
+
+def test_setup_persists_shared_secrets():
+    with database.get_connection() as con:
+        rows = dict(con.execute("SELECT name, value FROM sandbox_secret").fetchall())
+
+    for name in database.SHARED_SECRETS:
+        assert rows[name] == getattr(database.settings, name)
+
+
+def test_setup_reuses_persisted_secrets():
+    jwt_secret_key = database.settings.jwt_secret_key
+
+    database.setup()
+
+    assert database.settings.jwt_secret_key == jwt_secret_key
+
+
+def test_setup_is_safe_to_run_concurrently():
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = [executor.submit(database.setup) for _ in range(4)]
+        for result in results:
+            result.result()
+
+    with database.get_connection() as con:
+        count = con.execute("SELECT count(*) FROM sandbox_secret").fetchone()[0]
+
+    assert count == len(database.SHARED_SECRETS)
+
+
+def test_log_config_uses_watched_file_handler_for_workers():
+    settings = Settings(workers=4)
+
+    handler = settings.log_config["handlers"]["rotating_file"]
+
+    assert handler["class"] == "logging.handlers.WatchedFileHandler"
+
+
+def test_handle_db_errors_wraps_async_functions():
+    @handle_db_errors
+    async def failing_query():
+        raise sqlite3.IntegrityError("constraint failed")
+
+    with pytest.raises(RepositoryError, match="constraint failed"):
+        asyncio.run(failing_query())
+
+
+def test_run_in_db_executor_uses_database_threads():
+    def thread_name():
+        with database.get_connection() as con:
+            con.execute("SELECT 1")
+        return threading.current_thread().name
+
+    name = asyncio.run(database.run_in_db_executor(thread_name))
+
+    assert name.startswith("database")
+
+
+def test_add_missing_columns_migrates_existing_table():
+    con = sqlite3.connect(":memory:")
+    con.execute(
+        "CREATE TABLE tms_shipment(row_id INTEGER PRIMARY KEY, id TEXT, data JSON)"
+    )
+    con.execute(
+        "INSERT INTO tms_shipment(id, data) VALUES('1', ?)",
+        ('{"external_reference": "ORD-1", "customer": {"id": "C1"}}',),
+    )
+
+    database.add_missing_columns(con, "tms_shipment", database.TMS_SHIPMENT_COLUMNS)
+    database.add_missing_columns(con, "tms_shipment", database.TMS_SHIPMENT_COLUMNS)
+
+    row = con.execute(
+        "SELECT external_reference, customer_id FROM tms_shipment"
+    ).fetchone()
+    assert row == ("ORD-1", "C1")
+    con.close()
+
+
+def fetch_ids(row_id, size):
+    with database.get_connection() as con:
+        return con.execute(
+            "SELECT row_id, id FROM tms_shipment WHERE row_id > ? ORDER BY row_id "
+            "LIMIT ?",
+            (row_id or 0, size),
+        ).fetchall()
+
+
+def test_query_stream_fetches_keyset_batches():
+    with database.get_connection() as con:
+        con.executemany(
+            "INSERT INTO tms_shipment(id, data) VALUES(?, '{}')",
+            [(str(i),) for i in range(5)],
+        )
+
+    stream = database.QueryStream(fetch_ids, lambda row: row[1], 2)
+    batches = []
+    while batch := stream.fetch():
+        batches.append(batch)
+
+    assert batches == [["0", "1"], ["2", "3"], ["4"]]
+    limited = database.QueryStream(fetch_ids, lambda row: row[1], 2, limit=3)
+    assert [limited.fetch(), limited.fetch(), limited.fetch()] == [
+        ["0", "1"],
+        ["2"],
+        [],
+    ]
+
+
+def test_open_query_streams_do_not_hold_connections():
+    with database.get_connection() as con:
+        con.executemany(
+            "INSERT INTO tms_shipment(id, data) VALUES(?, '{}')",
+            [(str(i),) for i in range(5)],
+        )
+
+    streams = [
+        database.QueryStream(fetch_ids, lambda row: row[1], 1)
+        for _ in range(database.settings.database_pool_size + 1)
+    ]
+    for stream in streams:
+        assert stream.fetch() == ["0"]
+
+    with patch.object(database._pool, "timeout", 0.1):
+        with database.get_connection() as con:
+            assert con.execute("SELECT 1").fetchone() == (1,)
+
+
+def test_backfill_shipment_events_copies_timeline_events():
+    events = [
+        {"id": "e1", "event_type": "BOOKED"},
+        {"id": "e2", "event_type": "DELIVERED"},
+    ]
+    with database.get_connection() as con:
+        con.execute(
+            "INSERT INTO tms_shipment(id, data) VALUES('1', json(?))",
+            (json.dumps({"timeline_events": events}),),
+        )
+        database.backfill_shipment_events(con)
+        rows = con.execute(
+            "SELECT id, shipment_id, event_type FROM tms_shipment_event"
+        ).fetchall()
+
+    assert rows == [("e1", "1", "BOOKED"), ("e2", "1", "DELIVERED")]
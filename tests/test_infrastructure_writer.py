@@ -0,0 +1,112 @@
+import asyncio
+import sqlite3
+import threading
+from unittest.mock import patch
+
+import pytest
+
+from integrationsandbox.config import get_settings
+from integrationsandbox.infrastructure import database
+from integrationsandbox.infrastructure.writer import GroupCommitWriter
+from integrationsandbox.tms import async_repository
+from integrationsandbox.tms.repository import get_by_id
+
+
+def insert(con, id):
+    con.execute("INSERT INTO tms_shipment(id, data) VALUES(?, '{}')", (id,))
+    return id
+
+
+def shipment_ids():
+    with database.get_connection() as con:
+        return [row[0] for row in con.execute("SELECT id FROM tms_shipment")]
+
+
+@pytest.fixture
+def writer_enabled():
+    settings = get_settings()
+    with patch.object(settings, "database_writer", True):
+        database.setup()
+        yield
+    database.setup()
+
+
+def test_writer_commits_writes_in_batches():
+    writer = GroupCommitWriter(database.get_connection, 10, 0.05)
+    futures = [writer.submit(lambda con, i=i: insert(con, str(i))) for i in range(10)]
+
+    results = [future.result() for future in futures]
+    writer.close()
+
+    assert results == [str(i) for i in range(10)]
+    assert writer.stats() == {"batches": 1, "writes": 10}
+    assert sorted(shipment_ids()) == sorted(results)
+
+
+def test_writer_rolls_back_failed_write_only():
+    writer = GroupCommitWriter(database.get_connection, 10, 0.05)
+    first = writer.submit(lambda con: insert(con, "1"))
+    duplicate = writer.submit(lambda con: insert(con, "1"))
+    second = writer.submit(lambda con: insert(con, "2"))
+
+    assert first.result() == "1"
+    with pytest.raises(sqlite3.IntegrityError):
+        duplicate.result()
+    assert second.result() == "2"
+    writer.close()
+
+    assert sorted(shipment_ids()) == ["1", "2"]
+
+
+def test_async_repository_writes_share_batches(writer_enabled, mock_shipments):
+    async def create_all():
+        await asyncio.gather(
+            *[async_repository.create(shipment) for shipment in mock_shipments]
+        )
+
+    asyncio.run(create_all())
+
+    stats = database.get_writer_stats()
+    assert stats["writes"] == len(mock_shipments)
+    assert stats["batches"] <= len(mock_shipments)
+    for shipment in mock_shipments:
+        assert get_by_id(shipment.id) == shipment
+
+
+def test_fire_and_forget_write_is_committed_on_close(writer_enabled, mock_shipments):
+    shipment = mock_shipments[0]
+    with patch.object(get_settings(), "database_writer_fire_and_forget", True):
+        asyncio.run(async_repository.create(shipment))
+
+    database.close()
+    database.setup()
+
+    assert get_by_id(shipment.id) == shipment
+
+
+def test_fire_and_forget_write_calls_on_commit_after_commit(
+    writer_enabled, mock_shipments
+):
+    shipment = mock_shipments[0]
+    committed = threading.Event()
+    seen = []
+
+    def on_commit():
+        seen.append(get_by_id(shipment.id))
+        committed.set()
+
+    with patch.object(get_settings(), "database_writer_fire_and_forget", True):
+        asyncio.run(async_repository.create(shipment, on_commit=on_commit))
+
+    assert committed.wait(5)
+    assert seen == [shipment]
+
+
+def test_on_commit_is_skipped_for_failed_writes(writer_enabled):
+    calls = []
+    database.run_write(insert, "1")
+
+    with pytest.raises(sqlite3.IntegrityError):
+        database.run_write(insert, "1", on_commit=lambda: calls.append(1))
+
+    assert calls == []
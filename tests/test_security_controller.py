@@ -0,0 +1,58 @@
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from integrationsandbox.config import get_settings
+from integrationsandbox.main import app
+from integrationsandbox.security.service import issued_token_cache
+
+client = TestClient(app)
+
+
+def client_credentials():
+    settings = get_settings()
+    return {
+        "grant_type": "client_credentials",
+        "client_id": settings.default_user,
+        "client_secret": settings.default_password,
+    }
+
+
+def test_login_for_access_token_client_credentials():
+    response = client.post("/token", data=client_credentials())
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["access_token"]
+    assert data["token_type"] == "bearer"
+
+
+def test_login_for_access_token_invalid_secret():
+    data = {**client_credentials(), "client_secret": "wrong"}
+
+    response = client.post("/token", data=data)
+
+    assert response.status_code == 401
+
+
+def test_login_for_access_token_reuses_token():
+    issued_token_cache.clear()
+    with patch.object(get_settings(), "token_reuse", True):
+        first = client.post("/token", data=client_credentials()).json()
+        with patch("integrationsandbox.security.controller.login_client") as login:
+            second = client.post("/token", data=client_credentials()).json()
+
+    login.assert_not_called()
+    assert first["access_token"] == second["access_token"]
+    issued_token_cache.clear()
+
+
+def test_login_for_access_token_does_not_reuse_for_wrong_secret():
+    issued_token_cache.clear()
+    with patch.object(get_settings(), "token_reuse", True):
+        client.post("/token", data=client_credentials())
+        data = {**client_credentials(), "client_secret": "wrong"}
+        response = client.post("/token", data=data)
+
+    assert response.status_code == 401
+    issued_token_cache.clear()
@@ -0,0 +1,42 @@
+from unittest.mock import patch
+
+from integrationsandbox.config import get_settings
+from integrationsandbox.security import repository
+from integrationsandbox.security.models import UserInDB
+from integrationsandbox.security.service import verify_password
+
+
+def test_load_users_includes_default_and_configured_users():
+    settings = get_settings()
+    with patch.object(settings, "users", {"client-a": "secret-a"}):
+        users = repository.load_users()
+
+    assert set(users) == {settings.default_user, "client-a"}
+    assert verify_password("secret-a", users["client-a"].hashed_password)
+    assert verify_password(
+        settings.default_password, users[settings.default_user].hashed_password
+    )
+
+
+def test_load_users_includes_users_from_table():
+    hashed_password = repository.get_password_hash("table-secret")
+    repository.save_users(
+        [UserInDB(username="table-user", hashed_password=hashed_password)]
+    )
+
+    users = repository.load_users()
+
+    assert users["table-user"].hashed_password == hashed_password
+
+
+def test_get_user_does_not_hash():
+    repository.load_users()
+    settings = get_settings()
+
+    with patch("integrationsandbox.security.repository.bcrypt.hashpw") as hashpw:
+        user = repository.get_user(settings.default_user)
+        missing = repository.get_user("nobody")
+
+    hashpw.assert_not_called()
+    assert user.username == settings.default_user
+    assert missing is None
@@ -0,0 +1,66 @@
+import asyncio
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+import pytest
+from fastapi import HTTPException
+
+from integrationsandbox.config import get_settings
+from integrationsandbox.security.cache import TokenCache
+from integrationsandbox.security.models import User
+from integrationsandbox.security.service import (
+    create_access_token,
+    get_current_user,
+    token_cache,
+)
+
+
+@pytest.fixture(autouse=True)
+def clear_token_cache():
+    token_cache.clear()
+    yield
+    token_cache.clear()
+
+
+def test_get_current_user_caches_decoded_token():
+    username = get_settings().default_user
+    token = create_access_token({"sub": username}, timedelta(minutes=5))
+
+    first = asyncio.run(get_current_user(token))
+    with patch("integrationsandbox.security.service.jwt.decode") as decode:
+        second = asyncio.run(get_current_user(token))
+
+    decode.assert_not_called()
+    assert first.username == second.username == username
+    assert token_cache.stats()["hits"] == 1
+    assert token_cache.stats()["misses"] == 1
+
+
+def test_get_current_user_rejects_invalid_token():
+    with pytest.raises(HTTPException):
+        asyncio.run(get_current_user("not-a-token"))
+
+    assert token_cache.stats()["size"] == 0
+
+
+def test_token_cache_expires_at_exp():
+    cache = TokenCache(max_size=10)
+    cache.put("token", User(username="sandy"), time.time() - 1)
+
+    assert cache.get("token") is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_token_cache_evicts_least_recently_used():
+    cache = TokenCache(max_size=2)
+    expires_at = time.time() + 60
+    cache.put("a", User(username="a"), expires_at)
+    cache.put("b", User(username="b"), expires_at)
+    cache.get("a")
+    cache.put("c", User(username="c"), expires_at)
+
+    assert cache.get("b") is None
+    assert cache.get("a").username == "a"
+    assert cache.get("c").username == "c"
+    assert cache.stats()["size"] == 2
@@ -1,5 +1,10 @@
+import threading
+import time
+from unittest.mock import patch
+
 from fastapi.testclient import TestClient
 
+from integrationsandbox.config import get_settings
 from integrationsandbox.main import app
 from integrationsandbox.tms.models import TmsShipment
 
@@ -144,6 +149,19 @@ def test_incoming_event_validation_missing_broker_event():
     assert response.status_code == 422
 
 
+def test_seed_shipments_replaying_seed():
+    seed_data = {"count": 3, "seed": 42}
+
+    first = client.post("/api/v1/tms/shipments/seed", json=seed_data)
+    second = client.post("/api/v1/tms/shipments/seed", json=seed_data)
+
+    assert first.status_code == 201
+    assert second.status_code == 201
+    assert second.json() == first.json()
+    stored = client.get("/api/v1/tms/shipments").json()
+    assert len(stored) == 3
+
+
 def test_seed_shipments_with_custom_count():
     seed_data = {"count": 10}
 
@@ -171,3 +189,203 @@ def test_create_shipment_missing_required_fields():
 
     response = client.post("/api/v1/tms/shipments/", json=incomplete_data)
     assert response.status_code == 422
+
+
+def test_get_shipments_cursor_pagination(persisted_shipments):
+    seen = []
+    params = {"limit": 2}
+    while True:
+        response = client.get("/api/v1/tms/shipments", params=params)
+        assert response.status_code == 200
+        seen.extend(shipment["id"] for shipment in response.json() or [])
+        next_cursor = response.headers.get("X-Next-Cursor")
+        if not next_cursor:
+            break
+        assert 'rel="next"' in response.headers["Link"]
+        params = {"limit": 2, "after": next_cursor}
+
+    assert seen == [shipment.id for shipment in persisted_shipments]
+
+
+def test_get_shipments_invalid_cursor():
+    response = client.get("/api/v1/tms/shipments", params={"after": "not-a-cursor"})
+    assert response.status_code == 422
+
+
+def test_get_shipments_ndjson_stream(persisted_shipments):
+    response = client.get(
+        "/api/v1/tms/shipments", headers={"Accept": "application/x-ndjson"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = response.text.splitlines()
+    ids = [TmsShipment.model_validate_json(line).id for line in lines]
+    assert ids == [shipment.id for shipment in persisted_shipments]
+
+
+def test_get_new_shipments_json_stream_empty():
+    response = client.get("/api/v1/tms/shipments/new", params={"stream": "json"})
+    assert response.status_code == 200
+    assert response.json() == []
+
+
+def test_get_shipments_sends_stored_json(persisted_shipments):
+    shipment = persisted_shipments[0]
+    with patch.object(TmsShipment, "model_validate_json") as validate:
+        response = client.get("/api/v1/tms/shipments", params={"id": shipment.id})
+
+    validate.assert_not_called()
+    assert response.status_code == 200
+    assert TmsShipment.model_validate(response.json()[0]) == shipment
+
+
+def test_claim_shipments_does_not_overlap(persisted_shipments):
+    first = client.post(
+        "/api/v1/tms/shipments/claim", json={"owner": "worker-1", "limit": 2}
+    )
+    second = client.post(
+        "/api/v1/tms/shipments/claim", json={"owner": "worker-2", "limit": 1000}
+    )
+
+    assert first.status_code == 200
+    assert first.headers["X-Lease-Expires-At"]
+    first_ids = [shipment["id"] for shipment in first.json()]
+    second_ids = [shipment["id"] for shipment in second.json() or []]
+    assert first_ids == [shipment.id for shipment in persisted_shipments[:2]]
+    assert not set(first_ids) & set(second_ids)
+    assert len(first_ids) + len(second_ids) == len(persisted_shipments)
+
+
+def test_ack_and_nack_claimed_shipments(persisted_shipments):
+    claimed = client.post(
+        "/api/v1/tms/shipments/claim", json={"owner": "worker-1", "limit": 1}
+    ).json()
+    ids = [shipment["id"] for shipment in claimed]
+
+    wrong_owner = client.post(
+        "/api/v1/tms/shipments/ack", json={"owner": "worker-2", "ids": ids}
+    )
+    nack = client.post(
+        "/api/v1/tms/shipments/nack", json={"owner": "worker-1", "ids": ids}
+    )
+    reclaimed = client.post(
+        "/api/v1/tms/shipments/claim", json={"owner": "worker-2", "limit": 1}
+    ).json()
+    ack = client.post(
+        "/api/v1/tms/shipments/ack", json={"owner": "worker-2", "ids": ids}
+    )
+    new = client.get("/api/v1/tms/shipments/new").json() or []
+
+    assert wrong_owner.json() == {"count": 0}
+    assert nack.json() == {"count": 1}
+    assert [shipment["id"] for shipment in reclaimed] == ids
+    assert ack.json() == {"count": 1}
+    assert ids[0] not in [shipment["id"] for shipment in new]
+
+
+def test_update_processed_shipments_by_ids_and_filters(persisted_shipments):
+    ids = [shipment.id for shipment in persisted_shipments]
+
+    marked = client.post(
+        "/api/v1/tms/shipments/processed", json={"ids": ids + ["missing"]}
+    )
+    marked_again = client.post("/api/v1/tms/shipments/processed", json={"ids": ids})
+    unmarked = client.post(
+        "/api/v1/tms/shipments/processed",
+        json={"processed": False, "filters": {}},
+    )
+    new = client.get("/api/v1/tms/shipments/new", params={"limit": 1000}).json()
+
+    assert marked.json() == {"count": len(ids)}
+    assert marked_again.json() == {"count": 0}
+    assert unmarked.json() == {"count": len(ids)}
+    assert [shipment["id"] for shipment in new] == ids
+
+
+def test_update_processed_shipments_needs_ids_or_filters():
+    neither = client.post("/api/v1/tms/shipments/processed", json={})
+    both = client.post(
+        "/api/v1/tms/shipments/processed", json={"ids": ["1"], "filters": {}}
+    )
+
+    assert neither.status_code == 422
+    assert both.status_code == 422
+
+
+def test_shipment_feed_returns_new_shipments_with_cursor(persisted_shipments):
+    response = client.get("/api/v1/tms/shipments/feed", params={"timeout": 1})
+    empty = client.get(
+        "/api/v1/tms/shipments/feed",
+        params={"timeout": 0.1, "after": response.headers["X-Next-Cursor"]},
+    )
+
+    assert [shipment["id"] for shipment in response.json()] == [
+        shipment.id for shipment in persisted_shipments
+    ]
+    assert empty.json() is None
+    assert empty.headers["X-Next-Cursor"] == response.headers["X-Next-Cursor"]
+
+
+def test_shipment_feed_wakes_up_on_new_shipments(persisted_shipments):
+    cursor = client.get("/api/v1/tms/shipments/feed").headers["X-Next-Cursor"]
+    seed = threading.Timer(
+        0.2, client.post, ["/api/v1/tms/shipments/seed"], {"json": {"count": 2}}
+    )
+
+    start = time.monotonic()
+    seed.start()
+    response = client.get(
+        "/api/v1/tms/shipments/feed", params={"after": cursor, "timeout": 10}
+    )
+    elapsed = time.monotonic() - start
+    seed.join()
+
+    assert len(response.json()) == 2
+    assert elapsed < 5
+
+
+def test_shipment_feed_as_server_sent_events(persisted_shipments):
+    response = client.get(
+        "/api/v1/tms/shipments/feed",
+        params={"timeout": 0.1},
+        headers={"Accept": "text/event-stream"},
+    )
+
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.count("data: ") == len(persisted_shipments)
+    assert response.text.count("id: ") == 1
+
+
+def test_shipment_feed_as_server_sent_events_skips_once(persisted_shipments):
+    response = client.get(
+        "/api/v1/tms/shipments/feed",
+        params={"timeout": 0.1, "limit": 2, "skip": 1},
+        headers={"Accept": "text/event-stream"},
+    )
+
+    assert response.text.count("data: ") == len(persisted_shipments) - 1
+
+
+def test_bulk_seed_shipments_in_chunks(persisted_shipments):
+    with patch.object(get_settings(), "bulk_seed_chunk_size", 7):
+        response = client.post(
+            "/api/v1/tms/shipments/seed/bulk", json={"count": 20, "seed": 1}
+        )
+
+    assert response.status_code == 201
+    summary = response.json()
+    assert summary["count"] == 20
+    assert summary["elapsed_seconds"] >= 0
+    saved = client.get(
+        "/api/v1/tms/shipments", params={"after": summary["after"], "limit": 50}
+    ).json()
+    assert len(saved) == 20
+    assert saved[0]["id"] == summary["first_id"]
+    assert saved[-1]["id"] == summary["last_id"]
+    assert len({shipment["id"] for shipment in saved}) == 20
+
+
+def test_bulk_seed_shipments_invalid_count():
+    response = client.post("/api/v1/tms/shipments/seed/bulk", json={"count": 0})
+
+    assert response.status_code == 422
@@ -0,0 +1,86 @@
+import pytest
+
+from integrationsandbox.infrastructure.database import get_connection
+from integrationsandbox.infrastructure.exceptions import ConcurrencyError
+from integrationsandbox.tms.models import TmsShipmentFilters
+from integrationsandbox.tms.repository import (
+    GET_BY_ID_LIST_QUERY,
+    build_where_clause,
+    get_all,
+    get_by_id_list,
+    get_by_id_with_version,
+    mark_as_processed,
+)
+
+
+def query_plan(filters: TmsShipmentFilters) -> str:
+    where_clause, params = build_where_clause(filters)
+    with get_connection() as con:
+        rows = con.execute(
+            "EXPLAIN QUERY PLAN SELECT data FROM tms_shipment" + where_clause, params
+        ).fetchall()
+    return " ".join(row[3] for row in rows)
+
+
+def test_external_reference_filter_uses_index():
+    plan = query_plan(TmsShipmentFilters(external_reference="ORD-1"))
+
+    assert "USING INDEX tms_shipment_external_reference" in plan
+
+
+def test_customer_id_filter_uses_index():
+    plan = query_plan(TmsShipmentFilters(customer_id="CUST001"))
+
+    assert "USING INDEX tms_shipment_customer_id" in plan
+
+
+def test_carrier_filter_uses_index():
+    plan = query_plan(TmsShipmentFilters(carrier="Test Carrier"))
+
+    assert "USING INDEX tms_shipment_carrier" in plan
+
+
+def test_new_filter_uses_partial_index():
+    plan = query_plan(TmsShipmentFilters(new=True))
+
+    assert "USING INDEX tms_shipment_unprocessed" in plan
+
+
+def test_get_all_filters_on_generated_column(persisted_shipments):
+    shipment = persisted_shipments[0]
+
+    result = get_all(TmsShipmentFilters(customer_id=shipment.customer.id))
+
+    shipments, _ = result
+    assert [s.id for s in shipments] == [shipment.id]
+
+
+def test_mark_as_processed_rejects_stale_version(persisted_shipments):
+    shipment = persisted_shipments[0]
+    _, version = get_by_id_with_version(shipment.id)
+    assert mark_as_processed(shipment.id, version)
+
+    with pytest.raises(ConcurrencyError):
+        mark_as_processed(shipment.id, version)
+
+    assert get_by_id_with_version(shipment.id)[1] == version + 1
+
+
+def test_get_by_id_list_uses_id_index():
+    with get_connection() as con:
+        rows = con.execute(
+            "EXPLAIN QUERY PLAN " + GET_BY_ID_LIST_QUERY, ('["1", "2"]',)
+        ).fetchall()
+    plan = " ".join(row[3] for row in rows)
+
+    assert "SEARCH s USING INDEX sqlite_autoindex_tms_shipment_1 (id=?)" in plan
+
+
+def test_get_by_id_list_beyond_parameter_limit(persisted_shipments):
+    missing = [f"missing-{i}" for i in range(40000)]
+    ids = [shipment.id for shipment in reversed(persisted_shipments)] + missing
+
+    shipments, not_found = get_by_id_list(ids)
+
+    assert shipments == list(reversed(persisted_shipments))
+    assert not_found == missing
@@ -1,4 +1,7 @@
+import asyncio
+from contextlib import aclosing
 from datetime import datetime
+from unittest.mock import patch
 
 from integrationsandbox.broker.models import (
     BrokerEventMessage,
@@ -7,20 +10,23 @@ from integrationsandbox.broker.models import (
     BrokerEventSituation,
     BrokerEventType,
 )
+from integrationsandbox.common.corpus import Corpus
+from integrationsandbox.config import get_settings
+from integrationsandbox.tms.factories import SEED_DATE, TmsShipmentFactory
 from integrationsandbox.tms.models import (
     CreateTmsShipmentEvent,
     TmsAddress,
     TmsEventType,
     TmsLocation,
     TmsShipment,
-    TmsShipmentEvent,
 )
 from integrationsandbox.tms.service import (
     apply_event_mapping_rules,
     build_shipments,
+    generate_chunks,
+    get_shipment_factory,
     get_shipments_by_id_list,
     get_transformed_event_data,
-    has_existing_event,
     update_shipment_event,
 )
 
@@ -33,6 +39,71 @@ def test_build_shipments():
     assert all(s.id for s in shipments)  # All have IDs
 
 
+def test_build_shipments_keeps_factory_ranges():
+    shipments = build_shipments(50)
+    line_items = [item for s in shipments for item in s.line_items]
+
+    assert len({s.id for s in shipments}) == 50
+    assert all(1 <= len(s.line_items) <= 10 for s in shipments)
+    assert all(15 <= item.height < 200 for item in line_items)
+    assert all(150 <= item.package_weight < 12000 for item in line_items)
+    assert all(1 <= item.total_packages <= 5 for item in line_items)
+    for shipment in shipments:
+        pickup, delivery = shipment.stops
+        assert 1 <= (delivery.planned_date - pickup.planned_date).days <= 7
+        assert pickup.location.code.startswith("LOC-")
+        assert -90 <= pickup.location.latitude <= 90
+
+
+def test_build_shipments_reuses_factory():
+    factory = get_shipment_factory()
+
+    build_shipments(2)
+
+    assert get_shipment_factory() is factory
+
+
+def test_build_shipments_samples_from_corpus():
+    corpus = Corpus(size=2)
+    factory = TmsShipmentFactory(corpus)
+
+    shipments = factory.create_shipments(20) + [factory.create_shipment()]
+
+    names = {s.customer.name for s in shipments}
+    cities = {stop.location.address.city for s in shipments for stop in s.stops}
+    assert names <= set(corpus.companies)
+    assert cities <= {location.city for location in corpus.locations}
+
+
+def test_build_shipments_same_seed_same_shipments():
+    first = build_shipments(20, seed=42)
+    second = build_shipments(20, seed=42)
+
+    assert [s.model_dump_json() for s in first] == [s.model_dump_json() for s in second]
+    assert first != build_shipments(20, seed=43)
+    assert min(stop.planned_date for s in first for stop in s.stops) > SEED_DATE
+
+
+def test_create_shipment_same_seed_same_shipment():
+    first = TmsShipmentFactory(seed=7).create_shipment()
+    second = TmsShipmentFactory(seed=7).create_shipment()
+
+    assert first.model_dump_json() == second.model_dump_json()
+
+
+def test_generate_chunks_same_seed_same_chunks():
+    async def collect():
+        async with aclosing(generate_chunks(25, seed=3)) as chunks:
+            return [[s.id for s in chunk] async for chunk in chunks]
+
+    with patch.object(get_settings(), "bulk_seed_chunk_size", 10):
+        first = asyncio.run(collect())
+        second = asyncio.run(collect())
+
+    assert [len(chunk) for chunk in first] == [10, 10, 5]
+    assert first == second
+
+
 def test_build_shipments_zero_count():
     shipments = build_shipments(0)
 
@@ -41,7 +112,7 @@ def test_build_shipments_zero_count():
 
 
 def test_get_shipments_by_id_list_empty():
-    result = get_shipments_by_id_list([])
+    result = asyncio.run(get_shipments_by_id_list([]))
 
     assert result == []
 
@@ -124,91 +195,14 @@ def test_apply_event_mapping_rules():
     assert result["location_longitude"] == -74.0
 
 
-def test_has_existing_event_empty_list():
-    events = []
-    new_event = TmsShipmentEvent(
-        id="evt-1",
-        order_external_reference="REF001",
-        event_type=TmsEventType.BOOKED,
-        created_at=datetime(2024, 1, 15, 10, 0),
-        occured_at=datetime(2024, 1, 15, 9, 30),
-        external_order_reference="REF001",
-        source="broker",
-        location=None,
-    )
-
-    result = has_existing_event(events, new_event)
-
-    assert result is False
-
-
-def test_has_existing_event_not_found():
-    existing_event = TmsShipmentEvent(
-        id="evt-1",
-        order_external_reference="REF001",
-        event_type=TmsEventType.PICKED_UP,
-        created_at=datetime(2024, 1, 15, 10, 0),
-        occured_at=datetime(2024, 1, 15, 9, 30),
-        external_order_reference="REF001",
-        source="broker",
-        location=None,
-    )
-    events = [existing_event]
-
-    new_event = TmsShipmentEvent(
-        id="evt-2",
-        order_external_reference="REF001",
-        event_type=TmsEventType.DELIVERED,  # Different event type
-        created_at=datetime(2024, 1, 15, 11, 0),
-        occured_at=datetime(2024, 1, 15, 10, 30),
-        external_order_reference="REF001",
-        source="broker",
-        location=None,
-    )
-
-    result = has_existing_event(events, new_event)
-
-    assert result is False
-
-
-def test_has_existing_event_found():
-    existing_event = TmsShipmentEvent(
-        id="evt-1",
-        order_external_reference="REF001",
-        event_type=TmsEventType.BOOKED,
-        created_at=datetime(2024, 1, 15, 10, 0),
-        occured_at=datetime(2024, 1, 15, 9, 30),
-        external_order_reference="REF001",
-        source="broker",
-        location=None,
-    )
-    events = [existing_event]
-
-    new_event = TmsShipmentEvent(
-        id="evt-2",
-        order_external_reference="REF001",
-        event_type=TmsEventType.BOOKED,  # Same event type
-        created_at=datetime(2024, 1, 15, 11, 0),
-        occured_at=datetime(2024, 1, 15, 10, 30),
-        external_order_reference="REF001",
-        source="broker",
-        location=None,
-    )
-
-    result = has_existing_event(events, new_event)
-
-    assert result is True
-
-
-
 def test_update_shipment_event_new_shipment(tms_line_items, tms_stops):
     """Test updating shipment event when shipment has no external reference."""
-    from unittest.mock import patch
     from integrationsandbox.tms.models import TmsCustomer
-    
+    from integrationsandbox.tms.service import create_shipments, get_shipment_by_id
+
     # Create test customer
     customer = TmsCustomer(id="CUST001", name="Test Customer", carrier="Test Carrier")
-    
+
     # Create a shipment without external reference
     shipment = TmsShipment(
         id="ship-123",
@@ -221,7 +215,8 @@ def test_update_shipment_event_new_shipment(tms_line_items, tms_stops):
         stops=tms_stops,
         timeline_events=None,
     )
-    
+    asyncio.run(create_shipments([shipment]))
+
     event_data = CreateTmsShipmentEvent(
         event_type=TmsEventType.BOOKED,
         created_at=datetime(2024, 1, 15, 10, 0),
@@ -230,29 +225,80 @@ def test_update_shipment_event_new_shipment(tms_line_items, tms_stops):
         source="broker",
         location=None,
     )
-    
-    # Mock repository calls
-    with patch("integrationsandbox.tms.service.repository.get_by_id", return_value=shipment) as mock_get, \
-         patch("integrationsandbox.tms.service.repository.update") as mock_update:
-        
-        update_shipment_event(event_data, "ship-123")
-        
-        # Verify repository calls
-        mock_get.assert_called_once_with("ship-123")
-        mock_update.assert_called_once()
-        
-        # Verify shipment was updated
-        updated_shipment = mock_update.call_args[0][0]
-        assert updated_shipment.external_reference == "EXT001"
-        assert len(updated_shipment.timeline_events) == 1
-        assert updated_shipment.timeline_events[0].event_type == TmsEventType.BOOKED
+
+    asyncio.run(update_shipment_event(event_data, "ship-123"))
+
+    # Verify shipment was updated
+    updated_shipment = asyncio.run(get_shipment_by_id("ship-123"))
+    assert updated_shipment.external_reference == "EXT001"
+    assert len(updated_shipment.timeline_events) == 1
+    assert updated_shipment.timeline_events[0].event_type == TmsEventType.BOOKED
+
+
+def test_update_shipment_event_overwrites_event_type(persisted_shipments):
+    from integrationsandbox.tms.service import get_shipment_by_id
+
+    shipment = persisted_shipments[0]
+
+    async def send_events():
+        for event_type in [TmsEventType.BOOKED, TmsEventType.DELIVERED]:
+            event_data = CreateTmsShipmentEvent(
+                event_type=event_type,
+                created_at=datetime(2024, 1, 15, 10, 0),
+                occured_at=datetime(2024, 1, 15, 9, 30),
+                external_order_reference="EXT001",
+                source="broker",
+            )
+            await update_shipment_event(event_data, shipment.id)
+        event_data.source = "resent"
+        await update_shipment_event(event_data, shipment.id)
+
+    asyncio.run(send_events())
+
+    updated_shipment = asyncio.run(get_shipment_by_id(shipment.id))
+    events = updated_shipment.timeline_events
+    assert [e.event_type for e in events] == [
+        TmsEventType.BOOKED,
+        TmsEventType.DELIVERED,
+    ]
+    assert events[1].source == "resent"
+
+
+def test_update_shipment_event_concurrent_events(persisted_shipments):
+    from integrationsandbox.tms.service import get_shipment_by_id
+
+    shipment = persisted_shipments[0]
+    event_types = list(TmsEventType)
+
+    async def send_events():
+        await asyncio.gather(
+            *[
+                update_shipment_event(
+                    CreateTmsShipmentEvent(
+                        event_type=event_type,
+                        created_at=datetime(2024, 1, 15, 10, 0),
+                        occured_at=datetime(2024, 1, 15, 9, 30),
+                        external_order_reference=None,
+                        source="broker",
+                    ),
+                    shipment.id,
+                )
+                for event_type in event_types
+            ]
+        )
+
+    asyncio.run(send_events())
+
+    updated_shipment = asyncio.run(get_shipment_by_id(shipment.id))
+    stored = {event.event_type for event in updated_shipment.timeline_events}
+    assert stored == set(event_types)
 
 
 def test_update_shipment_event_shipment_not_found():
     """Test updating shipment event when shipment doesnt exist."""
     from unittest.mock import patch
     from integrationsandbox.common.exceptions import NotFoundError
-    
+
     event_data = CreateTmsShipmentEvent(
         event_type=TmsEventType.BOOKED,
         created_at=datetime(2024, 1, 15, 10, 0),
@@ -261,12 +307,13 @@ def test_update_shipment_event_shipment_not_found():
         source="broker",
         location=None,
     )
-    
-    # Mock repository to return None (shipment not found)
-    with patch("integrationsandbox.tms.service.repository.get_by_id", return_value=None):
+
+    # Mock repository to report a missing shipment
+    with patch(
+        "integrationsandbox.tms.service.repository.upsert_event", return_value=False
+    ):
         try:
-            update_shipment_event(event_data, "nonexistent-id")
+            asyncio.run(update_shipment_event(event_data, "nonexistent-id"))
             assert False, "Should have raised NotFoundError"
         except NotFoundError as e:
             assert "not found in database" in str(e)
-
@@ -175,3 +175,17 @@ def test_trigger_shipments_zero_count(mock_post):
 
     # No external call should be made when validation fails
     mock_post.assert_not_called()
+
+
+@patch("integrationsandbox.trigger.service.httpx.post")
+def test_trigger_shipments_replaying_seed(mock_post):
+    mock_post.return_value.status_code = 201
+    trigger_data = {"count": 2, "target_url": "https://httpbin.org/post", "seed": 7}
+
+    first = client.post("/api/v1/trigger/shipments/", json=trigger_data)
+    second = client.post("/api/v1/trigger/shipments/", json=trigger_data)
+
+    assert first.status_code == 201
+    assert second.status_code == 201
+    assert second.json()["shipments"] == first.json()["shipments"]
+    assert mock_post.call_count == 2